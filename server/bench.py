@@ -0,0 +1,298 @@
+"""
+End to end benchmarks. Programs are compiled and run just as the
+program manager runs them, against a local fake Spotify (see
+pbl.fake_spotify) serving synthetic catalogs, so no network access or
+live playlists are needed::
+
+    python bench.py
+    python bench.py --sizes 100,10000,1000000 --latency 0.02
+    python bench.py --only SpotifyPlaylist,Sorter --throttle-every 50
+    python bench.py --separate --sizes 1000,5000,20000
+    python bench.py --drain --sizes 100000 --only MySavedTracks,SpotifyPlaylist
+
+Each program runs once per catalog size and reports the wall time, the
+requests the fake served, the 429s it sent and the tracks produced.
+Catalogs hold a playlist of every power of ten up to their size, and the
+program sources read the largest of them. Set PBL_CACHE to run with a
+cache; by default nothing is cached, so every run does all its fetches.
+With --drain the programs run to the end of their streams rather than
+stopping at MAX_TRACKS, and the saved library is as large as the catalog.
+
+With --separate the artist separation engine is timed on its own, over
+generated buffers, against the full rescoring search it replaced.
+"""
+
+import os
+import time
+import random
+import argparse
+import pbl
+from pbl import fake_spotify
+from pbl import spotify_client
+from pbl import rate_limiter
+import compiler
+import plugs
+from pbl.bench import ListSource
+
+MAX_TRACKS = 200
+
+
+def source(type, **params):
+    return {"type": type, "sources": {}, "params": params}
+
+
+def node(type, sources, **params):
+    return {"type": type, "sources": sources, "params": params}
+
+
+def get_programs(size):
+    """the benchmark programs for a catalog of the given size, as dict of
+    name to program"""
+    name = "bench %d" % (size,)
+    small = "bench %d" % (min(size, 100),)
+    user = fake_spotify.USER
+    playlist = source("SpotifyPlaylist", name=name, user=user)
+    step = max(1, size // 50)
+    uris = [
+        "spotify:track:" + fake_spotify.make_id("T", t) for t in range(0, size, step)
+    ]
+
+    programs = {
+        "SpotifyPlaylist": {"p": playlist},
+        "DatedSpotifyPlaylist": {
+            "p": source(
+                "DatedSpotifyPlaylist",
+                name=name,
+                user=user,
+                order_by_date_added=True,
+                tracks_added_since=-1,
+                tracks_added_before=-1,
+            )
+        },
+        "RelativeDatedSpotifyPlaylist": {
+            "p": source(
+                "RelativeDatedSpotifyPlaylist",
+                name=name,
+                user=user,
+                tracks_added_since="1 year",
+            )
+        },
+        "MySavedTracks": {"p": source("MySavedTracks")},
+        "MySavedAlbums": {"p": source("MySavedAlbums")},
+        "MyTopTracks": {"p": source("MyTopTracks", time_range="short_term")},
+        "MyFollowedArtists": {"p": source("MyFollowedArtists", num_tracks=3)},
+        "AlbumSource": {"p": source("AlbumSource", title="Album 3")},
+        "ArtistTopTracks": {"p": source("ArtistTopTracks", name="Artist 5")},
+        "SpotifyArtistRadio": {"p": source("SpotifyArtistRadio", name="Artist 5")},
+        "TrackSource": {"p": source("TrackSource", uris=uris)},
+        "Concatenate": {
+            "a": source("SpotifyPlaylist", name=small, user=user),
+            "b": playlist,
+            "p": node("Concatenate", {"source_list": ["a", "b"]}),
+        },
+        "Alternate": {
+            "a": source("SpotifyPlaylist", name=small, user=user),
+            "b": playlist,
+            "p": node("Alternate", {"source_list": ["a", "b"]}),
+        },
+        "Mixer": {
+            "a": source("SpotifyPlaylist", name=small, user=user),
+            "b": playlist,
+            "p": node(
+                "Mixer",
+                {
+                    "source_list": ["a", "b"],
+                    "bad_track_source_list": [],
+                    "bad_artist_source_list": [],
+                },
+                fail_fast=False,
+                dedup=True,
+                min_artist_separation=4,
+                max_tracks=MAX_TRACKS,
+            ),
+        },
+    }
+
+    def on_playlist(type, **params):
+        program = node(type, {"source": "src"}, **params)
+        programs[type] = {"src": playlist, "p": program}
+
+    on_playlist("Sorter", attr="spotify.popularity")
+    on_playlist(
+        "AttributeRangeFilter", attr="audio.danceability", min_val=0.2, max_val=0.8
+    )
+    on_playlist("ReleaseDateFilter", min_val="1990", max_val="2010")
+    on_playlist("Energy", scale=1)
+    on_playlist("Tempo", min_tempo=90, max_tempo=130)
+    on_playlist("Explicit", explicit=False)
+    on_playlist("ShorterThan", time=240)
+    on_playlist("TextFilter", text="track 1", ignore_case=True, invert=False)
+    on_playlist("SeparateArtists")
+    on_playlist("ArtistSeparation", min_separation=4)
+    on_playlist("DeDup")
+    on_playlist("ArtistDeDup")
+    on_playlist("Shuffler")
+    on_playlist("Weighted Shuffler", factor=0.5)
+    on_playlist("Sample", sample_size=50)
+    on_playlist("Last", sample_size=50)
+    on_playlist("AllButTheLast", sample_size=50)
+    on_playlist("First", sample_size=50)
+    on_playlist("Reverse")
+    on_playlist("PlaylistSave", playlist_name="bench out")
+    return programs
+
+
+def run_program(sp, components, max_tracks=MAX_TRACKS):
+    """compiles and runs a program, returns the track ids. A max_tracks of
+    zero runs it until it runs dry"""
+    program = {"main": "p", "components": components}
+    with pbl.tlib.arena():
+        pbl.engine.clearEnvData()
+        pbl.engine.setEnv("spotify", sp)
+        pbl.engine.setEnv("spotify_auth_token", "bench")
+        pbl.engine.setEnv("spotify_user_id", fake_spotify.USER)
+        status, obj = compiler.compile(program)
+        if status != compiler.OK:
+            raise Exception(status)
+        if max_tracks:
+            return pbl.get_tracks(obj, max_tracks)
+        return pbl.drain(obj)
+
+
+def bench(sizes, only=None, latency=0, throttle_every=0, drain=False):
+    print(
+        "%-30s %8s %8s %8s %6s %6s"
+        % ("program", "size", "secs", "requests", "429s", "tracks")
+    )
+    for size in sizes:
+        library_size = size if drain else min(size, 1000)
+        catalog = fake_spotify.Catalog(size, library_size=library_size)
+        fake = fake_spotify.FakeSpotify(
+            catalog, latency=latency, throttle_every=throttle_every
+        ).start()
+        os.environ["PBL_SPOTIFY_API_PREFIX"] = fake.prefix
+        sp = spotify_client.make_client("bench")
+        try:
+            for name, components in sorted(get_programs(size).items()):
+                if only and name not in only:
+                    continue
+                fake.reset_stats()
+                start = time.time()
+                try:
+                    tids = run_program(sp, components, 0 if drain else MAX_TRACKS)
+                    ntracks = len(tids)
+                except pbl.PBLException as e:
+                    ntracks = "error: " + e.reason
+                except Exception as e:
+                    ntracks = "error: " + type(e).__name__
+                stats = fake.stats()
+                print(
+                    "%-30s %8d %8.3f %8d %6d %6s"
+                    % (
+                        name,
+                        size,
+                        time.time() - start,
+                        stats["requests"],
+                        stats["throttled"],
+                        ntracks,
+                    )
+                )
+        finally:
+            fake.stop()
+
+
+def make_clustered_tracks(count, seed=0):
+    """generated tracks in runs by the same artist, as in a playlist built
+    album by album"""
+    rand = random.Random(seed)
+    tids = []
+    while len(tids) < count:
+        name = "artist %d" % (rand.randint(1, max(1, count // 20)),)
+        for i in range(rand.randint(1, 12)):
+            tid = "sep:%d" % (len(tids),)
+            pbl.tlib.make_track(tid, "title", name, 180, "bench")
+            tids.append(tid)
+    return tids[:count]
+
+
+def separate_by_rescoring(sa):
+    """the full rescoring search SeparateArtists used before it scored
+    swaps incrementally, kept as a baseline"""
+    max_tries = 1000
+    max_no_swaps = 100
+
+    cur_score, indexes = sa.score_list()
+    no_swap = 0
+    for i in range(max_tries):
+        if cur_score == 0 or len(indexes) == 0:
+            break
+        swap_1 = random.choice(indexes)
+        swap_2 = sa.random_index()
+        sa.swap(swap_1, swap_2)
+        new_score, new_indexes = sa.score_list()
+        if new_score >= cur_score:
+            sa.swap(swap_2, swap_1)
+            no_swap += 1
+            if no_swap > max_no_swaps:
+                break
+        else:
+            no_swap = 0
+            cur_score = new_score
+            indexes = new_indexes
+    return cur_score, len(indexes)
+
+
+def bench_separate_artists(sizes):
+    print(
+        "%-30s %8s %8s %10s %10s"
+        % ("separation", "size", "secs", "before", "violations")
+    )
+    for size in sizes:
+        with pbl.tlib.arena():
+            tids = make_clustered_tracks(size)
+            before = plugs.count_artist_violations(tids)
+            for name, search in (
+                ("full rescoring", separate_by_rescoring),
+                ("incremental", plugs.SeparateArtists.separate_artists),
+            ):
+                random.seed(0)
+                sa = plugs.SeparateArtists(ListSource(tids))
+                sa.tracks = [pbl.tlib.get_track(tid) for tid in tids]
+                start = time.time()
+                search(sa)
+                delta = time.time() - start
+                after = plugs.count_artist_violations([t["id"] for t in sa.tracks])
+                print("%-30s %8d %8.3f %10d %10d" % (name, size, delta, before, after))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="end to end PBL benchmarks")
+    parser.add_argument("--sizes", default="100,1000,10000")
+    parser.add_argument("--only", default="")
+    parser.add_argument("--latency", type=float, default=0)
+    parser.add_argument(
+        "--drain",
+        action="store_true",
+        help="run the programs to the end of their streams",
+    )
+    parser.add_argument(
+        "--separate",
+        action="store_true",
+        help="benchmark the artist separation engine instead of the programs",
+    )
+    parser.add_argument("--throttle-every", type=int, default=0)
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=0,
+        help="requests per second allowed by the rate limiter, 0 for no limit",
+    )
+    args = parser.parse_args()
+
+    rate_limiter.limiter.rate = args.rate
+    sizes = [int(size) for size in args.sizes.split(",")]
+    only = set(args.only.split(",")) if args.only else None
+    if args.separate:
+        bench_separate_artists(sizes)
+    else:
+        bench(sizes, only, args.latency, args.throttle_every, args.drain)
@@ -56,7 +56,7 @@ class SmarterPlaylistServer(object):
             tids = pbl.get_tracks(obj, max_tracks)
             for i, tid in enumerate(tids):
                 print(i, pbl.tlib.get_tn(tid))
-                tracks.append(pbl.tlib.get_track(tid))
+                tracks.append(pbl.tlib.get_track_info(tid))
             results["tracks"] = tracks
             results["name"] = obj.name
 
@@ -148,6 +148,10 @@ def compile_object(objname, program):
 
                 try:
                     obj = spec["class"](**params)
+                    # look up names now, through the resolution cache,
+                    # rather than on the first next_track
+                    if hasattr(obj, "resolve"):
+                        obj.resolve()
                     symbols[objname] = obj
                     hsymbols[obj] = objname
                     return OK, obj
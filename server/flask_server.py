@@ -319,6 +319,20 @@ def system_status():
     return jsonify(results)
 
 
+@app.route("/SmarterPlaylists/pbl-stats")
+@cross_origin()
+def pbl_stats():
+    """connection pool, cache and fetch counters for this worker"""
+    start_time = time.time()
+    from pbl import stats
+
+    results = {}
+    results["status"] = "OK"
+    results["pbl"] = stats.get_stats()
+    results["time"] = time.time() - start_time
+    return jsonify(results)
+
+
 @app.route("/SmarterPlaylists/imports")
 @cross_origin()
 def imports():
@@ -562,22 +576,13 @@ def run():
     save_playlist = params["save"]
     pid = params["pid"]
     pm_inst, _ = get_services()
-    results = pm_inst.execute_program(auth_code, pid, save_playlist)
-    if results["status"] == "ok":
-        tracks = []
-        results["tracks"] = tracks
-        try:
-            import pbl  # optional, only for enriching track info
-
-            for i, tid in enumerate(results["tids"]):
-                if getattr(app, "trace", False):
-                    logger.debug(f"Track {i}: {pbl.tlib.get_tn(tid)}")
-                tracks.append(pbl.tlib.get_track(tid))
-        except ImportError as e:
-            # If pbl is unavailable, return tids only
-            logger.warning(f"pbl library not available, returning track IDs only: {e}")
-        except Exception as e:
-            logger.error(f"Error enriching track info: {e}", exc_info=True)
+    # track info lives in the execution's track arena, so ask for it up front
+    results = pm_inst.execute_program(
+        auth_code, pid, save_playlist, include_tracks=True
+    )
+    if results["status"] == "ok" and getattr(app, "trace", False):
+        for i, track in enumerate(results["tracks"]):
+            logger.debug(f"Track {i}: {track['title']} -- {track['artist']}")
     return jsonify(results)
 
 
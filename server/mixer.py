@@ -1,7 +1,7 @@
 import pbl
-import sys
+from pbl import spacing
 
-class Mixer(object):
+class Mixer(pbl.Component):
     '''
         A PBL Filter that mixes any number of input streams
         based upon a set of rules
@@ -71,7 +71,7 @@ class Mixer(object):
     def add_to_history(self, track):
         tinfo = pbl.tlib.get_track(track)
         self.track_history.add(track)
-        self.artist_history.append(tinfo['artist'])
+        self.artist_history.add(tinfo['artist'])
 
     def next_channel(self):
         self.cur_channel += 1
@@ -104,10 +104,7 @@ class Mixer(object):
         return True, True
 
     def get_artist_sep(self, artist):
-        for idx, hartist in enumerate(reversed(self.artist_history)):
-            if artist == hartist:
-                return idx + 1
-        return sys.maxint
+        return self.artist_history.separation(artist)
             
 
     def prep(self):
@@ -130,7 +127,7 @@ class Mixer(object):
                     else:
                         break
 
-            self.artist_history = []
+            self.artist_history = spacing.ArtistSpacing()
             self.track_history = set()
 
 if __name__ == '__main__':
@@ -0,0 +1,361 @@
+"""
+Micro benchmarks for the PBL engine. They run against generated tracks
+and need no network access::
+
+    python -m pbl.bench
+"""
+
+import time
+import random
+import collections
+import tracemalloc
+from . import engine
+from . import column_store
+from .standard_plugs import *
+from .track_manager import tlib, Track
+
+
+class ListSource(Component):
+    """
+    A source that generates tracks from a prepared list of track ids
+
+    :param tids: the track ids
+    """
+
+    def __init__(self, tids):
+        self.name = "list of " + str(len(tids)) + " tracks"
+        self.tids = tids
+        self.index = 0
+
+    def next_track(self):
+        if self.index < len(self.tids):
+            track = self.tids[self.index]
+            self.index += 1
+            return track
+        else:
+            return None
+
+    def next_tracks(self, n):
+        out = self.tids[self.index : self.index + n]
+        self.index += len(out)
+        return out
+
+
+def make_fake_tracks(count, prefix="bench"):
+    tids = []
+    for i in range(count):
+        tid = "%s:%d" % (prefix, i)
+        tlib.make_track(tid, "title %d" % (i,), "artist %d" % (i % 97,), 180, prefix)
+        tids.append(tid)
+    return tids
+
+
+def pull_one_at_a_time(source, max_tracks):
+    """the pre batch engine loop, kept as a baseline"""
+    out = []
+    for which in range(max_tracks):
+        track = source.next_track()
+        if not track:
+            break
+        else:
+            out.append(track)
+    return out
+
+
+def best_of(runs, func):
+    best = None
+    for i in range(runs):
+        start = time.time()
+        result = func()
+        delta = time.time() - start
+        if best is None or delta < best:
+            best = delta
+    return best, result
+
+
+def batch_pipeline(tids, depth=20):
+    """a deep pipeline built from the components on the hot path. It
+    holds only streaming stages, so a track at a time pull really does go
+    through every stage a track at a time; a draining stage such as
+    Shuffler would pull its source in one block either way"""
+    pipe = ListSource(tids)
+    pipe = Concatenate([ListSource([]), pipe])
+    for i in range(depth // 4):
+        pipe = DeDup(pipe)
+        pipe = AttributeRangeFilter(pipe, "duration", min_val=1)
+        pipe = TrackFilter(pipe, ListSource(tids[:10]))
+        pipe = Concatenate([pipe])
+    return pipe
+
+
+def bench_batch_pull(ntracks=10000, depth=20, runs=3):
+    """compares the per track pull loop with the batch pull protocol"""
+    tids = make_fake_tracks(ntracks)
+    single, out1 = best_of(
+        runs, lambda: pull_one_at_a_time(batch_pipeline(tids, depth), ntracks)
+    )
+    batch, out2 = best_of(
+        runs, lambda: engine.get_tracks(batch_pipeline(tids, depth), ntracks)
+    )
+    print("batch pull,", len(out1), "tracks through", depth, "components")
+    print("   next_track  %.2f usecs/track" % (single * 1e6 / max(len(out1), 1)))
+    print("   next_tracks %.2f usecs/track" % (batch * 1e6 / max(len(out2), 1)))
+    print("   speedup     %.1fx" % (single / batch if batch else 0))
+
+
+def dict_track(id, title, artist, dur, source):
+    """the pre slotted track layout, kept as a baseline"""
+    return {
+        "id": id,
+        "title": title,
+        "artist": artist,
+        "duration": dur,
+        "src": source,
+    }
+
+
+def bench_track_memory(ntracks=10000, nartists=200):
+    """compares the bytes per track of the dict and slotted track layouts"""
+
+    def make(layout):
+        tracks = {}
+        for i in range(ntracks):
+            # fresh strings for every track, as we get from parsed json
+            tid = "%022d" % (i,)
+            title = "title number %d" % (i,)
+            artist = "artist number %d" % (i % nartists,)
+            source = "%s %s" % ("My Saved", "Tracks")
+            tracks[tid] = layout(tid, title, artist, 180, source)
+        return tracks
+
+    print("track memory,", ntracks, "tracks by", nartists, "artists")
+    for label, layout in [("dict", dict_track), ("slotted", Track)]:
+        tracemalloc.start()
+        tracks = make(layout)
+        size, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print("   %-8s %.0f bytes/track" % (label, size / float(ntracks)))
+        del tracks
+
+
+def annotate_fake_tracks(tids):
+    for tid in tids:
+        tlib.annotate_track(
+            tid,
+            "audio",
+            {"energy": random.random(), "tempo": random.uniform(60, 180)},
+            add_to_cache=False,
+        )
+
+
+def column_pipeline(tids):
+    pipe = AttributeRangeFilter(ListSource(tids), "audio.energy", min_val=0.2)
+    pipe = AttributeRangeFilter(pipe, "audio.tempo", max_val=150)
+    return Sorter(pipe, "audio.energy", reverse=True)
+
+
+def bench_columns(ntracks=20000, runs=3):
+    """compares per track get_attr filtering and sorting with the numpy
+    column store"""
+    if not column_store.available():
+        print("column store, skipped: numpy is not installed")
+        return
+    tids = make_fake_tracks(ntracks, prefix="columns")
+    annotate_fake_tracks(tids)
+    numpy = column_store.numpy
+    try:
+        column_store.numpy = None
+        single, out1 = best_of(
+            runs, lambda: engine.get_tracks(column_pipeline(tids), ntracks)
+        )
+    finally:
+        column_store.numpy = numpy
+    vector, out2 = best_of(
+        runs, lambda: engine.get_tracks(column_pipeline(tids), ntracks)
+    )
+    assert out1 == out2
+    print("column store,", ntracks, "tracks filtered twice and sorted")
+    print("   get_attr    %.2f usecs/track" % (single * 1e6 / ntracks))
+    print("   columns     %.2f usecs/track" % (vector * 1e6 / ntracks))
+    print("   speedup     %.1fx" % (single / vector if vector else 0))
+
+
+def bench_cache_round_trips(nitems=500, runs=3):
+    """compares per id cache gets and puts with get_many and put_many
+    against the local redis cache"""
+    try:
+        from . import redis_cache
+
+        redis_cache.r.ping()
+    except Exception as e:
+        print("cache round trips, skipped: no redis,", e)
+        return
+    ids = ["%022d" % (i,) for i in range(nitems)]
+    objs = {id: {"id": id, "popularity": 50} for id in ids}
+
+    def one_at_a_time():
+        for id in ids:
+            redis_cache.put("bench", id, objs[id])
+        return [redis_cache.get("bench", id) for id in ids]
+
+    def batched():
+        redis_cache.put_many("bench", objs)
+        return redis_cache.get_many("bench", ids)
+
+    single, out1 = best_of(runs, one_at_a_time)
+    batch, out2 = best_of(runs, batched)
+    assert out1 == out2
+    redis_cache.r.delete(*[redis_cache.get_key("bench", id) for id in ids])
+    print("cache round trips,", nitems, "puts and gets")
+    print("   get/put           %d round trips %.1f ms" % (2 * nitems, single * 1e3))
+    print("   get_many/put_many 2 round trips %.1f ms" % (batch * 1e3,))
+    print("   speedup           %.1fx" % (single / batch if batch else 0))
+
+
+SAMPLE_ANNOTATIONS = {
+    "audio": {
+        "danceability": 0.735,
+        "energy": 0.578,
+        "key": 5,
+        "loudness": -11.84,
+        "mode": 0,
+        "speechiness": 0.0461,
+        "acousticness": 0.514,
+        "instrumentalness": 0.0902,
+        "liveness": 0.159,
+        "valence": 0.624,
+        "tempo": 98.002,
+        "type": "audio_features",
+        "id": "06AKEBrKUckW0KREUWRnvT",
+        "uri": "spotify:track:06AKEBrKUckW0KREUWRnvT",
+        "track_href": "https://api.spotify.com/v1/tracks/06AKEBrKUckW0KREUWRnvT",
+        "analysis_url": "https://api.spotify.com/v1/audio-analysis/"
+        "06AKEBrKUckW0KREUWRnvT",
+        "duration_ms": 255349,
+        "time_signature": 4,
+    },
+    "spotify": {
+        "duration_ms": 255349,
+        "explicit": False,
+        "popularity": 61,
+        "track_number": 3,
+        "disc_number": 1,
+        "primary_artist_genres": ["indie pop", "indietronica"],
+        "primary_artist_popularity": 70,
+        "primary_artist_followers": 1534254,
+        "album_name": "Some Album Name",
+        "album_id": "6akEvsycLGftJxYudPjmqK",
+        "album_genres": ["indie pop", "indietronica"],
+        "album_release_date": "2014-02-24",
+        "album_popularity": 58,
+        "album_type": "album",
+    },
+    "album": {
+        "name": "Some Album Name",
+        "id": "6akEvsycLGftJxYudPjmqK",
+        "album_type": "album",
+        "release_date": "2014-02-24",
+        "popularity": 58,
+        "genres": [],
+    },
+    "artist": {
+        "name": "Some Artist",
+        "id": "0OdUWJ0sBjDrqHygGUXeCF",
+        "popularity": 70,
+        "followers": 1534254,
+    },
+}
+
+
+def bench_codecs(count=20000):
+    """reports encode and decode throughput and bytes per entry of the
+    cache codecs for each kind of annotation"""
+    from . import codec
+    import json
+
+    codecs = [("legacy json", None)]
+    for format in ["json", "msgpack"]:
+        for compression in ["none", "zlib", "zstd"]:
+            c = codec.Codec(format, compression)
+            if c.name == format + "+" + compression:
+                codecs.append((c.name, c))
+    print("cache codecs,", count, "entries")
+    header = ("type", "codec", "bytes", "enc/sec", "dec/sec")
+    print("   %-8s %-12s %8s %12s %12s" % header)
+    for type, obj in SAMPLE_ANNOTATIONS.items():
+        for name, c in codecs:
+            encode = json.dumps if c is None else c.encode
+            decode = json.loads if c is None else c.decode
+            data = encode(obj)
+            assert decode(data) == obj
+            enc, _ = best_of(3, lambda: [encode(obj) for i in range(count)])
+            dec, _ = best_of(3, lambda: [decode(data) for i in range(count)])
+            print(
+                "   %-8s %-12s %8d %12.0f %12.0f"
+                % (type, name, len(data), count / enc, count / dec)
+            )
+
+
+class PopFrontSource(Component):
+    """emits a prepared list with list.pop(0), as the buffering components
+    did before BufferedSource, kept as a baseline"""
+
+    def __init__(self, tids):
+        self.name = "pop front"
+        self.buffer = list(tids)
+
+    def next_track(self):
+        if len(self.buffer) > 0:
+            return self.buffer.pop(0)
+        else:
+            return None
+
+
+class PreparedSource(BufferedSource):
+    """a BufferedSource that fills from a prepared list in one go, like
+    the Spotify sources do from their responses"""
+
+    def __init__(self, tids):
+        self.name = "prepared"
+        self.tids = tids
+        self.buffer = collections.deque()
+        self.filling = True
+
+    def _fill(self, n):
+        if self.filling:
+            self.filling = False
+            self.buffer.extend(self.tids)
+
+
+def bench_buffer_drain(ntracks=100000):
+    """drains generated tracks through each buffering component, a track
+    at a time and in batches"""
+    tids = make_fake_tracks(ntracks, prefix="drain")
+    annotate_fake_tracks(tids)
+    components = [
+        ("pop(0) baseline", lambda: PopFrontSource(tids)),
+        ("BufferedSource", lambda: PreparedSource(tids)),
+        ("Annotator", lambda: Annotator(ListSource(tids), "audio")),
+        ("Sorter", lambda: Sorter(ListSource(tids), "duration")),
+        ("CustomSorter", lambda: CustomSorter(ListSource(tids), str)),
+        ("First", lambda: First(ListSource(tids), ntracks)),
+    ]
+    print("buffer drain,", ntracks, "tracks, usecs/track")
+    print("   %-16s %12s %12s" % ("component", "next_track", "next_tracks"))
+    for name, make in components:
+        single, out1 = best_of(1, lambda: pull_one_at_a_time(make(), ntracks))
+        batch, out2 = best_of(1, lambda: engine.get_tracks(make(), ntracks))
+        assert len(out1) == len(out2) == ntracks
+        print(
+            "   %-16s %12.2f %12.2f"
+            % (name, single * 1e6 / ntracks, batch * 1e6 / ntracks)
+        )
+
+
+if __name__ == "__main__":
+    bench_batch_pull()
+    bench_track_memory()
+    bench_columns()
+    bench_cache_round_trips()
+    bench_codecs()
+    bench_buffer_drain()
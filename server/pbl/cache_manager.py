@@ -1,10 +1,31 @@
 import os
+import threading
+
+caches = {}
+caches_lock = threading.Lock()
 
 
 # def get_cache(cache_type="NONE"):
 def get_cache(cache_type=None):
+    """
+    gets the cache for the given type, or the one named by PBL_CACHE.
+    Redis and leveldb get an in-process LRU tier in front of them (see
+    lru_cache). Callers share one cache per type, so they share the LRU.
+    """
     if cache_type == None:
         cache_type = os.environ.get("PBL_CACHE")
+    with caches_lock:
+        if cache_type not in caches:
+            caches[cache_type] = _make_cache(cache_type)
+        return caches[cache_type]
+
+
+def is_enabled(cache):
+    """False for the cache that caches nothing"""
+    return cache.name != "none"
+
+
+def _make_cache(cache_type):
     if cache_type == "REDIS":
         from . import redis_cache as cache
     elif cache_type == "LEVELDB":
@@ -12,5 +33,9 @@ def get_cache(cache_type=None):
     else:
         from . import nocache as cache
 
+    if cache_type in ("REDIS", "LEVELDB"):
+        from . import lru_cache
+
+        cache = lru_cache.from_env(cache)
     print("cache", cache.name)
     return cache
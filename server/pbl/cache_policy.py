@@ -0,0 +1,143 @@
+"""
+Key naming and expiry for the cache backends.
+
+Keys look like 'pbl:item:1:<id>'. They hold a namespace and a schema
+version for the type. When the shape of a type's entries changes (say
+flatten_album grows a field), bump its version in SCHEMA_VERSIONS. Old
+entries are then no longer read and age out on their own, with no
+flush. Types still on version 1 fall back to the legacy 'type-id' keys
+on a miss, so the switch to this scheme doesn't start with a cold cache.
+
+Each type has a time to live. Popularity and follower counts go stale
+quickly, while audio features never change. TTLs get a random jitter so
+that a batch of entries written together doesn't expire together.
+
+Configured through the environment:
+
+    PBL_CACHE_NAMESPACE  the key prefix (default 'pbl')
+    PBL_CACHE_TTLS       per type seconds, such as 'spotify=3600,audio=0',
+                         where 0 means never expire
+    PBL_CACHE_NEGATIVE_TTL  seconds a known missing entry lives
+                            (default one day)
+    PBL_CACHE_LEGACY_FALLBACK  set to 0 to stop looking up the legacy
+                               keys on a miss, once they have aged out
+
+Ids that Spotify has nothing for, such as podcast episodes, local files or
+regionally removed tracks, are cached as the MISSING marker with the
+shorter negative TTL, so they aren't looked up again on every run.
+"""
+
+import os
+import time
+import random
+import struct
+
+SCHEMA_VERSIONS = {
+    "spotify": 1,
+    "audio": 1,
+    "item": 1,
+    "echonest": 1,
+    "playlist": 1,
+    "top_tracks": 1,
+    "saved_playlist": 1,
+    "resolved": 2,
+}
+
+# the types that were cached before keys were versioned
+LEGACY_TYPES = set(["spotify", "audio", "item", "echonest"])
+
+DAY = 24 * 60 * 60
+
+DEFAULT_TTLS = {
+    "spotify": 1 * DAY,
+    "audio": 90 * DAY,
+    "item": 3 * DAY,
+    "playlist": 7 * DAY,
+    "top_tracks": 1 * DAY,
+    "saved_playlist": 7 * DAY,
+    "resolved": 1 * DAY,
+}
+
+DEFAULT_TTL = 7 * DAY
+DEFAULT_NEGATIVE_TTL = 1 * DAY
+TTL_JITTER = 0.1
+
+# cached in place of an entry that is known not to exist
+MISSING = {"__missing__": True}
+
+# leveldb has no expiry, so entries there are wrapped in an envelope of
+# this byte and the expiry time. It is below 0x20 and distinct from the
+# codec header bytes.
+EXPIRY_ENVELOPE = 0x1F
+EXPIRY_FORMAT = ">Q"
+EXPIRY_SIZE = struct.calcsize(EXPIRY_FORMAT)
+
+
+def parse_ttls(spec):
+    """parses 'type=seconds,type=seconds' into a dict"""
+    ttls = {}
+    for part in spec.split(","):
+        if "=" in part:
+            type, seconds = part.split("=", 1)
+            ttls[type.strip()] = int(seconds)
+    return ttls
+
+
+namespace = os.environ.get("PBL_CACHE_NAMESPACE", "pbl")
+ttls = dict(DEFAULT_TTLS)
+ttls.update(parse_ttls(os.environ.get("PBL_CACHE_TTLS", "")))
+negative_ttl = int(os.environ.get("PBL_CACHE_NEGATIVE_TTL", DEFAULT_NEGATIVE_TTL))
+legacy_fallback = os.environ.get("PBL_CACHE_LEGACY_FALLBACK", "1") != "0"
+
+
+def is_missing(obj):
+    return obj == MISSING
+
+
+def get_key(type, id):
+    return "%s:%s:%d:%s" % (namespace, type, SCHEMA_VERSIONS.get(type, 1), id)
+
+
+def get_legacy_key(type, id):
+    """the pre versioning key, or None if the type's schema has moved on
+    or the fallback is switched off"""
+    if not legacy_fallback:
+        return None
+    if type in LEGACY_TYPES and SCHEMA_VERSIONS.get(type, 1) == 1:
+        return type + "-" + id
+    return None
+
+
+def get_ttl(type, obj=None):
+    """the time to live in seconds for a new entry of the type, with
+    jitter, or None if it never expires. Known missing entries get the
+    negative TTL."""
+    ttl = ttls.get(type, DEFAULT_TTL)
+    if is_missing(obj) and (not ttl or negative_ttl < ttl):
+        ttl = negative_ttl
+    if not ttl:
+        return None
+    return int(ttl * random.uniform(1 - TTL_JITTER, 1 + TTL_JITTER))
+
+
+def add_expiry(data, ttl):
+    """wraps encoded data in an expiry envelope, for backends with no
+    expiry of their own"""
+    if ttl is None:
+        return data
+    expires = int(time.time()) + ttl
+    return bytes((EXPIRY_ENVELOPE,)) + struct.pack(EXPIRY_FORMAT, expires) + data
+
+
+def check_expiry(data):
+    """
+    unwraps an expiry envelope
+
+    :returns: the encoded data, or None if it has expired
+    """
+    if data and data[0] == EXPIRY_ENVELOPE:
+        (expires,) = struct.unpack_from(EXPIRY_FORMAT, data, 1)
+        if expires < time.time():
+            return None
+        return data[1 + EXPIRY_SIZE :]
+    return data
@@ -0,0 +1,127 @@
+"""
+Encodes cache entries as bytes.
+
+An entry starts with a header byte below 0x20 that says how the rest was
+written, so it can't be mistaken for a legacy JSON entry, which always
+starts with a printable character. Legacy entries are still decoded as
+JSON.
+
+The header's low two bits are the format (json or msgpack), the next two
+the compression (none, zlib or zstd). Entries shorter than the threshold
+aren't compressed.
+
+msgpack and zstandard are optional. Configured through the environment:
+
+    PBL_CACHE_CODEC         json or msgpack (default msgpack, when
+                            installed)
+    PBL_CACHE_COMPRESS      none, zlib or zstd (default zlib)
+    PBL_CACHE_COMPRESS_MIN  smallest entry in bytes that gets
+                            compressed (default 256)
+"""
+
+import os
+import zlib
+import json
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+JSON = 1
+MSGPACK = 2
+
+NONE = 0
+ZLIB = 1
+ZSTD = 2
+
+FORMATS = {"json": JSON, "msgpack": MSGPACK}
+COMPRESSIONS = {"none": NONE, "zlib": ZLIB, "zstd": ZSTD}
+
+DEFAULT_COMPRESS_MIN = 256
+
+
+class Codec(object):
+    """
+    Encodes and decodes cache entries
+
+    :param format: 'json' or 'msgpack'
+    :param compression: 'none', 'zlib' or 'zstd'
+    :param compress_min: entries shorter than this aren't compressed
+    """
+
+    def __init__(
+        self, format="msgpack", compression="zlib", compress_min=DEFAULT_COMPRESS_MIN
+    ):
+        if format == "msgpack" and msgpack is None:
+            format = "json"
+        if compression == "zstd" and zstandard is None:
+            compression = "zlib"
+        self.name = format + "+" + compression
+        self.format = FORMATS[format]
+        self.compression = COMPRESSIONS[compression]
+        self.compress_min = compress_min
+        if zstandard is not None:
+            self.zstd_compressor = zstandard.ZstdCompressor(level=3)
+            self.zstd_decompressor = zstandard.ZstdDecompressor()
+
+    def encode(self, obj):
+        if self.format == MSGPACK:
+            body = msgpack.packb(obj, use_bin_type=True)
+        else:
+            body = json.dumps(obj, separators=(",", ":")).encode("utf-8")
+        compression = NONE
+        if self.compression != NONE and len(body) >= self.compress_min:
+            compression = self.compression
+            if compression == ZSTD:
+                body = self.zstd_compressor.compress(body)
+            else:
+                body = zlib.compress(body)
+        return bytes((self.format | compression << 2,)) + body
+
+    def decode(self, data):
+        """decodes an entry, returns None if it was written with a codec
+        that isn't installed here"""
+        if not data:
+            return None
+        header = data[0]
+        if header >= 0x20:
+            return json.loads(data)
+        format = header & 0x3
+        compression = header >> 2 & 0x3
+        body = data[1:]
+        if compression == ZLIB:
+            body = zlib.decompress(body)
+        elif compression == ZSTD:
+            if zstandard is None:
+                return None
+            body = self.zstd_decompressor.decompress(body)
+        if format == MSGPACK:
+            if msgpack is None:
+                return None
+            return msgpack.unpackb(body, raw=False)
+        return json.loads(body)
+
+
+def from_env():
+    return Codec(
+        os.environ.get("PBL_CACHE_CODEC", "msgpack"),
+        os.environ.get("PBL_CACHE_COMPRESS", "zlib"),
+        int(os.environ.get("PBL_CACHE_COMPRESS_MIN", DEFAULT_COMPRESS_MIN)),
+    )
+
+
+codec = from_env()
+
+
+def encode(obj):
+    return codec.encode(obj)
+
+
+def decode(data):
+    return codec.decode(data)
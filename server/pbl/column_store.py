@@ -0,0 +1,116 @@
+"""
+A columnar mirror of numeric track annotations.
+
+Values such as audio.energy or spotify.popularity are copied into per
+attribute float arrays indexed by track slot, so that range checks and
+sorts over a block of tracks run as vectorized numpy operations instead of
+a get_attr call per track. Missing values are NaN.
+
+numpy is optional. Without it the store holds nothing and callers use the
+per track path.
+"""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# blocks smaller than this aren't worth the numpy call overhead
+MIN_VECTOR_BLOCK = 16
+
+INITIAL_CAPACITY = 1024
+
+
+def available():
+    return numpy is not None
+
+
+def is_number(val):
+    return isinstance(val, (int, float)) and not isinstance(val, bool)
+
+
+class ColumnStore(object):
+    """
+    Per attribute float columns for a set of tracks. Only attributes that
+    have been asked for with add_column are mirrored, so annotating tracks
+    costs nothing extra until a filter or sorter wants a column.
+    """
+
+    def __init__(self):
+        self.slots = {}
+        self.capacity = 0
+        self.columns = {}
+        self.by_type = {}
+
+    def add_column(self, attr, annotations):
+        """
+        starts mirroring a 'type.field' attribute, filling the column from
+        the annotations that are already there
+
+        :param attr: the attribute path
+        :param annotations: the arena's annotation tables
+        """
+        if numpy is None or attr in self.columns:
+            return
+        fields = attr.split(".")
+        if len(fields) != 2:
+            return
+        type, field = fields
+        column = numpy.full(self.capacity, numpy.nan)
+        self.columns[attr] = column
+        self.by_type.setdefault(type, []).append((field, attr))
+        for tid, data in annotations.get(type, {}).items():
+            self.add(tid, type, data)
+
+    def add(self, tid, type, data):
+        """
+        mirrors the watched fields of an annotation
+
+        :param tid: the track id
+        :param type: the annotation type
+        :param data: the annotation
+        """
+        watched = self.by_type.get(type)
+        if not watched:
+            return
+        slot = self._slot(tid)
+        for field, attr in watched:
+            val = data.get(field) if data else None
+            self.columns[attr][slot] = val if is_number(val) else numpy.nan
+
+    def gather(self, attr, tids):
+        """
+        returns an array of the attribute values for the given tracks, NaN
+        where a track has no numeric value, or None if the attribute isn't
+        mirrored
+
+        :param attr: the attribute path
+        :param tids: the track ids
+        """
+        column = self.columns.get(attr)
+        if column is None:
+            return None
+        if not self.capacity:
+            return numpy.full(len(tids), numpy.nan)
+        slots = self.slots
+        index = numpy.fromiter((slots.get(tid, -1) for tid in tids), int, len(tids))
+        vals = column[index]
+        vals[index < 0] = numpy.nan
+        return vals
+
+    def _slot(self, tid):
+        slot = self.slots.get(tid)
+        if slot is None:
+            slot = len(self.slots)
+            self.slots[tid] = slot
+            if slot >= self.capacity:
+                self._grow()
+        return slot
+
+    def _grow(self):
+        capacity = max(INITIAL_CAPACITY, self.capacity * 2)
+        for attr, column in self.columns.items():
+            grown = numpy.full(capacity, numpy.nan)
+            grown[: self.capacity] = column
+            self.columns[attr] = grown
+        self.capacity = capacity
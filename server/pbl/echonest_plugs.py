@@ -40,6 +40,7 @@ the following attributes::
 """
 
 from .track_manager import tlib
+from .standard_plugs import Component
 from .engine import PBLException
 from . import utils
 import pprint
@@ -60,7 +61,7 @@ _en_song_buckets = [
 ]
 
 
-class EchoNestPlaylist(object):
+class EchoNestPlaylist(Component):
     """
     A track source that uses the Echo Nest playlist API to generate tracks
 
@@ -118,7 +119,7 @@ class EchoNestGenreRadio(EchoNestPlaylist):
         super(EchoNestGenreRadio, self).__init__("Genre radio for " + genre, params)
 
 
-class EchoNestHottestSongs(object):
+class EchoNestHottestSongs(Component):
     """
     Returns the set of hotttest songs from the Echo Nest. TBD
     :param count: the number of tracks to generate
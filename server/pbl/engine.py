@@ -18,14 +18,7 @@ def run_source(source, max_tracks=40):
     :param source: the source of tracks
     :param max_tracks: the maximum number of tracks to pull
     """
-    count = 0
-    for which in range(max_tracks):
-        track = source.next_track()
-        if not track:
-            break
-        else:
-            count += 1
-    return count
+    return len(source.next_tracks(max_tracks))
 
 
 def get_tracks(source, max_tracks=40):
@@ -37,14 +30,7 @@ def get_tracks(source, max_tracks=40):
     :return: a list of tracks
 
     """
-    out = []
-    for which in range(max_tracks):
-        track = source.next_track()
-        if not track:
-            break
-        else:
-            out.append(track)
-    return out
+    return source.next_tracks(max_tracks)
 
 
 def show_source(source, ntracks=100, props=[]):
@@ -0,0 +1,727 @@
+"""
+A local stand in for the Spotify Web API, for benchmarks and tests that
+must not touch api.spotify.com.
+
+It serves a synthetic catalog, generated from track numbers rather than
+stored, so catalogs of a million tracks cost no memory. It covers the
+endpoints the plugs use: playlists and their tracks, the track, album,
+artist and audio feature lookups, search, recommendations, the current
+user's library, and the playlist writes. Playlists have snapshot ids
+that change on every write.
+
+Point a client at it by setting PBL_SPOTIFY_API_PREFIX to the server's
+prefix (see spotify_client.make_client)::
+
+    server = FakeSpotify(Catalog(100000), latency=0.02).start()
+    os.environ["PBL_SPOTIFY_API_PREFIX"] = server.prefix
+
+or run it on its own::
+
+    python -m pbl.fake_spotify --tracks 100000 --port 8765 --latency 0.02
+
+The catalog
+-----------
+
+Track i is on album i // 10, whose artist is album % nartists, with one
+artist for every 20 tracks. Every 97th track has no audio features, and
+ids are 22 character base 62 strings, as spotipy expects.
+
+There is one playlist, owned by USER, for each size in the catalog's
+playlist_sizes, named 'bench <size>'. The user has saved library_size
+tracks and a tenth as many albums, and follows follow_count artists.
+"""
+
+import re
+import sys
+import json
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, urlencode
+
+USER = "benchuser"
+
+GENRES = ["rock", "pop", "jazz", "folk", "soul", "metal", "ambient", "punk"]
+ALBUM_TYPES = ["album", "single", "compilation"]
+
+TRACKS_PER_ALBUM = 10
+TRACKS_PER_ARTIST = 20
+NO_FEATURES_EVERY = 97
+
+
+def make_id(kind, n):
+    """the 22 character id of the nth item of a kind, such as 'T' for
+    tracks"""
+    return "%s%021d" % (kind, n)
+
+
+def parse_id(id):
+    """the kind and number of an id made by make_id, or (None, None)"""
+    if len(id) == 22 and id[1:].isdigit():
+        return id[0], int(id[1:])
+    return None, None
+
+
+class Catalog(object):
+    """
+    A synthetic catalog of tracks, albums, artists and playlists
+
+    :param ntracks: the number of tracks
+    :param playlist_sizes: the sizes of the playlists, by default powers
+                           of ten up to ntracks
+    :param library_size: the number of tracks the user has saved
+    :param follow_count: the number of artists the user follows
+    :param seed: seeds the generated values
+    """
+
+    def __init__(
+        self,
+        ntracks=1000,
+        playlist_sizes=None,
+        library_size=500,
+        follow_count=50,
+        seed=0,
+    ):
+        self.ntracks = ntracks
+        self.nalbums = (ntracks + TRACKS_PER_ALBUM - 1) // TRACKS_PER_ALBUM
+        self.nartists = max(1, ntracks // TRACKS_PER_ARTIST)
+        self.seed = seed
+        if playlist_sizes is None:
+            playlist_sizes = []
+            size = 100
+            while size <= ntracks:
+                playlist_sizes.append(size)
+                size *= 10
+        self.library_size = min(library_size, ntracks)
+        self.follow_count = min(follow_count, self.nartists)
+
+        # playlist id to a dict with the name, owner, snapshot version,
+        # and either the tracks or the start and size they're made from
+        self.playlists = {}
+        for size in playlist_sizes:
+            self.add_playlist("bench %d" % (size,), USER, size=size)
+
+    def add_playlist(self, name, owner, size=0):
+        pid = make_id("P", len(self.playlists))
+        start = (len(self.playlists) * 7919) % self.ntracks
+        self.playlists[pid] = {
+            "name": name,
+            "owner": owner,
+            "version": 0,
+            "start": start,
+            "size": min(size, self.ntracks),
+            "tracks": None,
+        }
+        return pid
+
+    def playlist_tracks(self, pid, offset=0, limit=None):
+        """the playlist's track numbers, or a slice of them"""
+        playlist = self.playlists[pid]
+        if playlist["tracks"] is None:
+            start, size = playlist["start"], playlist["size"]
+            end = size if limit is None else min(size, offset + limit)
+            return [(start + i) % self.ntracks for i in range(offset, end)]
+        if limit is None:
+            return playlist["tracks"][offset:]
+        return playlist["tracks"][offset : offset + limit]
+
+    def playlist_length(self, pid):
+        playlist = self.playlists[pid]
+        if playlist["tracks"] is None:
+            return playlist["size"]
+        return len(playlist["tracks"])
+
+    def set_playlist_tracks(self, pid, tracks):
+        playlist = self.playlists[pid]
+        playlist["tracks"] = tracks
+        playlist["version"] += 1
+
+    def snapshot_id(self, pid):
+        return "%s%d" % (pid, self.playlists[pid]["version"])
+
+    def album_of(self, t):
+        return t // TRACKS_PER_ALBUM
+
+    def artist_of_album(self, a):
+        return a % self.nartists
+
+    def track(self, t):
+        a = self.album_of(t)
+        return {
+            "id": make_id("T", t),
+            "uri": "spotify:track:" + make_id("T", t),
+            "type": "track",
+            "name": "Track %d" % (t,),
+            "duration_ms": 120000 + (t * 7919) % 240000,
+            "explicit": t % 11 == 0,
+            "popularity": (t * 31) % 100,
+            "track_number": t % TRACKS_PER_ALBUM + 1,
+            "disc_number": 1,
+            "artists": [self.simple_artist(self.artist_of_album(a))],
+            "album": self.simple_album(a),
+        }
+
+    def simple_album(self, a):
+        return {
+            "id": make_id("L", a),
+            "uri": "spotify:album:" + make_id("L", a),
+            "type": "album",
+            "name": "Album %d" % (a,),
+            "album_type": ALBUM_TYPES[a % len(ALBUM_TYPES)],
+            "release_date": "%d-%02d-01" % (1960 + a % 64, a % 12 + 1),
+        }
+
+    def album(self, a):
+        album = self.simple_album(a)
+        album["popularity"] = (a * 17) % 100
+        album["genres"] = [GENRES[a % len(GENRES)]]
+        album["artists"] = [self.simple_artist(self.artist_of_album(a))]
+        items = [self.track(t) for t in self.album_tracks(a)]
+        album["tracks"] = {"items": items, "total": len(items), "next": None}
+        return album
+
+    def album_tracks(self, a):
+        first = a * TRACKS_PER_ALBUM
+        return range(first, min(first + TRACKS_PER_ALBUM, self.ntracks))
+
+    def simple_artist(self, r):
+        return {
+            "id": make_id("R", r),
+            "uri": "spotify:artist:" + make_id("R", r),
+            "type": "artist",
+            "name": "Artist %d" % (r,),
+        }
+
+    def artist(self, r):
+        artist = self.simple_artist(r)
+        artist["popularity"] = (r * 13) % 100
+        artist["followers"] = {"total": (r * 7919) % 1000000}
+        artist["genres"] = [GENRES[r % len(GENRES)]]
+        return artist
+
+    def artist_tracks(self, r, count):
+        """the first count tracks on the artist's albums"""
+        tracks = []
+        for a in range(r, self.nalbums, self.nartists):
+            tracks.extend(self.album_tracks(a))
+            if len(tracks) >= count:
+                break
+        return tracks[:count]
+
+    def audio_features(self, t):
+        if t % NO_FEATURES_EVERY == 0:
+            return None
+        rng = random.Random(self.seed * 1000003 + t)
+        return {
+            "id": make_id("T", t),
+            "uri": "spotify:track:" + make_id("T", t),
+            "type": "audio_features",
+            "danceability": rng.random(),
+            "energy": rng.random(),
+            "key": rng.randrange(12),
+            "loudness": -rng.random() * 30,
+            "mode": rng.randrange(2),
+            "speechiness": rng.random() * 0.5,
+            "acousticness": rng.random(),
+            "instrumentalness": rng.random(),
+            "liveness": rng.random(),
+            "valence": rng.random(),
+            "tempo": 60 + rng.random() * 120,
+            "duration_ms": self.track(t)["duration_ms"],
+            "time_signature": 4,
+        }
+
+    def added_at(self, position):
+        day = position % 3650
+        date = time.gmtime(time.time() - day * 86400)
+        return time.strftime("%Y-%m-%dT%H:%M:%SZ", date)
+
+    def simple_playlist(self, pid):
+        playlist = self.playlists[pid]
+        return {
+            "id": pid,
+            "uri": "spotify:playlist:" + pid,
+            "type": "playlist",
+            "name": playlist["name"],
+            "owner": {"id": playlist["owner"]},
+            "snapshot_id": self.snapshot_id(pid),
+            "tracks": {"total": self.playlist_length(pid)},
+        }
+
+
+class FakeSpotify(object):
+    """
+    Serves a catalog over HTTP, like the Spotify Web API
+
+    :param catalog: the catalog
+    :param port: the port, 0 to pick a free one
+    :param latency: seconds each response is held back
+    :param throttle_every: answer every nth request with a 429, 0 never
+    :param retry_after: the Retry-After seconds of the 429s
+    """
+
+    def __init__(
+        self, catalog=None, port=0, latency=0, throttle_every=0, retry_after=0
+    ):
+        self.catalog = catalog or Catalog()
+        self.port = port
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.counts = {}
+        self.server = None
+        self.thread = None
+
+    @property
+    def prefix(self):
+        return "http://127.0.0.1:%d/v1/" % (self.port,)
+
+    def start(self):
+        """starts serving on a background thread, returns self"""
+        server = ThreadingHTTPServer(("127.0.0.1", self.port), _Handler)
+        server.daemon_threads = True
+        server.fake = self
+        self.server = server
+        self.port = server.server_address[1]
+        self.thread = threading.Thread(target=server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def stats(self):
+        """the requests served, the 429s sent and the requests by route"""
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "routes": dict(self.counts),
+            }
+
+    def reset_stats(self):
+        with self.lock:
+            self.requests = 0
+            self.throttled = 0
+            self.counts = {}
+
+    def handle(self, method, path, params, payload):
+        """
+        Answers a request
+
+        :returns: the status and the json body
+        """
+        route = None
+        path = path.rstrip("/")
+        for pattern, route_method, name in ROUTES:
+            match = pattern.match(path)
+            if match and route_method == method:
+                route = name
+                break
+        with self.lock:
+            self.requests += 1
+            key = method + " " + (route or path)
+            self.counts[key] = self.counts.get(key, 0) + 1
+            throttle = self.throttle_every and self.requests % self.throttle_every == 0
+            if throttle:
+                self.throttled += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if throttle:
+            return 429, _error(429, "API rate limit exceeded")
+        if route is None:
+            return 404, _error(404, "Service not found")
+        with self.lock:
+            return getattr(self, route)(params, payload, *match.groups())
+
+    # the routes, each called with the query params, the json payload and
+    # the groups of its path pattern
+
+    def get_tracks(self, params, payload):
+        ids = _get_ids(params)
+        tracks = [self._lookup(id, "T", self.catalog.track) for id in ids]
+        return 200, {"tracks": tracks}
+
+    def get_albums(self, params, payload):
+        ids = _get_ids(params)
+        albums = [self._lookup(id, "L", self.catalog.album) for id in ids]
+        return 200, {"albums": albums}
+
+    def get_artists(self, params, payload):
+        ids = _get_ids(params)
+        artists = [self._lookup(id, "R", self.catalog.artist) for id in ids]
+        return 200, {"artists": artists}
+
+    def get_audio_features(self, params, payload):
+        ids = _get_ids(params)
+        features = [self._lookup(id, "T", self.catalog.audio_features) for id in ids]
+        return 200, {"audio_features": features}
+
+    def get_album_tracks(self, params, payload, aid):
+        kind, a = parse_id(aid)
+        if kind != "L" or a >= self.catalog.nalbums:
+            return 404, _error(404, "non existing id")
+        tracks = [self.catalog.track(t) for t in self.catalog.album_tracks(a)]
+        return 200, self._page(tracks, params, "albums/%s/tracks" % (aid,), 50)
+
+    def get_artist_top_tracks(self, params, payload, rid):
+        kind, r = parse_id(rid)
+        if kind != "R" or r >= self.catalog.nartists:
+            return 404, _error(404, "non existing id")
+        tracks = self.catalog.artist_tracks(r, 10)
+        return 200, {"tracks": [self.catalog.track(t) for t in tracks]}
+
+    def get_playlist(self, params, payload, pid):
+        if pid not in self.catalog.playlists:
+            return 404, _error(404, "Not found.")
+        playlist = self.catalog.simple_playlist(pid)
+        playlist["tracks"] = self._playlist_page(pid, {})
+        return 200, playlist
+
+    def get_playlist_tracks(self, params, payload, pid):
+        if pid not in self.catalog.playlists:
+            return 404, _error(404, "Not found.")
+        return 200, self._playlist_page(pid, params)
+
+    def put_playlist_tracks(self, params, payload, pid):
+        if pid not in self.catalog.playlists:
+            return 404, _error(404, "Not found.")
+        tracks = list(self.catalog.playlist_tracks(pid))
+        if "uris" in payload:
+            tracks = [self._track_number(uri) for uri in payload["uris"]]
+        else:
+            if "snapshot_id" in payload and not self._current(pid, payload):
+                return 400, _error(400, "Invalid snapshot id")
+            start = payload["range_start"]
+            length = payload.get("range_length", 1)
+            before = payload["insert_before"]
+            moved = tracks[start : start + length]
+            rest = tracks[:start] + tracks[start + length :]
+            if before > start:
+                before -= length
+            tracks = rest[:before] + moved + rest[before:]
+        if None in tracks:
+            return 400, _error(400, "Invalid track uri")
+        self.catalog.set_playlist_tracks(pid, tracks)
+        return 200, {"snapshot_id": self.catalog.snapshot_id(pid)}
+
+    def post_playlist_tracks(self, params, payload, pid):
+        if pid not in self.catalog.playlists:
+            return 404, _error(404, "Not found.")
+        uris = payload if isinstance(payload, list) else payload["uris"]
+        added = [self._track_number(uri) for uri in uris]
+        if None in added or len(added) > 100:
+            return 400, _error(400, "Invalid track uri")
+        tracks = list(self.catalog.playlist_tracks(pid))
+        position = params.get("position")
+        if position is None:
+            tracks.extend(added)
+        else:
+            position = int(position)
+            tracks[position:position] = added
+        self.catalog.set_playlist_tracks(pid, tracks)
+        return 201, {"snapshot_id": self.catalog.snapshot_id(pid)}
+
+    def delete_playlist_tracks(self, params, payload, pid):
+        if pid not in self.catalog.playlists:
+            return 404, _error(404, "Not found.")
+        if "snapshot_id" in payload and not self._current(pid, payload):
+            return 400, _error(400, "Invalid snapshot id")
+        tracks = list(self.catalog.playlist_tracks(pid))
+        if len(payload["tracks"]) > 100:
+            return 400, _error(400, "Too many ids requested")
+        drop = set()
+        for item in payload["tracks"]:
+            t = self._track_number(item["uri"])
+            positions = item.get("positions")
+            if positions is None:
+                positions = [i for i, track in enumerate(tracks) if track == t]
+            for position in positions:
+                if position >= len(tracks) or tracks[position] != t:
+                    return 400, _error(400, "Invalid track position")
+                drop.add(position)
+        tracks = [t for i, t in enumerate(tracks) if i not in drop]
+        self.catalog.set_playlist_tracks(pid, tracks)
+        return 200, {"snapshot_id": self.catalog.snapshot_id(pid)}
+
+    def get_user_playlists(self, params, payload, user=USER):
+        playlists = [
+            self.catalog.simple_playlist(pid)
+            for pid, playlist in self.catalog.playlists.items()
+            if playlist["owner"] == user
+        ]
+        return 200, self._page(playlists, params, "users/%s/playlists" % (user,), 20)
+
+    def get_my_playlists(self, params, payload):
+        return self.get_user_playlists(params, payload)
+
+    def post_user_playlist(self, params, payload, user):
+        pid = self.catalog.add_playlist(payload["name"], user)
+        return 201, self.catalog.simple_playlist(pid)
+
+    def get_me(self, params, payload):
+        return 200, {"id": USER, "display_name": USER, "type": "user"}
+
+    def get_saved_tracks(self, params, payload):
+        def item(t):
+            track = self.catalog.track(t)
+            return {"added_at": self.catalog.added_at(t), "track": track}
+
+        count = self.catalog.library_size
+        return 200, self._page(_Lazy(count, item), params, "me/tracks", 20, 50)
+
+    def get_saved_albums(self, params, payload):
+        def item(a):
+            album = self.catalog.album(a)
+            return {"added_at": self.catalog.added_at(a), "album": album}
+
+        count = max(1, self.catalog.library_size // TRACKS_PER_ALBUM)
+        count = min(count, self.catalog.nalbums)
+        return 200, self._page(_Lazy(count, item), params, "me/albums", 20, 50)
+
+    def get_top_tracks(self, params, payload):
+        shift = {"short_term": 0, "medium_term": 1, "long_term": 2}
+        first = shift.get(params.get("time_range"), 1) * 50
+        tracks = [
+            self.catalog.track(t % self.catalog.ntracks)
+            for t in range(first, first + 50)
+        ]
+        return 200, self._page(tracks, params, "me/top/tracks", 20, 50)
+
+    def get_following(self, params, payload):
+        limit = min(int(params.get("limit", 20)), 50)
+        start = 0
+        if params.get("after"):
+            start = parse_id(params["after"])[1] + 1
+        end = min(start + limit, self.catalog.follow_count)
+        items = [self.catalog.artist(r) for r in range(start, end)]
+        after = items[-1]["id"] if items else None
+        next = None
+        if end < self.catalog.follow_count:
+            query = urlencode({"type": "artist", "limit": limit, "after": after})
+            next = self.prefix + "me/following?" + query
+        artists = {
+            "items": items,
+            "total": self.catalog.follow_count,
+            "limit": limit,
+            "cursors": {"after": after},
+            "next": next,
+        }
+        return 200, {"artists": artists}
+
+    def get_search(self, params, payload):
+        q = " ".join(params.get("q", "").lower().split())
+        limit = min(int(params.get("limit", 10)), 50)
+        results = {}
+        for type in params.get("type", "track").split(","):
+            results[type + "s"] = self._page(
+                self._search(type, q), params, "search", 10, 50
+            )
+            results[type + "s"]["items"] = results[type + "s"]["items"][:limit]
+        return 200, results
+
+    def get_recommendations(self, params, payload):
+        limit = min(int(params.get("limit", 20)), 100)
+        seeds = [s for s in params.get("seed_artists", "").split(",") if s]
+        rng = random.Random(",".join(seeds))
+        tracks = [rng.randrange(self.catalog.ntracks) for i in range(limit)]
+        return 200, {
+            "tracks": [self.catalog.track(t) for t in tracks],
+            "seeds": [{"id": seed, "type": "ARTIST"} for seed in seeds],
+        }
+
+    def _search(self, type, q):
+        catalog = self.catalog
+        if type == "playlist":
+            pids = list(catalog.playlists)
+            exact = [pid for pid in pids if catalog.playlists[pid]["name"].lower() == q]
+            return [catalog.simple_playlist(pid) for pid in exact or pids[:1]]
+        number = re.search(r"\d+", q)
+        n = int(number.group()) if number else 0
+        if type == "artist":
+            return [catalog.artist(n % catalog.nartists)]
+        if type == "album":
+            return [catalog.simple_album(n % catalog.nalbums)]
+        return [catalog.track(n % catalog.ntracks)]
+
+    def _playlist_page(self, pid, params):
+        limit = min(int(params.get("limit", 100)), 100)
+        offset = int(params.get("offset", 0))
+        tracks = self.catalog.playlist_tracks(pid, offset, limit)
+        items = [
+            {
+                "added_at": self.catalog.added_at(position),
+                "track": self.catalog.track(t),
+            }
+            for position, t in enumerate(tracks, offset)
+        ]
+        total = self.catalog.playlist_length(pid)
+        return self._page_of(
+            items, total, offset, limit, "playlists/%s/tracks" % (pid,)
+        )
+
+    def _page(self, items, params, path, default_limit, max_limit=100):
+        limit = min(int(params.get("limit", default_limit)), max_limit)
+        offset = int(params.get("offset", 0))
+        return self._page_of(
+            items[offset : offset + limit], len(items), offset, limit, path
+        )
+
+    def _page_of(self, items, total, offset, limit, path):
+        next = None
+        if offset + limit < total:
+            query = urlencode({"offset": offset + limit, "limit": limit})
+            next = self.prefix + path + "?" + query
+        return {
+            "items": items,
+            "total": total,
+            "limit": limit,
+            "offset": offset,
+            "next": next,
+        }
+
+    def _lookup(self, id, kind, make):
+        id_kind, n = parse_id(id)
+        limits = {
+            "T": self.catalog.ntracks,
+            "L": self.catalog.nalbums,
+            "R": self.catalog.nartists,
+        }
+        if id_kind != kind or n >= limits[kind]:
+            return None
+        return make(n)
+
+    def _track_number(self, uri):
+        kind, t = parse_id(uri.split(":")[-1])
+        if kind != "T" or t >= self.catalog.ntracks:
+            return None
+        return t
+
+    def _current(self, pid, payload):
+        return payload["snapshot_id"] == self.catalog.snapshot_id(pid)
+
+
+ROUTES = [
+    (re.compile(pattern + "$"), method, name)
+    for pattern, method, name in [
+        ("/v1/tracks", "GET", "get_tracks"),
+        ("/v1/albums", "GET", "get_albums"),
+        ("/v1/artists", "GET", "get_artists"),
+        ("/v1/audio-features", "GET", "get_audio_features"),
+        ("/v1/albums/(\\w+)/tracks", "GET", "get_album_tracks"),
+        ("/v1/artists/(\\w+)/top-tracks", "GET", "get_artist_top_tracks"),
+        ("/v1/playlists/(\\w+)", "GET", "get_playlist"),
+        ("/v1/playlists/(\\w+)/tracks", "GET", "get_playlist_tracks"),
+        ("/v1/playlists/(\\w+)/tracks", "PUT", "put_playlist_tracks"),
+        ("/v1/playlists/(\\w+)/tracks", "POST", "post_playlist_tracks"),
+        ("/v1/playlists/(\\w+)/tracks", "DELETE", "delete_playlist_tracks"),
+        ("/v1/users/([^/]+)/playlists", "GET", "get_user_playlists"),
+        ("/v1/users/([^/]+)/playlists", "POST", "post_user_playlist"),
+        ("/v1/me/playlists", "GET", "get_my_playlists"),
+        ("/v1/me", "GET", "get_me"),
+        ("/v1/me/tracks", "GET", "get_saved_tracks"),
+        ("/v1/me/albums", "GET", "get_saved_albums"),
+        ("/v1/me/top/tracks", "GET", "get_top_tracks"),
+        ("/v1/me/following", "GET", "get_following"),
+        ("/v1/search", "GET", "get_search"),
+        ("/v1/recommendations", "GET", "get_recommendations"),
+    ]
+]
+
+
+class _Lazy(object):
+    """a sequence of count items, made by make(i) only when sliced"""
+
+    def __init__(self, count, make):
+        self.count = count
+        self.make = make
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, key):
+        return [self.make(i) for i in range(*key.indices(self.count))]
+
+
+def _get_ids(params):
+    return [id for id in params.get("ids", "").split(",") if id]
+
+
+def _error(status, message):
+    return {"error": {"status": status, "message": message}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # keep alive, with each response sent in one write so small responses
+    # don't stall on delayed acks
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    wbufsize = 64 * 1024
+
+    def _serve(self, method):
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        payload = {}
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            payload = json.loads(self.rfile.read(length))
+        fake = self.server.fake
+        status, body = fake.handle(method, url.path, params, payload)
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if status == 429:
+            self.send_header("Retry-After", str(fake.retry_after))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._serve("GET")
+
+    def do_PUT(self):
+        self._serve("PUT")
+
+    def do_POST(self):
+        self._serve("POST")
+
+    def do_DELETE(self):
+        self._serve("DELETE")
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="a fake Spotify Web API")
+    parser.add_argument("--tracks", type=int, default=10000)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0)
+    parser.add_argument("--throttle-every", type=int, default=0)
+    parser.add_argument("--retry-after", type=float, default=1)
+    args = parser.parse_args()
+
+    fake = FakeSpotify(
+        Catalog(args.tracks),
+        args.port,
+        args.latency,
+        args.throttle_every,
+        args.retry_after,
+    ).start()
+    print("serving", args.tracks, "tracks at", fake.prefix)
+    for pid, playlist in fake.catalog.playlists.items():
+        print("  spotify:playlist:" + pid, playlist["name"])
+    try:
+        fake.thread.join()
+    except KeyboardInterrupt:
+        fake.stop()
+        sys.exit(0)
@@ -1,9 +1,11 @@
 import requests
 import random
+import collections
 from .track_manager import tlib
+from .standard_plugs import BufferedSource
 
 
-class BoilTheFrogSource(object):
+class BoilTheFrogSource(BufferedSource):
     """
     a PBL source that generates a list of tracks that gradually go from the
     starting artist to the ending artist
@@ -17,16 +19,13 @@ class BoilTheFrogSource(object):
         self.name = "Path from " + start + " to " + end
         self.start = start
         self.end = end
-        self.tracks = None
+        self.buffer = collections.deque()
+        self.filling = True
 
-    def next_track(self):
-        if self.tracks == None:
-            self.tracks = self._get_path(self.start, self.end)
-
-        if len(self.tracks) > 0:
-            return self.tracks.pop(0)
-        else:
-            return None
+    def _fill(self, n):
+        if self.filling:
+            self.buffer.extend(self._get_path(self.start, self.end))
+            self.filling = False
 
     def _get_path(self, start, end):
         params = {"start": start, "end": end}
@@ -1,5 +1,6 @@
 import leveldb
-import simplejson as json
+from . import codec
+from . import cache_policy
 import os
 
 cache_path = os.environ.get('PBL_CACHE_PATH')
@@ -12,17 +13,47 @@ db = leveldb.LevelDB(cache_path)
 
 def put(type, tid, obj):
     key = get_key(type, tid)
-    js = json.dumps(obj)
+    js = _encode(type, obj)
     db.Put(key, js)
 
 def get(type, tid):
     key = get_key(type, tid)
     try:
-        js = db.Get(key)
-        return json.loads(js)
+        js = cache_policy.check_expiry(db.Get(key))
+        if js is None:
+            db.Delete(key)
+            return None
+        return codec.decode(js)
+    except:
+        return _get_legacy(type, tid)
+
+def _get_legacy(type, tid):
+    ''' reads an entry written before keys were versioned, and moves it
+        over to the new key '''
+    key = cache_policy.get_legacy_key(type, tid)
+    if key is None:
+        return None
+    try:
+        obj = codec.decode(db.Get(key))
     except:
         return None
+    if obj is not None:
+        put(type, tid, obj)
+    return obj
+
+def get_many(type, tids):
+    return [get(type, tid) for tid in tids]
+
+def put_many(type, objs):
+    ''' puts a dict of id to object in a single write batch '''
+    batch = leveldb.WriteBatch()
+    for tid, obj in objs.items():
+        batch.Put(get_key(type, tid), _encode(type, obj))
+    db.Write(batch)
+
+def _encode(type, obj):
+    ttl = cache_policy.get_ttl(type, obj)
+    return cache_policy.add_expiry(codec.encode(obj), ttl)
 
 def get_key(type, id):
-    return type + '-' + id
-    
+    return cache_policy.get_key(type, id)
@@ -0,0 +1,169 @@
+"""
+An in-process LRU tier that sits in front of a cache backend, so items
+looked up again by another job in the same worker don't go back to redis
+or leveldb. It has the same interface as the backend modules.
+
+The tier is bounded by its number of entries, so types whose entries hold
+a whole playlist are kept out of it. They go straight to the backend.
+
+Configured through the environment:
+
+    PBL_L1_SIZE   maximum number of entries, 0 turns the tier off
+                  (default 10000)
+    PBL_L1_TTL    default seconds an entry lives (default 3600)
+    PBL_L1_TTLS   per type seconds, such as 'item=86400,spotify=3600'
+"""
+
+import os
+import time
+import threading
+import collections
+from . import cache_policy
+
+DEFAULT_SIZE = 10000
+DEFAULT_TTL = 3600
+
+# entries of these types can hold thousands of track ids each
+BYPASS_TYPES = set(["playlist", "saved_playlist"])
+
+
+class LRUCache(object):
+    """
+    A size bounded, thread safe LRU with per type TTLs, layered over a
+    cache backend. Reads fall through to the backend on a miss and writes
+    go to both. Cached objects are shared, so callers mustn't modify what
+    they get back.
+
+    :param backend: the cache module to front
+    :param max_size: the maximum number of entries
+    :param ttl: the default time to live in seconds
+    :param ttls: dict of type to time to live, overriding the default
+    :param bypass: the types that aren't held in the tier
+    """
+
+    def __init__(
+        self,
+        backend,
+        max_size=DEFAULT_SIZE,
+        ttl=DEFAULT_TTL,
+        ttls=None,
+        bypass=BYPASS_TYPES,
+    ):
+        self.backend = backend
+        self.name = "lru+" + backend.name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.ttls = ttls or {}
+        self.bypass = bypass
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, type, tid):
+        if type in self.bypass:
+            return self.backend.get(type, tid)
+        obj = self._lookup(type, tid)
+        if obj is None:
+            obj = self.backend.get(type, tid)
+            if obj is not None:
+                self._store(type, {tid: obj})
+        return obj
+
+    def get_many(self, type, tids):
+        if type in self.bypass:
+            return self.backend.get_many(type, tids)
+        out = [self._lookup(type, tid) for tid in tids]
+        missing = [tid for tid, obj in zip(tids, out) if obj is None]
+        if missing:
+            found = dict(zip(missing, self.backend.get_many(type, missing)))
+            fresh = {}
+            for i, tid in enumerate(tids):
+                if out[i] is None and found.get(tid) is not None:
+                    out[i] = found[tid]
+                    fresh[tid] = found[tid]
+            self._store(type, fresh)
+        return out
+
+    def put(self, type, tid, obj):
+        self.backend.put(type, tid, obj)
+        self._store(type, {tid: obj})
+
+    def put_many(self, type, objs):
+        self.backend.put_many(type, objs)
+        self._store(type, objs)
+
+    def stats(self):
+        """the hit, miss, eviction and expiration counts and the size"""
+        with self.lock:
+            return {
+                "name": self.name,
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def _lookup(self, type, tid):
+        key = (type, tid)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, obj = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return obj
+
+    def _store(self, type, objs):
+        if not objs or type in self.bypass:
+            return
+        now = time.monotonic()
+        expires = now + self.ttls.get(type, self.ttl)
+        missing_expires = min(expires, now + cache_policy.negative_ttl)
+        with self.lock:
+            for tid, obj in objs.items():
+                key = (type, tid)
+                if cache_policy.is_missing(obj):
+                    self.entries[key] = (missing_expires, obj)
+                else:
+                    self.entries[key] = (expires, obj)
+                self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+
+def parse_ttls(spec):
+    """parses 'type=seconds,type=seconds' into a dict"""
+    ttls = {}
+    for part in spec.split(","):
+        if "=" in part:
+            type, seconds = part.split("=", 1)
+            ttls[type.strip()] = float(seconds)
+    return ttls
+
+
+def from_env(backend):
+    """wraps the backend in an LRU configured from the environment, or
+    returns it as is when PBL_L1_SIZE is 0"""
+    size = int(os.environ.get("PBL_L1_SIZE", DEFAULT_SIZE))
+    if size <= 0:
+        return backend
+    ttl = float(os.environ.get("PBL_L1_TTL", DEFAULT_TTL))
+    ttls = parse_ttls(os.environ.get("PBL_L1_TTLS", ""))
+    return LRUCache(backend, size, ttl, ttls)
@@ -0,0 +1,134 @@
+"""
+Paces the process's Spotify requests.
+
+All requests draw from one token bucket. When Spotify answers 429 every
+thread holds off for the Retry-After time, and the request that got the
+429 is retried instead of failing its job. Interactive requests, from
+someone waiting on /run, go ahead of scheduled ones whenever both are
+waiting for a token.
+
+Configured through the environment:
+
+    PBL_SPOTIFY_RATE         requests per second, 0 for no limit
+                             (default 20)
+    PBL_SPOTIFY_BURST        bucket size (default 40)
+    PBL_SPOTIFY_429_RETRIES  times a request is retried after a 429
+                             (default 5)
+    PBL_SPOTIFY_MAX_BACKOFF  longest Retry-After, in seconds, that is
+                             waited out; longer ones fail the request
+                             (default 120)
+"""
+
+import os
+import time
+import threading
+
+INTERACTIVE = 0
+SCHEDULED = 1
+
+DEFAULT_RATE = 20
+DEFAULT_BURST = 40
+DEFAULT_429_RETRIES = 5
+DEFAULT_MAX_BACKOFF = 120
+DEFAULT_RETRY_AFTER = 1
+
+
+class RateLimiter(object):
+    """
+    A thread safe token bucket with a shared backoff and two priorities
+
+    :param rate: tokens added per second, 0 for no limit
+    :param burst: the most tokens the bucket holds
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0
+        self.cond = threading.Condition()
+        self.waiting = [0, 0]
+        self.requests = 0
+        self.waits = 0
+        self.wait_time = 0
+        self.throttled = 0
+
+    def acquire(self, priority=SCHEDULED):
+        """
+        waits until a request may be made
+
+        :param priority: INTERACTIVE or SCHEDULED
+        """
+        start = time.monotonic()
+        with self.cond:
+            self.waiting[priority] += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    delay = self.blocked_until - now
+                    if delay <= 0:
+                        if not self.rate:
+                            break
+                        self._refill(now)
+                        ahead = priority == SCHEDULED and self.waiting[INTERACTIVE]
+                        if self.tokens >= 1 and not ahead:
+                            self.tokens -= 1
+                            break
+                        delay = max((1 - self.tokens) / self.rate, 0.01)
+                    self.cond.wait(delay)
+            finally:
+                self.waiting[priority] -= 1
+            self.requests += 1
+            waited = time.monotonic() - start
+            if waited > 0.001:
+                self.waits += 1
+                self.wait_time += waited
+            self.cond.notify_all()
+
+    def backoff(self, seconds):
+        """holds off every request for the given time, after a 429"""
+        with self.cond:
+            self.throttled += 1
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.cond.notify_all()
+
+    def stats(self):
+        with self.cond:
+            return {
+                "rate": self.rate,
+                "burst": self.burst,
+                "requests": self.requests,
+                "waits": self.waits,
+                "wait_time": round(self.wait_time, 3),
+                "throttled": self.throttled,
+                "waiting_interactive": self.waiting[INTERACTIVE],
+                "waiting_scheduled": self.waiting[SCHEDULED],
+            }
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+def get_retry_after(exception):
+    """the Retry-After seconds of a 429 SpotifyException"""
+    headers = getattr(exception, "headers", None) or {}
+    try:
+        return max(float(headers.get("Retry-After", DEFAULT_RETRY_AFTER)), 0)
+    except ValueError:
+        return DEFAULT_RETRY_AFTER
+
+
+def get_429_retries():
+    return int(os.environ.get("PBL_SPOTIFY_429_RETRIES", DEFAULT_429_RETRIES))
+
+
+def get_max_backoff():
+    return float(os.environ.get("PBL_SPOTIFY_MAX_BACKOFF", DEFAULT_MAX_BACKOFF))
+
+
+limiter = RateLimiter(
+    float(os.environ.get("PBL_SPOTIFY_RATE", DEFAULT_RATE)),
+    float(os.environ.get("PBL_SPOTIFY_BURST", DEFAULT_BURST)),
+)
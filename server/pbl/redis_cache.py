@@ -1,4 +1,5 @@
-import simplejson as json
+from . import codec
+from . import cache_policy
 import redis
 
 r = redis.StrictRedis(host='localhost', port=6380, db=0)
@@ -6,19 +7,47 @@ name = 'redis'
 
 def put(type, tid, obj):
     key = get_key(type, tid)
-    js = json.dumps(obj)
-    r.set(key, js)
+    js = codec.encode(obj)
+    r.set(key, js, ex=cache_policy.get_ttl(type, obj))
 
 def get(type, tid):
-    key = get_key(type, tid)
-    js = r.get(key)
-    if js:
-        return json.loads(js)
-    else:
-        return None
+    return get_many(type, [tid])[0]
+
+def get_many(type, tids):
+    ''' gets many objects in one round trip, None for the misses '''
+    if not tids:
+        return []
+    keys = [get_key(type, tid) for tid in tids]
+    out = [codec.decode(js) if js else None for js in r.mget(keys)]
+    _get_legacy(type, tids, out)
+    return out
+
+def _get_legacy(type, tids, out):
+    ''' fills misses from entries written before keys were versioned,
+        and moves them over to the new keys '''
+    misses = [i for i, obj in enumerate(out) if obj is None]
+    if not misses or cache_policy.get_legacy_key(type, tids[0]) is None:
+        return
+    legacy_keys = [cache_policy.get_legacy_key(type, tids[i]) for i in misses]
+    found = {}
+    for i, js in zip(misses, r.mget(legacy_keys)):
+        if js:
+            out[i] = codec.decode(js)
+            found[tids[i]] = out[i]
+    put_many(type, found)
+
+def put_many(type, objs):
+    ''' puts a dict of id to object in one round trip '''
+    if not objs:
+        return
+    pipe = r.pipeline(transaction=False)
+    for tid, obj in objs.items():
+        pipe.set(get_key(type, tid), codec.encode(obj),
+            ex=cache_policy.get_ttl(type, obj))
+    pipe.execute()
 
 def get_key(type, id):
-    return type + '-' + id
+    return cache_policy.get_key(type, id)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,104 @@
+"""
+De-duplicates concurrent fetches of the same annotations.
+
+Scheduler workers often run programs over the same popular playlists at
+the same moment, so they ask Spotify for the same track ids at once. A
+SingleFlight tracks which (type, id) pairs are being fetched. A caller
+only fetches the ids that nobody else is fetching, and waits for the
+in-flight calls to deliver the rest.
+"""
+
+import threading
+
+# how long a caller waits on another thread's fetch before fetching the
+# ids itself
+WAIT_TIMEOUT = 60
+
+
+class _Call(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.results = {}
+        self.failed = False
+
+
+class SingleFlight(object):
+    """
+    Shares in-flight fetches between threads, keyed on (type, id)
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.fetched = 0
+        self.shared = 0
+
+    def fetch(self, type, ids, fetch):
+        """
+        Gets the values for a batch of ids. The ids no other thread is
+        fetching are passed to fetch in a single call. The rest come from
+        the calls already in flight. If one of those fails or takes too
+        long, its ids are fetched again here, directly.
+
+        :param type: the type of value, such as 'audio'
+        :param ids: the ids to get
+        :param fetch: function that takes a list of ids and returns a dict
+                      of id to value, leaving out the ids it has no value
+                      for
+        :returns: dict of id to value
+        """
+        mine = []
+        theirs = {}
+        seen = set()
+        with self.lock:
+            for id in ids:
+                if id in seen:
+                    continue
+                seen.add(id)
+                other = self.calls.get((type, id))
+                if other:
+                    theirs[id] = other
+                else:
+                    mine.append(id)
+            if mine:
+                call = _Call()
+                for id in mine:
+                    self.calls[(type, id)] = call
+            self.fetched += len(mine)
+            self.shared += len(theirs)
+
+        results = {}
+        if mine:
+            try:
+                call.results = fetch(mine)
+                results.update(call.results)
+            except BaseException:
+                call.failed = True
+                raise
+            finally:
+                with self.lock:
+                    for id in mine:
+                        del self.calls[(type, id)]
+                call.done.set()
+
+        retry = []
+        for id, other in theirs.items():
+            if other.done.wait(WAIT_TIMEOUT) and not other.failed:
+                if id in other.results:
+                    results[id] = other.results[id]
+            else:
+                retry.append(id)
+        if retry:
+            results.update(fetch(retry))
+        return results
+
+    def stats(self):
+        with self.lock:
+            return {
+                "in_flight": len(self.calls),
+                "fetched": self.fetched,
+                "shared": self.shared,
+            }
+
+
+inflight = SingleFlight()
@@ -0,0 +1,106 @@
+"""
+Bookkeeping for keeping tracks by the same artist apart in an output
+stream, shared by the artist separating components.
+
+ArtistSpacing remembers where each artist last played, so the distance
+to a candidate is a dict lookup instead of a scan of the history.
+Lookaside holds back tracks whose artist played too recently and hands
+them out again, earliest arrival first, once their artist is far enough
+back.
+"""
+
+import sys
+import heapq
+import collections
+
+
+class ArtistSpacing(object):
+    """
+    the play positions of the artists in an output stream
+    """
+
+    def __init__(self):
+        self.last = {}
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, artist):
+        """records a play by the artist"""
+        self.last[artist] = self.count
+        self.count += 1
+
+    def separation(self, artist):
+        """the distance back to the artist's last play, 1 if it was the
+        last track played, sys.maxsize if it has not played"""
+        if artist in self.last:
+            return self.count - self.last[artist]
+        return sys.maxsize
+
+    def ready_at(self, artist, min_separation):
+        """the play count at which the artist is min_separation back"""
+        if artist in self.last:
+            return self.last[artist] + min_separation
+        return 0
+
+
+class Lookaside(object):
+    """
+    tracks held back for artist separation, queued per artist in order of
+    arrival. Artists with held tracks sit in one of two heaps: waiting,
+    by the play count at which they may play again, or ready, by the
+    arrival of their oldest held track.
+
+    :param spacing: the ArtistSpacing of the output stream
+    :param min_separation: the distance an artist must be back to play
+    """
+
+    def __init__(self, spacing, min_separation):
+        self.spacing = spacing
+        self.min_separation = min_separation
+        self.queues = {}
+        self.waiting = []
+        self.ready = []
+        self.arrivals = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def hold(self, track, artist):
+        """holds back a track by the given artist"""
+        queue = self.queues.get(artist)
+        if queue is None:
+            queue = self.queues[artist] = collections.deque()
+            ready_at = self.spacing.ready_at(artist, self.min_separation)
+            heapq.heappush(self.waiting, (ready_at, artist))
+        queue.append((self.arrivals, track))
+        self.arrivals += 1
+        self.size += 1
+
+    def take(self):
+        """removes and returns the earliest held track whose artist may
+        play now, or None if there isn't one"""
+        now = len(self.spacing)
+        while self.waiting and self.waiting[0][0] <= now:
+            ready_at, artist = heapq.heappop(self.waiting)
+            heapq.heappush(self.ready, (self.queues[artist][0][0], artist))
+
+        while self.ready:
+            arrival, artist = heapq.heappop(self.ready)
+            # the artist may have played since it was made ready
+            ready_at = self.spacing.ready_at(artist, self.min_separation)
+            if ready_at > now:
+                heapq.heappush(self.waiting, (ready_at, artist))
+                continue
+
+            queue = self.queues[artist]
+            arrival, track = queue.popleft()
+            if queue:
+                heapq.heappush(self.ready, (queue[0][0], artist))
+            else:
+                del self.queues[artist]
+            self.size -= 1
+            return track
+        return None
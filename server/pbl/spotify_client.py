@@ -0,0 +1,157 @@
+"""
+Spotify clients that share one HTTP connection pool per worker process.
+
+spotipy builds a requests session, and with it a fresh pool of TLS
+connections, for every client it makes. The engine makes a client for
+every program execution, so every run used to pay for new handshakes to
+api.spotify.com. Here all clients share one session; a client per run only
+carries the run's bearer token.
+
+The pool size comes from PBL_HTTP_POOL_SIZE (default 16). stats() reports
+it along with the connections opened and the requests made over them.
+
+Every request goes through the process wide rate limiter (see
+rate_limiter), which also handles 429s, so the session doesn't retry them.
+
+PBL_SPOTIFY_API_PREFIX, if set, replaces the https://api.spotify.com/v1/
+prefix of every client, such as to run against fake_spotify.
+"""
+
+import os
+import threading
+import requests
+import urllib3
+import spotipy
+from spotipy.oauth2 import SpotifyClientCredentials
+from . import rate_limiter
+from .rate_limiter import limiter
+
+DEFAULT_POOL_SIZE = 16
+
+session = None
+credentials_manager = None
+lock = threading.Lock()
+counts = {"clients": 0, "requests": 0}
+
+
+class PooledSpotify(spotipy.Spotify):
+    """
+    A spotipy client that uses the shared session and paces its requests
+    through the rate limiter. spotipy closes a client's session when the
+    client is collected, which would drop the pooled connections, so this
+    one leaves it open.
+    """
+
+    priority = rate_limiter.SCHEDULED
+
+    def __del__(self):
+        pass
+
+    def _internal_call(self, method, url, payload, params):
+        retries = rate_limiter.get_429_retries()
+        for attempt in range(retries + 1):
+            limiter.acquire(self.priority)
+            try:
+                return super(PooledSpotify, self)._internal_call(
+                    method, url, payload, params
+                )
+            except spotipy.SpotifyException as e:
+                if e.http_status != 429:
+                    raise
+                retry_after = rate_limiter.get_retry_after(e)
+                limiter.backoff(min(retry_after, rate_limiter.get_max_backoff()))
+                if attempt == retries or retry_after > rate_limiter.get_max_backoff():
+                    raise
+
+
+def get_pool_size():
+    return int(os.environ.get("PBL_HTTP_POOL_SIZE", DEFAULT_POOL_SIZE))
+
+
+def get_session():
+    """the process wide session, with the retry policy spotipy gives its
+    own sessions, less the 429s"""
+    global session
+    with lock:
+        if session is None:
+            retry = urllib3.Retry(
+                total=spotipy.Spotify.max_retries,
+                connect=None,
+                read=False,
+                allowed_methods=frozenset(["GET", "POST", "PUT", "DELETE"]),
+                status=spotipy.Spotify.max_retries,
+                backoff_factor=0.3,
+                status_forcelist=[
+                    code for code in spotipy.Spotify.default_retry_codes if code != 429
+                ],
+                respect_retry_after_header=False,
+            )
+            size = get_pool_size()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=4, pool_maxsize=size, max_retries=retry
+            )
+            new_session = requests.Session()
+            new_session.mount("https://", adapter)
+            new_session.mount("http://", adapter)
+            new_session.hooks["response"].append(_count_response)
+            session = new_session
+        return session
+
+
+def _count_response(response, *args, **kwargs):
+    with lock:
+        counts["requests"] += 1
+
+
+def get_credentials_manager():
+    """one client credentials manager per process, so its token is reused
+    across runs until it expires"""
+    global credentials_manager
+    with lock:
+        if credentials_manager is None:
+            credentials_manager = SpotifyClientCredentials()
+        return credentials_manager
+
+
+def make_client(auth_token=None, interactive=False):
+    """
+    Makes a spotify client on the shared session
+
+    :param auth_token: the user's bearer token, if None the app's client
+                       credentials are used
+    :param interactive: if True, the client's requests go ahead of
+                        scheduled ones when the rate limiter is busy
+    """
+    with lock:
+        counts["clients"] += 1
+    if auth_token:
+        client = PooledSpotify(auth=auth_token, requests_session=get_session())
+    else:
+        client = PooledSpotify(
+            client_credentials_manager=get_credentials_manager(),
+            requests_session=get_session(),
+        )
+    if interactive:
+        client.priority = rate_limiter.INTERACTIVE
+    prefix = os.environ.get("PBL_SPOTIFY_API_PREFIX")
+    if prefix:
+        client.prefix = prefix
+    return client
+
+
+def stats():
+    """the pool size, clients made, requests made and connections opened"""
+    connections = 0
+    if session is not None:
+        adapter = session.get_adapter("https://api.spotify.com")
+        for key in list(adapter.poolmanager.pools.keys()):
+            pool = adapter.poolmanager.pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+    with lock:
+        return {
+            "pool_size": get_pool_size(),
+            "clients": counts["clients"],
+            "requests": counts["requests"],
+            "connections": connections,
+        }
@@ -97,26 +97,44 @@ the following attributes::
 """
 
 from .track_manager import tlib
+from .standard_plugs import Component, BufferedSource
 from . import engine
 import spotipy
 import spotipy.util
+import collections
 import pprint
 import json
 from . import cache_manager
+from . import cache_policy
+from .single_flight import inflight
+from . import workers
+from . import spotify_client
 
 from spotipy.oauth2 import SpotifyClientCredentials
 
 
 cache = cache_manager.get_cache()
 
+# the most ids each endpoint takes in one request
+TRACKS_PER_REQUEST = 50
+AUDIO_FEATURES_PER_REQUEST = 100
+ALBUMS_PER_REQUEST = 20
+ARTISTS_PER_REQUEST = 50
 
-class PlaylistSource(object):
+
+class PlaylistSource(Component):
     """
     A PBL source that generates a stream of tracks from the given Spotify
     playlist. If only a name is provided, the playlist will be searched for.
     Search success can be improved if the owner of the playlist is also
     provided.
 
+    The first page of tracks is fetched on its own, along with the
+    playlist's snapshot_id, so a short pipeline only pays for one request.
+    After that, pages are fetched a pool's worth at a time, concurrently.
+    When the playlist hasn't changed since it was last read in full, the
+    pages after the first come from the cache instead.
+
     :param name: the name of the playlist
     :param uri: the uri of the playlist
     :param user: the owner of the playlist
@@ -134,6 +152,7 @@ class PlaylistSource(object):
         self.tracks = []
         self.total = 1
         self.cur_index = 0
+        self.snapshot = None
 
     def _get_uri_from_name(self, name):
         results = _get_spotify().search(q=name, type="playlist")
@@ -154,19 +173,74 @@ class PlaylistSource(object):
                 results = None
         return None
 
+    def resolve(self):
+        """finds the playlist by name, if there's no uri. Called by the
+        compiler so the lookup happens before the program runs."""
+        if self.uri == None:
+            try:
+                self.uri = resolve_uri(
+                    "playlist",
+                    self.name,
+                    self.user,
+                    lambda: (
+                        self._get_uri_from_name_and_user(self.name, self.user)
+                        if self.user
+                        else self._get_uri_from_name(self.name)
+                    ),
+                )
+            except spotipy.SpotifyException as e:
+                raise engine.PBLException(self, e.msg)
+
+            if not self.uri:
+                msg = "Can't find playlist named " + self.name
+                if self.user:
+                    msg += " for user " + self.user
+                raise engine.PBLException(self, msg)
+
     def _get_more_tracks(self):
         fields = self.uri.split(":")
         if len(fields) == 5:
             _, _, user, _, playlist_id = fields
         else:
             _, _, playlist_id = fields
+
+        sp = _get_spotify()
+        if self.next_offset == 0:
+            results = self._fetch_first_page(sp, playlist_id)
+            self.snapshot = PlaylistSnapshot(playlist_id, results.get("snapshot_id"))
+            self._add_page(results["tracks"])
+            self.snapshot.add(results["tracks"])
+            return
+
+        items = self.snapshot.cached_page(self.limit)
+        if items is not None:
+            self._add_page({"total": self.total, "items": items})
+            return
+
+        offsets = range(self.next_offset, self.total, self.limit)
+        offsets = offsets[: workers.get_max_workers()]
+        pages = workers.ordered_map(
+            lambda offset: self._fetch_page(sp, playlist_id, offset), offsets
+        )
+        for results in pages:
+            self._add_page(results)
+            self.snapshot.add(results)
+        if self.next_offset >= self.total:
+            self.snapshot.save()
+
+    def _fetch_first_page(self, sp, playlist_id):
         try:
-            results = _get_spotify().playlist_tracks(
-                playlist_id, limit=self.limit, offset=self.next_offset
-            )
+            return sp.playlist(playlist_id, fields="snapshot_id,tracks")
+        except spotipy.SpotifyException as e:
+            raise engine.PBLException(self, e.msg)
+
+    def _fetch_page(self, sp, playlist_id, offset):
+        try:
+            return sp.playlist_tracks(playlist_id, limit=self.limit, offset=offset)
         except spotipy.SpotifyException as e:
             raise engine.PBLException(self, e.msg)
 
+    def _add_page(self, results):
         self.total = results["total"]
         for item in results["items"]:
             track = item["track"]
@@ -176,22 +250,12 @@ class PlaylistSource(object):
         self.next_offset += self.limit
 
     def next_track(self):
-        if self.uri == None:
-            if self.user:
-                self.uri = self._get_uri_from_name_and_user(self.name, self.user)
-            else:
-                self.uri = self._get_uri_from_name(self.name)
-
-            if not self.uri:
-                msg = "Can't find playlist named " + self.name
-                if self.user:
-                    msg += " for user " + self.user
-                raise engine.PBLException(self, msg)
+        self.resolve()
 
         if (
             self.uri
             and self.cur_index >= len(self.tracks)
-            and len(self.tracks) < self.total
+            and self.next_offset < self.total
         ):
             self._get_more_tracks()
 
@@ -203,7 +267,345 @@ class PlaylistSource(object):
             return None
 
 
-class TrackSource(object):
+class PlaylistSnapshot(object):
+    """
+    The tracks of a playlist as of its snapshot_id. Sources that read a
+    playlist past its first page save it, and next time take the pages
+    after the first from the cache if the snapshot_id hasn't changed.
+    Only the fields that sources use are kept: the track id, name, first
+    artist, duration and date added.
+
+    Does nothing when there is no cache.
+
+    :param playlist_id: the playlist id
+    :param snapshot_id: the playlist's current snapshot_id
+    """
+
+    def __init__(self, playlist_id, snapshot_id):
+        self.playlist_id = playlist_id
+        self.snapshot_id = None
+        if cache_manager.is_enabled(cache):
+            self.snapshot_id = snapshot_id
+        self.items = []
+        self.cached = None
+        self.position = 0
+
+    def cached_page(self, limit):
+        """
+        The items of the next page of playlist tracks, from the tracks
+        cached for the snapshot, or None if they aren't cached. The cache
+        is read on the first call, each call only expands its own page.
+
+        :param limit: the most items to return
+        """
+        if self.cached is None:
+            self.cached = self._load()
+        if not self.cached:
+            return None
+        page = self.cached[self.position : self.position + limit]
+        self.position += len(page)
+        return [_expand_playlist_item(item) for item in page]
+
+    def _load(self):
+        """the compact items cached for the snapshot, or an empty list.
+        The cached items pick up after the tracks added so far."""
+        if not self.snapshot_id:
+            return []
+        entry = cache.get("playlist", self.playlist_id)
+        if entry and entry["snapshot_id"] == self.snapshot_id:
+            self.snapshot_id = None
+            self.position = len(self.items)
+            self.items = []
+            return entry["items"]
+        return []
+
+    def add(self, results):
+        """keeps the tracks of a page, in order
+
+        :param results: a page of playlist tracks
+        """
+        if self.snapshot_id:
+            for item in results["items"]:
+                track = item["track"]
+                if track and "id" in track:
+                    self.items.append(_compact_track(track) + [item["added_at"]])
+
+    def save(self):
+        """caches the tracks added so far under the snapshot_id"""
+        if self.snapshot_id:
+            entry = {"snapshot_id": self.snapshot_id, "items": self.items}
+            cache.put("playlist", self.playlist_id, entry)
+            self.snapshot_id = None
+            self.items = []
+
+
+def _expand_playlist_item(item):
+    return {"track": _expand_track(item[:4]), "added_at": item[4]}
+
+
+def _compact_track(track):
+    """the fields of a track that _add_track needs, as a list for caching"""
+    artist = track["artists"][0]["name"]
+    return [track["id"], track["name"], artist, track["duration_ms"]]
+
+
+def _expand_track(compact):
+    id, name, artist, duration_ms = compact
+    return {
+        "id": id,
+        "name": name,
+        "artists": [{"name": artist}],
+        "duration_ms": duration_ms,
+    }
+
+
+def iter_pages(fetch, limit=50, read_ahead=True):
+    """
+    Yields the pages of an offset paged endpoint in order, fetching a page
+    only when the one before it has been taken. With read_ahead the next
+    page is fetched on the shared pool while the caller works through the
+    current one. Stops at the reported total or when there is no next
+    page.
+
+    :param fetch: function that takes an offset and returns a page
+    :param limit: the page size
+    :param read_ahead: if True, fetch one page ahead
+    """
+    offset = 0
+    results = fetch(offset)
+    while results:
+        offset += limit
+        more = offset < results["total"]
+        if "next" in results and results["next"] is None:
+            more = False
+        ahead = None
+        if more and read_ahead:
+            ahead = workers.submit(fetch, offset)
+        yield results
+        if not more:
+            break
+        results = ahead.result() if ahead else fetch(offset)
+
+
+def get_artist_top_tracks(artist_ids, sp=None):
+    """
+    Gets the top tracks of many artists. Cached ones come from the
+    cache. The rest are fetched concurrently on the shared pool, and
+    shared with any other thread fetching the same artists.
+
+    :param artist_ids: the artist ids
+    :param sp: the spotify client
+    :returns: dict of artist id to a list of tracks, each with just the
+              fields _add_track needs
+    """
+    top_tracks, missing = {}, []
+    artist_ids = list(artist_ids)
+    for artist_id, tracks in zip(artist_ids, cache.get_many("top_tracks", artist_ids)):
+        if tracks is None:
+            missing.append(artist_id)
+        else:
+            top_tracks[artist_id] = tracks
+    sp = sp or _get_spotify()
+    top_tracks.update(
+        inflight.fetch(
+            "top_tracks", missing, lambda ids: _fetch_artist_top_tracks(sp, ids)
+        )
+    )
+    return {
+        artist_id: [_expand_track(track) for track in top_tracks.get(artist_id, [])]
+        for artist_id in artist_ids
+    }
+
+
+def _fetch_artist_top_tracks(sp, artist_ids):
+    def fetch(artist_id):
+        results = sp.artist_top_tracks(artist_id)
+        return [_compact_track(track) for track in results["tracks"]]
+
+    top_tracks = dict(zip(artist_ids, workers.ordered_map(fetch, artist_ids)))
+    cache.put_many("top_tracks", top_tracks)
+    return top_tracks
+
+
+SAVE_BATCH_SIZE = 100
+
+
+def save_playlist_tracks(sp, user, pid, tids, append=False, empty=False):
+    """
+    Sets the tracks of a playlist with as few write calls as it can. The
+    current tracks are diffed against the new ones, and the playlist is
+    left alone when nothing changed. A list that only grew at the end
+    gets the new tail appended, one that only shrank at the end gets its
+    tail removed, and one with a single track moved gets one reorder. The
+    append and the removal are only used when they take no more calls
+    than replacing the whole list, which is what anything else gets. An
+    empty list of tracks writes nothing, as saves always have, so a run
+    that came up empty doesn't wipe the playlist. The track ids written
+    are cached
+    under the playlist's new snapshot_id, so the next save of the same
+    playlist only needs the snapshot_id to diff against.
+
+    :param sp: the spotify client
+    :param user: the owner of the playlist
+    :param pid: the playlist id
+    :param tids: the track ids the playlist should hold
+    :param append: if True, add the tracks to the end of the playlist
+    :param empty: if True, the playlist is known to be empty, such as one
+                  just created, and isn't read
+    :returns: the number of write calls made
+    """
+    tids = list(tids)
+    if not tids:
+        return 0
+    if append:
+        return _add_playlist_tracks(sp, user, pid, tids)[0]
+
+    if empty:
+        snapshot_id, current = None, []
+    else:
+        snapshot_id, current = _get_saved_playlist(sp, pid)
+
+    replace_calls = max(1, _write_calls(len(tids)))
+    if current == tids:
+        writes, response = 0, {"snapshot_id": snapshot_id}
+    elif current is None or None in current:
+        writes, response = _replace_playlist_tracks(sp, user, pid, tids)
+    elif (
+        tids[: len(current)] == current
+        and _write_calls(len(tids) - len(current)) <= replace_calls
+    ):
+        writes, response = _add_playlist_tracks(sp, user, pid, tids[len(current) :])
+    elif (
+        current[: len(tids)] == tids
+        and _write_calls(len(current) - len(tids)) <= replace_calls
+    ):
+        writes, response = _remove_playlist_tail(
+            sp, pid, current, len(tids), snapshot_id
+        )
+    else:
+        move = _find_single_move(current, tids)
+        if move:
+            start, before = move
+            response = sp.playlist_reorder_items(
+                pid, start, before, snapshot_id=snapshot_id
+            )
+            writes = 1
+        else:
+            writes, response = _replace_playlist_tracks(sp, user, pid, tids)
+
+    if response and response.get("snapshot_id") and cache_manager.is_enabled(cache):
+        entry = {"snapshot_id": response["snapshot_id"], "tids": tids}
+        cache.put("saved_playlist", pid, entry)
+    return writes
+
+
+def _write_calls(count):
+    """the add or remove calls it takes to write count tracks"""
+    return (count + SAVE_BATCH_SIZE - 1) // SAVE_BATCH_SIZE
+
+
+def _get_saved_playlist(sp, pid):
+    """
+    the playlist's snapshot_id and track ids, with None for items that
+    have no track id such as local files. The ids come from the cache when
+    it holds the current snapshot. Returns None for the ids if they can't
+    be read.
+    """
+    fields = "snapshot_id,tracks(total,items(track(id)))"
+    try:
+        results = sp.playlist(pid, fields=fields)
+    except spotipy.SpotifyException:
+        return None, None
+    snapshot_id = results.get("snapshot_id")
+    entry = cache.get("saved_playlist", pid)
+    if snapshot_id and entry and entry["snapshot_id"] == snapshot_id:
+        return snapshot_id, entry["tids"]
+
+    def fetch(offset):
+        if offset == 0:
+            return results["tracks"]
+        fields = "total,items(track(id))"
+        return sp.playlist_items(
+            pid, fields=fields, limit=SAVE_BATCH_SIZE, offset=offset
+        )
+
+    tids = []
+    try:
+        for page in iter_pages(fetch, SAVE_BATCH_SIZE):
+            for item in page["items"]:
+                track = item.get("track")
+                tids.append(track.get("id") if track else None)
+    except spotipy.SpotifyException:
+        return snapshot_id, None
+    return snapshot_id, tids
+
+
+def _replace_playlist_tracks(sp, user, pid, tids):
+    response = sp.user_playlist_replace_tracks(user, pid, tids[:SAVE_BATCH_SIZE])
+    writes, added = _add_playlist_tracks(sp, user, pid, tids[SAVE_BATCH_SIZE:])
+    return writes + 1, added or response
+
+
+def _add_playlist_tracks(sp, user, pid, tids):
+    writes, response = 0, None
+    uris = ["spotify:track:" + id for id in tids]
+    for start in range(0, len(uris), SAVE_BATCH_SIZE):
+        turis = uris[start : start + SAVE_BATCH_SIZE]
+        response = sp.user_playlist_add_tracks(user, pid, turis)
+        writes += 1
+    return writes, response
+
+
+def _remove_playlist_tail(sp, pid, current, length, snapshot_id):
+    """removes the tracks from length on, a batch at a time from the end so
+    the positions of the ones still to go don't shift"""
+    writes, response = 0, None
+    end = len(current)
+    while end > length:
+        start = max(length, end - SAVE_BATCH_SIZE)
+        by_tid = collections.OrderedDict()
+        for position in range(start, end):
+            by_tid.setdefault(current[position], []).append(position)
+        items = [
+            {"uri": "spotify:track:" + tid, "positions": positions}
+            for tid, positions in by_tid.items()
+        ]
+        response = sp.playlist_remove_specific_occurrences_of_items(
+            pid, items, snapshot_id=snapshot_id
+        )
+        snapshot_id = response.get("snapshot_id") if response else None
+        writes += 1
+        end = start
+    return writes, response
+
+
+def _find_single_move(current, tids):
+    """
+    If tids is current with one track moved, returns the range_start and
+    insert_before of the reorder that makes it, otherwise None
+    """
+    if len(current) != len(tids):
+        return None
+    first = 0
+    while first < len(tids) and current[first] == tids[first]:
+        first += 1
+    last = len(tids) - 1
+    while last > first and current[last] == tids[last]:
+        last -= 1
+    if first >= last:
+        return None
+    if tids[last] == current[first]:
+        if tids[first:last] == current[first + 1 : last + 1]:
+            # moved down from first to last
+            return first, last + 1
+    if tids[first] == current[last]:
+        if tids[first + 1 : last + 1] == current[first:last]:
+            # moved up from last to first
+            return last, first
+    return None
+
+
+class TrackSource(BufferedSource):
     """A PBL Source that generates the a stream of tracks from the given list of
     URIs
 
@@ -213,11 +615,12 @@ class TrackSource(object):
     def __init__(self, uris=[]):
         self.name = "Tracks "
         self.uris = [normalize_uri(uri) for uri in uris]
-        self.buffer = None
+        self.buffer = collections.deque()
+        self.filling = True
 
-    def next_track(self):
-        if self.buffer == None:
-            self.buffer = []
+    def _fill(self, n):
+        if self.filling:
+            self.filling = False
             try:
                 results = _get_spotify().tracks(self.uris)
             except spotipy.SpotifyException as e:
@@ -229,13 +632,8 @@ class TrackSource(object):
                 else:
                     raise engine.PBLException(self, "bad track")
 
-        if len(self.buffer) > 0:
-            return self.buffer.pop(0)
-        else:
-            return None
-
 
-class TrackSourceByName(object):
+class TrackSourceByName(Component):
     """A PBL Source that generates a track given its artist and title
 
     :param title: the title and/or artist of the track
@@ -262,7 +660,7 @@ class TrackSourceByName(object):
             return None
 
 
-class AlbumSource(object):
+class AlbumSource(BufferedSource):
     """
     A PBL Source that generates a series of tracks given an album
 
@@ -276,7 +674,8 @@ class AlbumSource(object):
         self.title = title
         self.artist = artist
         self.name = "album " + title if title != None else uri
-        self.buffer = None
+        self.buffer = collections.deque()
+        self.filling = True
 
     def _get_uri_from_artist_title(self, artist, title):
         results = _get_spotify().search(
@@ -287,12 +686,25 @@ class AlbumSource(object):
         else:
             return None
 
-    def next_track(self):
-        if self.buffer == None:
-            if self.title != None and self.uri == None:
-                self.uri = self._get_uri_from_artist_title(self.artist, self.title)
+    def resolve(self):
+        """finds the album by title, if there's no uri"""
+        if self.title != None and self.uri == None:
+            name = self.title + " " + (self.artist if self.artist else "")
+            try:
+                self.uri = resolve_uri(
+                    "album",
+                    name,
+                    None,
+                    lambda: self._get_uri_from_artist_title(self.artist, self.title),
+                )
+            except spotipy.SpotifyException as e:
+                raise engine.PBLException(self, e.msg)
+
+    def _fill(self, n):
+        if self.filling:
+            self.filling = False
+            self.resolve()
 
-            self.buffer = []
             if self.uri:
                 _, _, id = self.uri.split(":")
 
@@ -308,13 +720,8 @@ class AlbumSource(object):
             else:
                 raise engine.PBLException(self, "Can't find that album")
 
-        if len(self.buffer) > 0:
-            return self.buffer.pop(0)
-        else:
-            return None
-
 
-class ArtistTopTracks(object):
+class ArtistTopTracks(BufferedSource):
     """A PBL Source that generates a series of top tracks by the given artist
 
     :param name: the name of the artist
@@ -325,14 +732,21 @@ class ArtistTopTracks(object):
         self.uri = normalize_uri(uri)
         self.name = "Top tracks by " + name
         self.artist_name = name
-        self.buffer = None
+        self.buffer = collections.deque()
+        self.filling = True
 
-    def next_track(self):
-        if self.buffer == None:
-            self.buffer = []
+    def resolve(self):
+        """finds the artist by name, if there's no uri"""
+        if self.uri == None:
+            try:
+                self.uri = find_artist_uri(self.artist_name)
+            except spotipy.SpotifyException as e:
+                raise engine.PBLException(self, e.msg)
 
-            if self.uri == None:
-                self.uri = _find_artist_by_name(_get_spotify(), self.artist_name)
+    def _fill(self, n):
+        if self.filling:
+            self.filling = False
+            self.resolve()
 
             if self.uri != None:
                 _, _, id = self.uri.split(":")
@@ -347,13 +761,8 @@ class ArtistTopTracks(object):
             else:
                 raise engine.PBLException(self, "Can't find that artist")
 
-        if len(self.buffer) > 0:
-            return self.buffer.pop(0)
-        else:
-            return None
-
 
-class PlaylistSave(object):
+class PlaylistSave(Component):
     """A PBL Sink that saves the source stream of tracks to the given playlist
 
     :param source: the source of tracks to be saved
@@ -402,6 +811,7 @@ class PlaylistSave(object):
 
         sp = _get_spotify()
         if sp:
+            created = False
             if not pid:
                 if self.playlist_name:
                     if self.create:
@@ -416,18 +826,13 @@ class PlaylistSave(object):
                             self.user, self.playlist_name
                         )
                         uri = response["uri"]
+                        created = True
                     pid = uri.split(":")[4]
             if pid:
-                batch_size = 100
-                uris = ["spotify:track:" + id for id in self.buffer]
-                for start in range(0, len(uris), batch_size):
-                    turis = uris[start : start + batch_size]
-                    if start == 0 and not self.append:
-                        print("replace", start)
-                        sp.user_playlist_replace_tracks(user, pid, turis)
-                    else:
-                        print("add", start)
-                        sp.user_playlist_add_tracks(user, pid, turis)
+                writes = save_playlist_tracks(
+                    sp, user, pid, self.buffer, append=self.append, empty=created
+                )
+                print("saved with", writes, "writes")
         else:
             print("Can't get authenticated access to spotify")
 
@@ -435,13 +840,11 @@ class PlaylistSave(object):
 def _get_spotify():
     spotify = engine.getEnv("spotify")
     if spotify == None:
+        # the client only carries this run's token, the connections
+        # underneath are shared by every run in the process
         auth_token = engine.getEnv("spotify_auth_token")
-        if auth_token:
-            spotify = spotipy.Spotify(auth=auth_token)
-        else:
-            spotify = spotipy.Spotify(
-                client_credentials_manager=SpotifyClientCredentials()
-            )
+        interactive = engine.getEnv("interactive") == True
+        spotify = spotify_client.make_client(auth_token, interactive)
         spotify.trace_out = True
         engine.setEnv("spotify", spotify)
     return spotify
@@ -477,6 +880,45 @@ def _find_artist_by_name(sp, name):
         return None
 
 
+def find_artist_uri(name):
+    """the uri of the top search hit for an artist name, through the
+    resolution cache"""
+    return resolve_uri(
+        "artist", name, None, lambda: _find_artist_by_name(_get_spotify(), name)
+    )
+
+
+def resolve_uri(kind, name, owner, lookup):
+    """
+    Resolves a name to a uri, through the cache. Program definitions
+    rarely change, so the searches and playlist listings behind a name are
+    only run again once the cached uri expires (see cache_policy). Names
+    that aren't found aren't cached.
+
+    :param kind: what the name is of, such as 'playlist' or 'artist'
+    :param name: the name
+    :param owner: the user the name is looked up under, or None
+    :param lookup: function that does the lookup, returning the uri or
+                   None
+    :returns: the uri, or None if it isn't found
+    """
+    key = _get_resolution_key(kind, name, owner)
+    entry = cache.get("resolved", key)
+    if entry:
+        return entry["uri"]
+    uri = lookup()
+    if uri:
+        cache.put("resolved", key, {"uri": uri})
+    return uri
+
+
+def _get_resolution_key(kind, name, owner):
+    # the lookups match names with lower() alone, so the key must not fold
+    # together names they would tell apart
+    name = name.lower()
+    return "%s:%s:%s" % (kind, owner or "", name)
+
+
 def _find_track_by_name(sp, name):
     results = _get_spotify().search(q=name, type="track")
     if len(results["tracks"]["items"]) > 0:
@@ -490,31 +932,89 @@ def _annotate_tracks_with_spotify_data_old(tids):
     if len(tids) > 0:
         # print 'annotate tracks with spotify', tids
         results = _get_spotify().tracks(tids)
+        notes = {}
         for track in results["tracks"]:
             if track and "id" in track:
-                tlib.annotate_track(track["id"], "spotify", track)
+                notes[track["id"]] = track
+        tlib.annotate_tracks("spotify", notes)
+
+
+def _annotate_tracks(type, fetch, tids, batch_size=None):
+    """
+    Annotates tracks from the cache, fetching the rest. Fetches are
+    shared with any other thread that is already fetching the same ids.
+
+    :param type: the annotation type
+    :param fetch: function that takes a spotify client and a list of
+                  track ids and returns a dict of track id to annotation,
+                  or None if the request failed in a way that says nothing
+                  about which tracks exist
+    :param tids: the track ids
+    :param batch_size: the most ids fetch takes at once. The ids are split
+                       into batches that are fetched concurrently. If None
+                       fetch gets them all.
+    """
+    tids = tlib.annotate_tracks_from_cache(type, tids)
+    if len(tids) > 0:
+        sp = _get_spotify()
+        notes = inflight.fetch(
+            type,
+            tids,
+            lambda ids: _fetch_and_cache(type, fetch, sp, ids, batch_size),
+        )
+        tlib.annotate_tracks(type, notes, add_to_cache=False)
+
+
+def _fetch_and_cache(type, fetch, sp, tids, batch_size=None):
+    """fetches annotations and caches them, along with negative entries
+    for the tracks Spotify has nothing for"""
+    notes = {}
+    batches = _split(tids, batch_size or len(tids))
+    found = workers.ordered_map(lambda batch: fetch(sp, batch), batches)
+    for batch, batch_notes in zip(batches, found):
+        if batch_notes is None:
+            continue
+        for tid in batch:
+            notes[tid] = batch_notes.get(tid, cache_policy.MISSING)
+    cache.put_many(type, notes)
+    return notes
+
+
+def _split(ids, size):
+    """splits a list of ids into batches of at most size"""
+    return [ids[start : start + size] for start in range(0, len(ids), size)]
 
 
 def _annotate_tracks_with_spotify_data_full(tids):
     # full annotation
     print("spotify full annotate", len(tids))
-    tids = tlib.annotate_tracks_from_cache("spotify", tids)
+    _annotate_tracks("spotify", _fetch_spotify_data_full, tids)
+
+
+def _fetch_spotify_data_full(sp, tids):
+    """fetches the tracks, then all of their albums, then all of their
+    artists, each in concurrent batches"""
+    notes = {}
     if len(tids) > 0:
         # print 'annotate tracks with spotify', tids
-        results = _get_spotify().tracks(tids)
+        pages = workers.ordered_map(
+            lambda batch: sp.tracks(batch)["tracks"],
+            _split(tids, TRACKS_PER_REQUEST),
+        )
         album_ids = set()
         artist_ids = set()
-        for track in results["tracks"]:
+        tracks = [track for page in pages for track in page if track]
+        for track in tracks:
             album_ids.add(track["album"]["id"])
             for artist in track["artists"]:
                 artist_ids.add(artist["id"])
 
         print("  spotify artist annotate", len(artist_ids))
         print("  spotify album annotate", len(album_ids))
-        albums = get_albums(album_ids)
-        artists = get_artists(artist_ids)
+        albums = get_albums(album_ids, sp)
+        artists = get_artists(artist_ids, sp)
 
-        for track in results["tracks"]:
+        for track in tracks:
             ntrack = {}
             primary_artist = artists[track["artists"][0]["id"]]
             album = albums[track["album"]["id"]]
@@ -542,46 +1042,59 @@ def _annotate_tracks_with_spotify_data_full(tids):
                     full_artists.append(artists[artist["id"]])
                 track["artists"] = full_artists
 
-            tlib.annotate_track(track["id"], "spotify", ntrack)
+            notes[track["id"]] = ntrack
+    return notes
 
 
-def get_albums(aids):
+def get_albums(aids, sp=None):
     album_map, naids = get_items_from_cache(aids)
-    max_per_batch = 20
-
-    start = 0
-    while start < len(naids):
-        batch = naids[start : start + max_per_batch]
-        results = _get_spotify().albums(batch)
-        for album in results["albums"]:
-            falbum = flatten_album(album)
-            album_map[falbum["id"]] = falbum
-            put_item_in_cache(falbum)
-        start += len(results["albums"])
+    sp = sp or _get_spotify()
+    album_map.update(inflight.fetch("item", naids, lambda ids: _fetch_albums(sp, ids)))
     return album_map
 
 
-def get_artists(aids):
-    max_per_batch = 50
+def _fetch_albums(sp, aids):
+    def fetch(batch):
+        results = sp.albums(batch)
+        return [flatten_album(album) for album in results["albums"] if album]
+
+    return _fetch_items(fetch, aids, ALBUMS_PER_REQUEST)
+
+
+def get_artists(aids, sp=None):
     artist_map, naids = get_items_from_cache(aids)
-    start = 0
-    while start < len(naids):
-        batch = naids[start : start + max_per_batch]
-        results = _get_spotify().artists(batch)
-        for artist in results["artists"]:
-            fartist = flatten_artist(artist)
-            artist_map[fartist["id"]] = fartist
-            put_item_in_cache(fartist)
-        start += len(results["artists"])
+    sp = sp or _get_spotify()
+    artist_map.update(
+        inflight.fetch("item", naids, lambda ids: _fetch_artists(sp, ids))
+    )
     return artist_map
 
 
+def _fetch_artists(sp, aids):
+    def fetch(batch):
+        results = sp.artists(batch)
+        return [flatten_artist(artist) for artist in results["artists"] if artist]
+
+    return _fetch_items(fetch, aids, ARTISTS_PER_REQUEST)
+
+
+def _fetch_items(fetch, aids, batch_size):
+    """fetches albums or artists in concurrent batches and caches them in
+    one go"""
+    item_map = {}
+    for items in workers.ordered_map(fetch, _split(list(aids), batch_size)):
+        for item in items:
+            item_map[item["id"]] = item
+    put_items_in_cache(item_map)
+    return item_map
+
+
 def get_items_from_cache(aids):
     map = {}
     naids = []
 
-    for aid in aids:
-        fitem = cache.get("item", aid)
+    aids = list(aids)
+    for aid, fitem in zip(aids, cache.get_many("item", aids)):
         if fitem:
             map[aid] = fitem
         else:
@@ -593,6 +1106,11 @@ def put_item_in_cache(item):
     cache.put("item", item["id"], item)
 
 
+def put_items_in_cache(items):
+    """puts a dict of id to item in the cache in one go"""
+    cache.put_many("item", items)
+
+
 def flatten_album(album):
     falbum = {}
     falbum["name"] = album["name"]
@@ -619,23 +1137,31 @@ def flatten_audio(audio):
 
 
 def _annotate_tracks_with_audio_features(tids):
-    otids = tlib.annotate_tracks_from_cache("audio", tids)
-    if len(otids) > 0:
-        stids = set(otids)
-        try:
-            results = _get_spotify().audio_features(otids)
-            for track in results:
-                if track and "id" in track:
-                    # print 'audio', json.dumps(track, indent=4)
-                    tlib.annotate_track(track["id"], "audio", track)
-        except spotipy.SpotifyException as e:
-            # we may get a 404 if we request features for a single
-            # track and the track is missing. In this case we can
-            # ignore the error
-            if e.http_status >= 400 and e.http_status < 500:
-                pass
-            else:
-                raise engine.PBLException(self, e.msg)
+    _annotate_tracks(
+        "audio", _fetch_audio_features, tids, AUDIO_FEATURES_PER_REQUEST
+    )
+
+
+def _fetch_audio_features(sp, tids):
+    notes = {}
+    try:
+        results = sp.audio_features(tids)
+        for track in results:
+            if track and "id" in track:
+                # print 'audio', json.dumps(track, indent=4)
+                notes[track["id"]] = track
+    except spotipy.SpotifyException as e:
+        # we may get a 404 if we request features for a single
+        # track and the track is missing, so that track is negatively
+        # cached. A 404 for a batch, or any other client error, doesn't
+        # say which tracks are missing, so nothing is cached.
+        if e.http_status == 404 and len(tids) == 1:
+            pass
+        elif e.http_status >= 400 and e.http_status < 500:
+            return None
+        else:
+            raise engine.PBLException(None, e.msg, "audio features")
+    return notes
 
 
 def _add_track(source, track):
@@ -680,7 +1206,8 @@ def normalize_uri(uri):
 _spotify_annotator = {
     "name": "spotify",
     "annotator": _annotate_tracks_with_spotify_data_full,
-    "batch_size": 50,
+    "batch_size": TRACKS_PER_REQUEST,
+    "planned": True,
 }
 
 tlib.add_annotator(_spotify_annotator)
@@ -688,7 +1215,8 @@ tlib.add_annotator(_spotify_annotator)
 _audio_annotator = {
     "name": "audio",
     "annotator": _annotate_tracks_with_audio_features,
-    "batch_size": 50,
+    "batch_size": AUDIO_FEATURES_PER_REQUEST,
+    "planned": True,
 }
 
 tlib.add_annotator(_audio_annotator)
@@ -714,7 +1242,7 @@ def test_full_annotation():
     _annotate_tracks_with_audio_features(tids)
 
     for tid in tids:
-        track = tlib.get_track(tid)
+        track = tlib.get_track_info(tid)
         print(json.dumps(track, indent=4))
         print()
 
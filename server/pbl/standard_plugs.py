@@ -1,12 +1,140 @@
 """A set of standard sources, filters, sorters and sinks"""
 
+import sys
 import random
 import datetime
+import collections
 from .track_manager import tlib
+from . import column_store
 import json
 
+DRAIN_BATCH_SIZE = 100
 
-class Annotator(object):
+# asks a source for everything it has left in one next_tracks call
+DRAIN_ALL = sys.maxsize
+
+
+class Component(object):
+    """
+    Base class for all PBL components. A component produces its stream one
+    track at a time via next_track. next_tracks pulls a batch of tracks in
+    one call; the default adapter simply loops over next_track, components
+    on the hot path override it with a native batch version.
+    """
+
+    def next_tracks(self, n):
+        """returns a list of up to n tracks. A short list means that the
+        stream ran dry, just as a None from next_track would.
+
+        :param n: the maximum number of tracks to return
+        """
+        out = []
+        while len(out) < n:
+            track = self.next_track()
+            if not track:
+                break
+            out.append(track)
+        return out
+
+
+def drain(source, max_size=0):
+    """
+    pulls all of the remaining tracks from a source. It is one block pull
+    for the whole stream, so the annotators upstream collect every track
+    that is missing an annotation and fetch them in a single planned phase
+
+    :param source: the source of tracks
+    :param max_size: if not zero, the maximum number of tracks to pull
+    """
+    return source.next_tracks(max_size or DRAIN_ALL)
+
+
+def iter_batches(source):
+    """
+    yields the remaining tracks of a source a batch at a time, for
+    consumers that need a single pass over them but not all of them at once
+
+    :param source: the source of tracks
+    """
+    while True:
+        tracks = source.next_tracks(DRAIN_BATCH_SIZE)
+        if tracks:
+            yield tracks
+        if len(tracks) < DRAIN_BATCH_SIZE:
+            return
+
+
+def pull_filtered(source, n, keep):
+    """
+    pulls batches from a source until n tracks have passed the keep
+    function or the source runs dry. Never pulls more from the source
+    than a track at a time filter would.
+
+    :param source: the source of tracks
+    :param n: the maximum number of tracks to return
+    :param keep: function that returns True if a track should be kept
+    """
+    return pull_block_filtered(
+        source, n, lambda tracks: [track for track in tracks if keep(track)]
+    )
+
+
+def pull_block_filtered(source, n, keep_block):
+    """
+    like pull_filtered, but filters a whole batch at a time
+
+    :param source: the source of tracks
+    :param n: the maximum number of tracks to return
+    :param keep_block: function that returns the tracks of a batch that
+                       should be kept, in order
+    """
+    out = []
+    while len(out) < n:
+        want = n - len(out)
+        tracks = source.next_tracks(want)
+        out.extend(keep_block(tracks))
+        if len(tracks) < want:
+            break
+    return out
+
+
+class BufferedSource(Component):
+    """
+    Base class for components that emit tracks they have gathered into
+    self.buffer, a deque, so taking tracks off the front is O(1).
+    Subclasses create the buffer and implement _fill.
+    """
+
+    def _fill(self, n):
+        """adds tracks to the end of the buffer, ideally at least n of
+        them. Adding none means the stream has run dry.
+
+        :param n: the number of tracks wanted
+        """
+        raise NotImplementedError()
+
+    def next_track(self):
+        if not self.buffer:
+            self._fill(1)
+        if self.buffer:
+            return self.buffer.popleft()
+        else:
+            return None
+
+    def next_tracks(self, n):
+        out = []
+        while len(out) < n:
+            want = n - len(out)
+            if len(self.buffer) < want:
+                self._fill(want - len(self.buffer))
+            if not self.buffer:
+                break
+            popleft = self.buffer.popleft
+            out.extend(popleft() for i in range(min(want, len(self.buffer))))
+        return out
+
+
+class Annotator(BufferedSource):
     """Annotates the tracks in a stream with external information
 
     :param source: the source of tracks
@@ -17,33 +145,29 @@ class Annotator(object):
         self.annotator = tlib.get_annotator(type)
         self.name = source.name + " annotated with " + type + " data"
         self.source = source
-        self.buffer = []
+        self.buffer = collections.deque()
         self.fillbuf = []
 
-    def next_track(self):
-        while len(self.fillbuf) < self.annotator["batch_size"]:
-            track = self.source.next_track()
-            if track:
-                self.buffer.append(track)
-                tinfo = tlib.get_track(track)
-                if type not in tinfo:
-                    self.fillbuf.append(track)
-            else:
-                break
+    def _fill(self, n):
+        # a downstream block pull is annotated in one go, so a planned
+        # annotator can fetch it all concurrently. The pull is bounded by
+        # the tracks examined, not the tracks that need annotating, or an
+        # already annotated stream would be pulled to its end
+        batch_size = max(self.annotator["batch_size"], n)
+        name = self.annotator["name"]
+        for track in self.source.next_tracks(batch_size):
+            self.buffer.append(track)
+            if not tlib.has_annotation(track, name):
+                self.fillbuf.append(track)
         if len(self.fillbuf) > 0:
             self._fetch_fillbuf()
 
-        if len(self.buffer) > 0:
-            return self.buffer.pop(0)
-        else:
-            return None
-
     def _fetch_fillbuf(self):
-        self.annotator["annotator"](self.fillbuf)
+        tlib.run_annotator(self.annotator, self.fillbuf)
         self.fillbuf = []
 
 
-class FakeTrackSource(object):
+class FakeTrackSource(Component):
     """
     Generates a series of fake tracks, suitable for testing
 
@@ -93,42 +217,33 @@ class Split(object):
     def __init__(self, source, split_index):
         self.source = source
         self.split_index = split_index
-        self.left_buffer = None
-        self.right_buffer = None
+        self.left_buffer = collections.deque()
+        self.right_buffer = collections.deque()
+        self.filling = True
 
     def _fill_buffer(self):
-        if self.left_buffer == None:
-            self.left_buffer = []
-            self.right_buffer = []
-            which = 0
-            while True:
-                track = self.source.next_track()
-                if track:
-                    if which < self.split_index:
-                        self.left_buffer.append(track)
-                    else:
-                        self.right_buffer.append(track)
-                else:
-                    break
-                which += 1
-
-    class left_side(object):
+        if self.filling:
+            self.filling = False
+            tracks = drain(self.source)
+            split = max(self.split_index, 0)
+            self.left_buffer.extend(tracks[:split])
+            self.right_buffer.extend(tracks[split:])
+
+    class left_side(BufferedSource):
         def __init__(self, outer):
             self.outer = outer
+            self.buffer = outer.left_buffer
             self.name = (
                 "first " + str(outer.split_index) + " tracks of " + outer.source.name
             )
 
-        def next_track(self):
+        def _fill(self, n):
             self.outer._fill_buffer()
-            if len(self.outer.left_buffer) > 0:
-                return self.outer.left_buffer.pop(0)
-            else:
-                return None
 
-    class right_side(object):
+    class right_side(BufferedSource):
         def __init__(self, outer):
             self.outer = outer
+            self.buffer = outer.right_buffer
             self.name = (
                 "After the first "
                 + str(outer.split_index)
@@ -136,18 +251,14 @@ class Split(object):
                 + outer.source.name
             )
 
-        def next_track(self):
+        def _fill(self, n):
             self.outer._fill_buffer()
-            if len(self.outer.right_buffer) > 0:
-                return self.outer.right_buffer.pop(0)
-            else:
-                return None
 
     def outputs(self):
         return [self.left_side(self), self.right_side(self)]
 
 
-class Looper(object):
+class Looper(Component):
     """
     Given a source, generate a stream of a given size by circulating through
     the tracks in the source
@@ -187,8 +298,27 @@ class Looper(object):
         self.cur_size += 1
         return track
 
+    def next_tracks(self, n):
+        out = []
+        if not self.looping:
+            want = min(n, self.max_size - self.cur_size)
+            if want <= 0:
+                return out
+            out = self.source.next_tracks(want)
+            self.buffer.extend(out)
+            self.cur_size += len(out)
+            if len(out) < want:
+                self.looping = True
+
+        if self.looping and len(self.buffer) > 0:
+            while len(out) < n and self.cur_size < self.max_size:
+                out.append(self.buffer[self.index % len(self.buffer)])
+                self.index += 1
+                self.cur_size += 1
+        return out
 
-class Shuffler(object):
+
+class Shuffler(Component):
     """Shuffles the tracks in the stream
 
     :param source: the source of tracks
@@ -202,21 +332,29 @@ class Shuffler(object):
         self.filling = True
         self.max_size = max_size
 
+    def _fill(self):
+        if self.filling:
+            self.filling = False
+            self.buffer = drain(self.source, self.max_size)
+            random.shuffle(self.buffer)
+
     def next_track(self):
-        while self.filling:
-            track = self.source.next_track()
-            if track and (self.max_size == 0 or len(self.buffer) < self.max_size):
-                self.buffer.append(track)
-            else:
-                self.filling = False
-                random.shuffle(self.buffer)
+        self._fill()
         if len(self.buffer) > 0:
             return self.buffer.pop()
         else:
             return None
 
+    def next_tracks(self, n):
+        self._fill()
+        split = max(len(self.buffer) - n, 0)
+        out = self.buffer[split:]
+        del self.buffer[split:]
+        out.reverse()
+        return out
 
-class DeDup(object):
+
+class DeDup(Component):
     """
     Remove any duplicate tracks in the stream
 
@@ -231,30 +369,33 @@ class DeDup(object):
         self.by_name = by_name
         self.history = set()
 
+    def _is_new(self, track):
+        if self.by_name:
+            tname = tlib.get_tn(track).lower()
+            if tname in self.history:
+                return False
+            else:
+                self.history.add(tname)
+
+        if track in self.history:
+            return False
+        else:
+            self.history.add(track)
+            return True
+
     def next_track(self):
         track = None
         while True:
             track = self.source.next_track()
-            if track:
-                if self.by_name:
-                    tname = tlib.get_tn(track).lower()
-                    if tname in self.history:
-                        continue
-                    else:
-                        self.history.add(tname)
-
-                if track in self.history:
-                    continue
-                else:
-                    self.history.add(track)
-                    break
-            else:
+            if not track or self._is_new(track):
                 break
-
         return track
 
+    def next_tracks(self, n):
+        return pull_filtered(self.source, n, self._is_new)
+
 
-class Buffer(object):
+class Buffer(Component):
     """
     Buffer up the given number of tracks
 
@@ -283,7 +424,7 @@ class Buffer(object):
             return None
 
 
-class LongerThan(object):
+class LongerThan(Component):
     """
     Limit the stream, if possible, to tracks with a duration that is longer
     than the given time
@@ -297,6 +438,7 @@ class LongerThan(object):
         self.source = source
         self.time = time
         self.cur_time = 0
+        self.duration = tlib.accessor("duration")
 
     def next_track(self):
         if self.cur_time > self.time:
@@ -304,12 +446,12 @@ class LongerThan(object):
         else:
             track = self.source.next_track()
             if track:
-                duration = tlib.get_attr(track, "duration")
+                duration = self.duration.get(track)
                 self.cur_time += duration
             return track
 
 
-class ShorterThan(object):
+class ShorterThan(Component):
     """
     Limit the stream, if possible, to tracks with a duration that is just
     shorter than the given time
@@ -323,6 +465,7 @@ class ShorterThan(object):
         self.source = source
         self.time = time
         self.cur_time = 0
+        self.duration = tlib.accessor("duration")
 
     def next_track(self):
         if self.cur_time >= self.time:
@@ -330,14 +473,14 @@ class ShorterThan(object):
         else:
             track = self.source.next_track()
             if track:
-                duration = tlib.get_attr(track, "duration")
+                duration = self.duration.get(track)
                 self.cur_time += duration
                 if self.cur_time >= self.time:
                     return None
             return track
 
 
-class Sorter(object):
+class Sorter(BufferedSource):
     """
     Sorts the tracks in the given stream by the given attribute
 
@@ -352,30 +495,42 @@ class Sorter(object):
             source.name + " sorted by " + attr + ("(reverse)" if reverse else "")
         )
         self.source = source
-        self.buffer = []
+        self.buffer = collections.deque()
         self.filling = True
         self.max_size = max_size
         self.attr = attr
+        self.accessor = tlib.accessor(attr)
         self.reverse = reverse
         self.annotator = get_annotator(source, attr)
 
-    def next_track(self):
-        while self.filling:
-            track = self.annotator.next_track()
-            if track and (self.max_size == 0 or len(self.buffer) < self.max_size):
-                self.buffer.append(track)
+    def _fill(self, n):
+        if self.filling:
+            self.filling = False
+            tracks = drain(self.annotator, self.max_size)
+            order = self._vector_order(tracks)
+            if order is None:
+                tracks.sort(reverse=self.reverse, key=self.accessor.get)
             else:
-                self.filling = False
-                self.buffer.sort(
-                    reverse=self.reverse, key=lambda tid: tlib.get_attr(tid, self.attr)
-                )
-        if len(self.buffer) > 0:
-            return self.buffer.pop(0)
-        else:
+                tracks = [tracks[i] for i in order]
+            self.buffer.extend(tracks)
+
+    def _vector_order(self, tracks):
+        """the sorted order of the tracks by numpy when every track has a
+        numeric value mirrored in the column store, None if it couldn't"""
+        if not column_store.available():
             return None
+        if len(tracks) < column_store.MIN_VECTOR_BLOCK:
+            return None
+        tlib.add_column(self.attr)
+        vals = tlib.gather(self.attr, tracks)
+        if vals is None or column_store.numpy.isnan(vals).any():
+            return None
+        # a stable sort on the negated values keeps ties in order, like
+        # list.sort(reverse=True) does
+        return (-vals if self.reverse else vals).argsort(kind="stable")
 
 
-class CustomSorter(object):
+class CustomSorter(BufferedSource):
     """
     Sorts the tracks by a custom key
 
@@ -389,26 +544,20 @@ class CustomSorter(object):
         self.name = source.name + " custom sorted"
         self.source = source
         self.keyfunc = keyfunc
-        self.buffer = []
+        self.buffer = collections.deque()
         self.filling = True
         self.max_size = max_size
         self.reverse = reverse
 
-    def next_track(self):
-        while self.filling:
-            track = self.source.next_track()
-            if track and (self.max_size == 0 or len(self.buffer) < self.max_size):
-                self.buffer.append(track)
-            else:
-                self.filling = False
-                self.buffer.sort(reverse=self.reverse, key=self.keyfunc)
-        if len(self.buffer) > 0:
-            return self.buffer.pop(0)
-        else:
-            return None
+    def _fill(self, n):
+        if self.filling:
+            self.filling = False
+            tracks = drain(self.source, self.max_size)
+            tracks.sort(reverse=self.reverse, key=self.keyfunc)
+            self.buffer.extend(tracks)
 
 
-class First(object):
+class First(BufferedSource):
     """
     Returns the first tracks from a stream
 
@@ -420,27 +569,16 @@ class First(object):
         self.name = "first " + str(sample_size) + " of " + source.name
         self.source = source
         self.sample_size = sample_size
-        self.buffer = []
+        self.buffer = collections.deque()
         self.filling = True
 
-    def next_track(self):
-        while self.filling and len(self.buffer) < self.sample_size:
-            track = self.source.next_track()
-            if track:
-                self.buffer.append(track)
-            else:
-                self.filling = False
-
-            if len(self.buffer) >= self.sample_size:
-                self.filling = False
+    def _fill(self, n):
+        if self.filling:
+            self.filling = False
+            self.buffer.extend(self.source.next_tracks(self.sample_size))
 
-        if len(self.buffer) > 0:
-            return self.buffer.pop(0)
-        else:
-            return None
 
-
-class Last(object):
+class Last(BufferedSource):
     """
     Returns the last tracks from a stream
 
@@ -452,25 +590,19 @@ class Last(object):
         self.name = "last " + str(sample_size) + " of " + source.name
         self.source = source
         self.sample_size = sample_size
-        self.buffer = []
+        # a ring buffer, only the last sample_size tracks are ever held.
+        # A sample_size of 0 has always meant the whole stream
+        self.buffer = collections.deque(maxlen=sample_size or None)
         self.filling = True
 
-    def next_track(self):
-        while self.filling:
-            track = self.source.next_track()
-            if track:
-                self.buffer.append(track)
-            else:
-                self.filling = False
-
-        self.buffer = self.buffer[-self.sample_size :]
-        if len(self.buffer) > 0:
-            return self.buffer.pop(0)
-        else:
-            return None
+    def _fill(self, n):
+        if self.filling:
+            self.filling = False
+            for tracks in iter_batches(self.source):
+                self.buffer.extend(tracks)
 
 
-class Reverse(object):
+class Reverse(Component):
     """
     Reverses the order of the tracks in the stream
 
@@ -497,7 +629,7 @@ class Reverse(object):
             return None
 
 
-class Sample(object):
+class Sample(BufferedSource):
     """
     Randomly sample tracks from the stream
 
@@ -509,26 +641,31 @@ class Sample(object):
         self.name = "Sampling " + str(sample_size) + " tracks from " + source.name
         self.source = source
         self.sample_size = sample_size
-        self.buffer = []
+        self.buffer = collections.deque()
         self.filling = True
 
-    def next_track(self):
-        while self.filling:
-            track = self.source.next_track()
-            if track:
-                self.buffer.append(track)
-            else:
-                self.filling = False
-                random.shuffle(self.buffer)
-                self.buffer = self.buffer[: self.sample_size]
-
-        if len(self.buffer) > 0:
-            return self.buffer.pop()
-        else:
-            return None
+    def _fill(self, n):
+        if self.filling:
+            self.filling = False
+            # reservoir sampling, a uniform sample in one pass that holds
+            # no more than sample_size tracks. It is shuffled at the end
+            # since the reservoir keeps the early tracks in stream order
+            reservoir = []
+            seen = 0
+            for tracks in iter_batches(self.source):
+                for track in tracks:
+                    seen += 1
+                    if len(reservoir) < self.sample_size:
+                        reservoir.append(track)
+                    else:
+                        which = random.randrange(seen)
+                        if which < self.sample_size:
+                            reservoir[which] = track
+            random.shuffle(reservoir)
+            self.buffer.extend(reservoir)
 
 
-class Concatenate(object):
+class Concatenate(Component):
     """
     Concatenate multiple streams
 
@@ -550,8 +687,18 @@ class Concatenate(object):
                 self.index += 1
         return track
 
+    def next_tracks(self, n):
+        out = []
+        while len(out) < n and self.index < len(self.source_list):
+            want = n - len(out)
+            tracks = self.source_list[self.index].next_tracks(want)
+            out.extend(tracks)
+            if len(tracks) < want:
+                self.index += 1
+        return out
+
 
-class Alternate(object):
+class Alternate(Component):
     """
     Alternate tracks from  multiple streams
 
@@ -580,7 +727,7 @@ class Alternate(object):
         return None
 
 
-class Conditional(object):
+class Conditional(Component):
     """
     Alternate tracks from  two streams based on a conditional
 
@@ -603,7 +750,7 @@ class Conditional(object):
             return self.falseSource.next_track()
 
 
-class Case(object):
+class Case(Component):
     """
     Selects tracks from streams based upon a mapping function
 
@@ -664,7 +811,7 @@ def get_simple_day_part():
         return "night"
 
 
-class AttributeRangeFilter(object):
+class AttributeRangeFilter(Component):
     """
     Filters tracks based upon range check of an attribute
 
@@ -683,29 +830,66 @@ class AttributeRangeFilter(object):
         self.min_val = min_val
         self.max_val = max_val
         self.match = match
+        self.accessor = tlib.accessor(attr)
         self.annotator = get_annotator(source, attr)
+        self.vectorize = (
+            column_store.available()
+            and "." in attr
+            and (match is None or column_store.is_number(match))
+            and (not min_val or column_store.is_number(min_val))
+            and (not max_val or column_store.is_number(max_val))
+        )
+
+    def _in_range(self, track):
+        attr_val = self.accessor.get(track)
+        if attr_val == None:
+            return False
+        if self.match != None and attr_val != self.match:
+            return False
+        if self.min_val and attr_val < self.min_val:
+            return False
+        if self.max_val and attr_val > self.max_val:
+            return False
+        return True
 
     def next_track(self):
         while True:
-            good = True
             track = self.annotator.next_track()
-            if track:
-                attr_val = tlib.get_attr(track, self.attr)
-                if attr_val == None:
-                    good = False
-                elif self.match != None and attr_val != self.match:
-                    good = False
-                else:
-                    if self.min_val and attr_val < self.min_val:
-                        good = False
-                    if self.max_val and attr_val > self.max_val:
-                        good = False
-            if good:
+            if not track or self._in_range(track):
                 break
         return track
 
-
-class TrackFilter(object):
+    def next_tracks(self, n):
+        if self.vectorize:
+            return pull_block_filtered(self.annotator, n, self._keep_block)
+        return pull_filtered(self.annotator, n, self._in_range)
+
+    def _keep_block(self, tracks):
+        """range checks a block of tracks against the column store. Tracks
+        without a mirrored numeric value get the per track check."""
+        if len(tracks) < column_store.MIN_VECTOR_BLOCK:
+            return [track for track in tracks if self._in_range(track)]
+        tlib.add_column(self.attr)
+        vals = tlib.gather(self.attr, tracks)
+        if vals is None:
+            return [track for track in tracks if self._in_range(track)]
+        numpy = column_store.numpy
+        missing = numpy.isnan(vals)
+        keep = ~missing
+        if self.match is not None:
+            keep &= vals == self.match
+        if self.min_val:
+            keep &= vals >= self.min_val
+        if self.max_val:
+            keep &= vals <= self.max_val
+        return [
+            track
+            for track, ok, slow in zip(tracks, keep.tolist(), missing.tolist())
+            if ok or (slow and self._in_range(track))
+        ]
+
+
+class TrackFilter(Component):
     """
     Removes tracks from the stream based on a second stream
 
@@ -723,32 +907,34 @@ class TrackFilter(object):
         self.invert = invert
         self.debug = False
 
-    def next_track(self):
+    def _load_bad_tracks(self):
         if self.bad_tracks == None:
-            self.bad_tracks = set()
-            while True:
-                track = self.filter.next_track()
-                if track:
-                    self.bad_tracks.add(track)
-                else:
-                    break
+            self.bad_tracks = set(drain(self.filter))
 
+    def _keep(self, track):
+        if self.invert and (track in self.bad_tracks):
+            return True
+        elif (not self.invert) and (track not in self.bad_tracks):
+            return True
+        else:
+            if self.debug:
+                print("filtered out", tlib.get_tn(track))
+            return False
+
+    def next_track(self):
+        self._load_bad_tracks()
         while True:
             track = self.source.next_track()
-            if track:
-                if self.invert and (track in self.bad_tracks):
-                    return track
-                elif (not self.invert) and (track not in self.bad_tracks):
-                    return track
-                else:
-                    if self.debug:
-                        print("filtered out", tlib.get_tn(track))
-            else:
+            if not track or self._keep(track):
                 break
         return track
 
+    def next_tracks(self, n):
+        self._load_bad_tracks()
+        return pull_filtered(self.source, n, self._keep)
+
 
-class ArtistFilter(object):
+class ArtistFilter(Component):
     """
     Removes tracks from the stream that have the given artists
 
@@ -779,7 +965,7 @@ class ArtistFilter(object):
         return track
 
 
-class Dumper(object):
+class Dumper(Component):
     """
     Dumps tracks to the terminal
 
@@ -792,21 +978,22 @@ class Dumper(object):
         self.source = source
         self.which = 1
         self.props = props
+        self.accessors = [tlib.accessor(prop) for prop in props]
 
     def next_track(self):
         track = self.source.next_track()
         if track:
             print(self.which, tlib.get_tn(track))
             if len(self.props) > 0:
-                for prop in self.props:
-                    val = tlib.get_attr(track, prop)
+                for prop, accessor in zip(self.props, self.accessors):
+                    val = accessor.get(track)
                     if val != None:
                         print("   ", prop, "->", val)
             self.which += 1
         return track
 
 
-class Debugger(object):
+class Debugger(Component):
     """
     Shows details on each track in the stream
 
@@ -820,13 +1007,13 @@ class Debugger(object):
     def next_track(self):
         track = self.source.next_track()
         if track:
-            tinfo = tlib.get_track(track)
+            tinfo = tlib.get_track_info(track)
             print(json.dumps(tinfo, indent=4))
             print()
         return track
 
 
-class SaveToJson(object):
+class SaveToJson(Component):
     """
     Saves the stream to json
     :param source: the source of tracks
@@ -855,7 +1042,7 @@ class SaveToJson(object):
         f = open(self.playlist_name, "w")
         out = []
         for tid in self.buffer:
-            t = tlib.get_track(tid)
+            t = tlib.get_track_info(tid)
             if t:
                 out.append(t)
 
@@ -864,14 +1051,13 @@ class SaveToJson(object):
 
 
 def get_annotator(source, attr):
-    fields = attr.split(".")
-    if len(fields) == 2:
-        type, name = fields
-        return Annotator(source, type)
+    accessor = tlib.accessor(attr)
+    if accessor.type is not None:
+        return Annotator(source, accessor.type)
     return source
 
 
-class PushableSource(object):
+class PushableSource(Component):
     """A source that allows you to push tracks
     back for later retrieval
     """
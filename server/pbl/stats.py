@@ -0,0 +1,20 @@
+"""
+Runtime counters from across the engine, gathered for the stats endpoint
+"""
+
+from . import spotify_client
+from .rate_limiter import limiter
+from .single_flight import inflight
+from . import track_manager
+
+
+def get_stats():
+    stats = {
+        "http": spotify_client.stats(),
+        "rate_limit": limiter.stats(),
+        "single_flight": inflight.stats(),
+        "last_minute_fetches": track_manager.tlib.last_minute_fetches,
+    }
+    if hasattr(track_manager.cache, "stats"):
+        stats["cache"] = track_manager.cache.stats()
+    return stats
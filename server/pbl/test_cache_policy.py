@@ -0,0 +1,160 @@
+"""
+Checks cache key naming, entry expiry and the fallback to the keys
+written before they were versioned::
+
+    python -m unittest pbl.test_cache_policy
+"""
+
+import unittest
+from . import codec
+from . import cache_policy
+from . import redis_cache
+
+
+class FakeRedis(object):
+    """the part of a redis client redis_cache uses, over a dict"""
+
+    def __init__(self):
+        self.data = {}
+        self.expiry = {}
+
+    def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+        self.expiry[key] = ex
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def execute(self):
+        pass
+
+
+class CachePolicyTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = (
+            cache_policy.namespace,
+            dict(cache_policy.ttls),
+            cache_policy.negative_ttl,
+            cache_policy.legacy_fallback,
+            dict(cache_policy.SCHEMA_VERSIONS),
+        )
+        cache_policy.namespace = "pbl"
+
+    def tearDown(self):
+        (
+            cache_policy.namespace,
+            cache_policy.ttls,
+            cache_policy.negative_ttl,
+            cache_policy.legacy_fallback,
+            cache_policy.SCHEMA_VERSIONS,
+        ) = self.saved
+
+    def test_key(self):
+        self.assertEqual(cache_policy.get_key("item", "abc"), "pbl:item:1:abc")
+        self.assertEqual(cache_policy.get_key("resolved", "x"), "pbl:resolved:2:x")
+        self.assertEqual(cache_policy.get_key("new", "x"), "pbl:new:1:x")
+
+    def test_ttl_jitter(self):
+        cache_policy.ttls["spotify"] = 1000
+        ttls = set(cache_policy.get_ttl("spotify", {}) for i in range(200))
+        self.assertTrue(min(ttls) >= 900 and max(ttls) <= 1100)
+        self.assertGreater(len(ttls), 1)
+
+    def test_ttl_default(self):
+        ttl = cache_policy.get_ttl("unknown type", {})
+        low = cache_policy.DEFAULT_TTL * (1 - cache_policy.TTL_JITTER)
+        self.assertGreaterEqual(ttl, int(low))
+
+    def test_ttl_never_expires(self):
+        cache_policy.ttls["audio"] = 0
+        self.assertIsNone(cache_policy.get_ttl("audio", {}))
+
+    def test_ttl_missing(self):
+        cache_policy.negative_ttl = 100
+        cache_policy.ttls["spotify"] = 10000
+        cache_policy.ttls["audio"] = 0
+        cache_policy.ttls["top_tracks"] = 50
+        missing = cache_policy.MISSING
+        self.assertLessEqual(cache_policy.get_ttl("spotify", missing), 110)
+        self.assertLessEqual(cache_policy.get_ttl("audio", missing), 110)
+        # the negative TTL never lengthens a type's own TTL
+        self.assertLessEqual(cache_policy.get_ttl("top_tracks", missing), 55)
+
+    def test_parse_ttls(self):
+        self.assertEqual(
+            cache_policy.parse_ttls("spotify=3600, audio=0,bad"),
+            {"spotify": 3600, "audio": 0},
+        )
+
+    def test_expiry(self):
+        data = b"\x01{}"
+        self.assertEqual(cache_policy.add_expiry(data, None), data)
+        self.assertEqual(cache_policy.check_expiry(data), data)
+
+        wrapped = cache_policy.add_expiry(data, 60)
+        self.assertEqual(wrapped[0], cache_policy.EXPIRY_ENVELOPE)
+        self.assertEqual(cache_policy.check_expiry(wrapped), data)
+
+        expired = cache_policy.add_expiry(data, -60)
+        self.assertIsNone(cache_policy.check_expiry(expired))
+
+    def test_expiry_of_legacy_entry(self):
+        # legacy JSON entries have no envelope and never expire here
+        data = b'{"id": "t1"}'
+        self.assertEqual(cache_policy.check_expiry(data), data)
+
+    def test_expiry_envelope_is_not_a_codec_header(self):
+        for format in codec.FORMATS.values():
+            for compression in codec.COMPRESSIONS.values():
+                header = format | compression << 2
+                self.assertNotEqual(header, cache_policy.EXPIRY_ENVELOPE)
+
+    def test_legacy_key(self):
+        self.assertEqual(cache_policy.get_legacy_key("item", "abc"), "item-abc")
+        self.assertIsNone(cache_policy.get_legacy_key("playlist", "abc"))
+        self.assertIsNone(cache_policy.get_legacy_key("resolved", "abc"))
+
+    def test_legacy_key_after_schema_bump(self):
+        cache_policy.SCHEMA_VERSIONS["item"] = 2
+        self.assertIsNone(cache_policy.get_legacy_key("item", "abc"))
+
+    def test_legacy_key_switched_off(self):
+        cache_policy.legacy_fallback = False
+        self.assertIsNone(cache_policy.get_legacy_key("item", "abc"))
+
+
+class LegacyFallbackTest(unittest.TestCase):
+    def setUp(self):
+        self.old_r = redis_cache.r
+        self.old_fallback = cache_policy.legacy_fallback
+        redis_cache.r = self.redis = FakeRedis()
+
+    def tearDown(self):
+        redis_cache.r = self.old_r
+        cache_policy.legacy_fallback = self.old_fallback
+
+    def test_fallback_moves_entry(self):
+        self.redis.data["item-t1"] = b'{"id": "t1"}'
+        redis_cache.put("item", "t2", {"id": "t2"})
+
+        out = redis_cache.get_many("item", ["t1", "t2", "t3"])
+        self.assertEqual(out, [{"id": "t1"}, {"id": "t2"}, None])
+        key = cache_policy.get_key("item", "t1")
+        self.assertEqual(codec.decode(self.redis.data[key]), {"id": "t1"})
+        self.assertIsNotNone(self.redis.expiry[key])
+
+    def test_no_fallback_when_off(self):
+        cache_policy.legacy_fallback = False
+        self.redis.data["item-t1"] = b'{"id": "t1"}'
+        self.assertEqual(redis_cache.get_many("item", ["t1"]), [None])
+
+    def test_no_fallback_for_new_types(self):
+        self.redis.data["playlist-p1"] = b'["t1"]'
+        self.assertEqual(redis_cache.get_many("playlist", ["p1"]), [None])
+
+
+if __name__ == "__main__":
+    unittest.main()
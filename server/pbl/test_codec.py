@@ -0,0 +1,107 @@
+"""
+Checks that cache entries round trip through every codec, and that
+headered entries and legacy JSON entries decode side by side::
+
+    python -m unittest pbl.test_codec
+"""
+
+import json
+import unittest
+from . import codec
+
+ENTRIES = [
+    {"id": "t1", "name": "Song", "artist": "Band", "duration": 201.5},
+    ["t1", "t2", "t3"],
+    "just a string",
+    12,
+    {"__missing__": True},
+    {"tracks": ["spotify:track:%06d" % i for i in range(200)]},
+]
+
+
+def codecs():
+    formats = ["json"]
+    if codec.msgpack is not None:
+        formats.append("msgpack")
+    compressions = ["none", "zlib"]
+    if codec.zstandard is not None:
+        compressions.append("zstd")
+    for format in formats:
+        for compression in compressions:
+            yield codec.Codec(format, compression)
+
+
+def legacy(obj):
+    """an entry as it was written before the codec, plain JSON"""
+    return json.dumps(obj).encode("utf-8")
+
+
+class CodecTest(unittest.TestCase):
+    def test_round_trip(self):
+        for c in codecs():
+            for obj in ENTRIES:
+                self.assertEqual(c.decode(c.encode(obj)), obj, c.name)
+
+    def test_header(self):
+        for c in codecs():
+            for obj in ENTRIES:
+                self.assertLess(c.encode(obj)[0], 0x20, c.name)
+
+    def test_legacy_entries(self):
+        for c in codecs():
+            for obj in ENTRIES:
+                self.assertEqual(c.decode(legacy(obj)), obj, c.name)
+
+    def test_mixed_entries(self):
+        # a cache moving over to the codec holds both kinds of entry
+        c = codec.Codec("json", "zlib")
+        stored = []
+        for i, obj in enumerate(ENTRIES):
+            stored.append(legacy(obj) if i % 2 else c.encode(obj))
+        self.assertEqual([c.decode(data) for data in stored], ENTRIES)
+
+    def test_other_codec_entries(self):
+        # the header says how an entry was written, so a reader configured
+        # differently still decodes it
+        writers = list(codecs())
+        for reader in writers:
+            for writer in writers:
+                data = writer.encode(ENTRIES[0])
+                self.assertEqual(reader.decode(data), ENTRIES[0])
+
+    def test_compress_min(self):
+        c = codec.Codec("json", "zlib", compress_min=256)
+        small = c.encode(ENTRIES[0])
+        large = c.encode(ENTRIES[-1])
+        self.assertEqual(small[0] >> 2 & 0x3, codec.NONE)
+        body = json.dumps(ENTRIES[0], separators=(",", ":")).encode("utf-8")
+        self.assertEqual(small[1:], body)
+        self.assertEqual(large[0] >> 2 & 0x3, codec.ZLIB)
+        self.assertLess(len(large), len(legacy(ENTRIES[-1])))
+
+    def test_no_compression(self):
+        c = codec.Codec("json", "none")
+        data = c.encode(ENTRIES[-1])
+        self.assertEqual(data[0], codec.JSON)
+
+    def test_empty(self):
+        for c in codecs():
+            self.assertIsNone(c.decode(b""))
+            self.assertIsNone(c.decode(None))
+
+    @unittest.skipIf(codec.msgpack is None, "msgpack is not installed")
+    def test_msgpack_not_installed(self):
+        data = codec.Codec("msgpack", "none").encode(ENTRIES[0])
+        old_msgpack = codec.msgpack
+        codec.msgpack = None
+        try:
+            c = codec.Codec("msgpack", "none")
+            self.assertEqual(c.name, "json+none")
+            self.assertIsNone(c.decode(data))
+            self.assertEqual(c.decode(legacy(ENTRIES[0])), ENTRIES[0])
+        finally:
+            codec.msgpack = old_msgpack
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+"""
+Checks the in-process LRU tier against a dict backed cache backend::
+
+    python -m unittest pbl.test_lru_cache
+"""
+
+import unittest
+from . import cache_policy
+from . import lru_cache
+
+
+class DictBackend(object):
+    """a cache backend module stand in, counting its reads"""
+
+    name = "dict"
+
+    def __init__(self):
+        self.entries = {}
+        self.reads = 0
+
+    def get(self, type, tid):
+        self.reads += 1
+        return self.entries.get((type, tid))
+
+    def get_many(self, type, tids):
+        self.reads += len(tids)
+        return [self.entries.get((type, tid)) for tid in tids]
+
+    def put(self, type, tid, obj):
+        self.entries[(type, tid)] = obj
+
+    def put_many(self, type, objs):
+        for tid, obj in objs.items():
+            self.put(type, tid, obj)
+
+
+class LRUCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = DictBackend()
+        self.old_negative_ttl = cache_policy.negative_ttl
+
+    def tearDown(self):
+        cache_policy.negative_ttl = self.old_negative_ttl
+
+    def make(self, max_size=3, **kwargs):
+        return lru_cache.LRUCache(self.backend, max_size, **kwargs)
+
+    def test_hit(self):
+        lru = self.make()
+        lru.put("spotify", "a", {"v": 1})
+        self.assertEqual(lru.get("spotify", "a"), {"v": 1})
+        self.assertEqual(self.backend.reads, 0)
+        self.assertEqual(lru.stats()["hits"], 1)
+
+    def test_miss_falls_through(self):
+        lru = self.make()
+        self.backend.put("spotify", "a", {"v": 1})
+        self.assertEqual(lru.get("spotify", "a"), {"v": 1})
+        self.assertEqual(lru.get("spotify", "a"), {"v": 1})
+        self.assertEqual(self.backend.reads, 1)
+        self.assertEqual(lru.get("spotify", "b"), None)
+        self.assertEqual(lru.stats()["misses"], 2)
+
+    def test_get_many(self):
+        lru = self.make()
+        lru.put("spotify", "a", 1)
+        self.backend.put("spotify", "b", 2)
+        self.assertEqual(lru.get_many("spotify", ["a", "b", "c"]), [1, 2, None])
+        self.assertEqual(self.backend.reads, 2)
+        self.assertEqual(lru.get_many("spotify", ["a", "b"]), [1, 2])
+        self.assertEqual(self.backend.reads, 2)
+
+    def test_eviction(self):
+        lru = self.make(max_size=3)
+        lru.put_many("spotify", {"a": 1, "b": 2, "c": 3})
+        # reading a makes b the least recently used entry
+        lru.get("spotify", "a")
+        lru.put("spotify", "d", 4)
+
+        self.assertEqual(lru.stats()["size"], 3)
+        self.assertEqual(lru.stats()["evictions"], 1)
+        self.assertEqual(list(lru.entries), [("spotify", k) for k in "cad"])
+        # an evicted entry is read back from the backend
+        self.assertEqual(lru.get("spotify", "b"), 2)
+        self.assertEqual(self.backend.reads, 1)
+
+    def test_expiry(self):
+        lru = self.make(ttl=3600, ttls={"spotify": -1})
+        lru.put("spotify", "a", 1)
+        lru.put("audio", "a", 2)
+        self.assertEqual(lru.get("spotify", "a"), 1)
+        self.assertEqual(lru.get("audio", "a"), 2)
+        self.assertEqual(self.backend.reads, 1)
+        self.assertEqual(lru.stats()["expirations"], 1)
+
+    def test_bypass(self):
+        lru = self.make()
+        self.assertEqual(lru.bypass, lru_cache.BYPASS_TYPES)
+        for type in lru_cache.BYPASS_TYPES:
+            lru.put(type, "p", ["t1", "t2"])
+            lru.put_many(type, {"q": ["t3"]})
+            self.assertEqual(lru.get(type, "p"), ["t1", "t2"])
+            self.assertEqual(lru.get_many(type, ["p", "q"]), [["t1", "t2"], ["t3"]])
+        self.assertEqual(lru.stats()["size"], 0)
+        self.assertEqual(lru.stats()["hits"], 0)
+        self.assertEqual(self.backend.reads, 3 * len(lru_cache.BYPASS_TYPES))
+
+    def test_missing_is_cached(self):
+        lru = self.make()
+        lru.put("spotify", "a", cache_policy.MISSING)
+        self.assertTrue(cache_policy.is_missing(lru.get("spotify", "a")))
+        self.assertEqual(self.backend.reads, 0)
+
+    def test_missing_gets_negative_ttl(self):
+        cache_policy.negative_ttl = -1
+        lru = self.make(ttl=3600)
+        lru.put_many("spotify", {"a": cache_policy.MISSING, "b": 1})
+        self.assertEqual(lru.get_many("spotify", ["a", "b"]), [cache_policy.MISSING, 1])
+        # a came from the backend, its L1 entry had expired
+        self.assertEqual(self.backend.reads, 1)
+        self.assertEqual(lru.stats()["expirations"], 1)
+
+    def test_missing_never_outlives_type_ttl(self):
+        cache_policy.negative_ttl = 3600
+        lru = self.make(ttl=3600, ttls={"spotify": -1})
+        lru.put("spotify", "a", cache_policy.MISSING)
+        lru.get("spotify", "a")
+        self.assertEqual(self.backend.reads, 1)
+
+    def test_parse_ttls(self):
+        self.assertEqual(
+            lru_cache.parse_ttls("item=86400, spotify=3600,bad"),
+            {"item": 86400.0, "spotify": 3600.0},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+"""
+Checks the requests PlaylistSource makes against the local fake Spotify,
+with and without the tracks of the playlist's snapshot in the cache::
+
+    python -m unittest pbl.test_playlist_source
+"""
+
+import os
+import unittest
+from . import engine
+from . import fake_spotify
+from . import spotify_client
+from . import spotify_plugs
+from .standard_plugs import drain
+
+USER = fake_spotify.USER
+
+
+class DictCache(object):
+    """a cache over a dict, counting its writes"""
+
+    name = "dict"
+
+    def __init__(self):
+        self.entries = {}
+        self.puts = 0
+
+    def get(self, type, id):
+        return self.entries.get((type, id))
+
+    def put(self, type, id, obj):
+        self.entries[(type, id)] = obj
+        self.puts += 1
+
+
+class PlaylistSourceTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.catalog = fake_spotify.Catalog(1000, playlist_sizes=[])
+        cls.fake = fake_spotify.FakeSpotify(cls.catalog).start()
+        cls.old_prefix = os.environ.get("PBL_SPOTIFY_API_PREFIX")
+        os.environ["PBL_SPOTIFY_API_PREFIX"] = cls.fake.prefix
+        cls.sp = spotify_client.make_client("test")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.fake.stop()
+        if cls.old_prefix is None:
+            del os.environ["PBL_SPOTIFY_API_PREFIX"]
+        else:
+            os.environ["PBL_SPOTIFY_API_PREFIX"] = cls.old_prefix
+
+    def setUp(self):
+        self.old_cache = spotify_plugs.cache
+        spotify_plugs.cache = self.cache = DictCache()
+        engine.setEnv("spotify", self.sp)
+
+    def tearDown(self):
+        spotify_plugs.cache = self.old_cache
+        engine.clearEnvData()
+
+    def playlist(self, size):
+        return self.catalog.add_playlist("test", USER, size=size)
+
+    def source(self, pid):
+        return spotify_plugs.PlaylistSource("test", "spotify:playlist:" + pid)
+
+    def expected(self, pid):
+        tracks = self.catalog.playlist_tracks(pid)
+        return [fake_spotify.make_id("T", t) for t in tracks]
+
+    def read(self, source, count=0):
+        """reads count tracks, or all of them, and returns the tracks and
+        the requests it took by route"""
+        self.fake.reset_stats()
+        tracks = drain(source, count)
+        routes = self.fake.stats()["routes"]
+        pages = routes.get("GET get_playlist_tracks", 0)
+        return tracks, routes.get("GET get_playlist", 0), pages
+
+    def test_short_read(self):
+        pid = self.playlist(1000)
+        tracks, playlists, pages = self.read(self.source(pid), 10)
+        self.assertEqual(tracks, self.expected(pid)[:10])
+        self.assertEqual((playlists, pages), (1, 0))
+        self.assertEqual(self.cache.puts, 0)
+
+    def test_single_page_not_cached(self):
+        pid = self.playlist(60)
+        tracks, playlists, pages = self.read(self.source(pid))
+        self.assertEqual(tracks, self.expected(pid))
+        self.assertEqual((playlists, pages), (1, 0))
+        self.assertEqual(self.cache.puts, 0)
+
+    def test_full_read_cached(self):
+        pid = self.playlist(250)
+        tracks, playlists, pages = self.read(self.source(pid))
+        self.assertEqual(tracks, self.expected(pid))
+        self.assertEqual((playlists, pages), (1, 2))
+        self.assertEqual(self.cache.puts, 1)
+
+        tracks, playlists, pages = self.read(self.source(pid))
+        self.assertEqual(tracks, self.expected(pid))
+        self.assertEqual((playlists, pages), (1, 0))
+        self.assertEqual(self.cache.puts, 1)
+
+    def test_cached_pages_expanded_lazily(self):
+        pid = self.playlist(500)
+        self.read(self.source(pid))
+        source = self.source(pid)
+        tracks, playlists, pages = self.read(source, 150)
+        self.assertEqual(tracks, self.expected(pid)[:150])
+        self.assertEqual((playlists, pages), (1, 0))
+        self.assertEqual(source.snapshot.position, 200)
+
+    def test_changed_playlist_refetched(self):
+        pid = self.playlist(250)
+        self.read(self.source(pid))
+        self.catalog.set_playlist_tracks(pid, list(range(300, 520)))
+        tracks, playlists, pages = self.read(self.source(pid))
+        self.assertEqual(tracks, self.expected(pid))
+        self.assertEqual((playlists, pages), (1, 2))
+        self.assertEqual(self.cache.puts, 2)
+
+    def test_no_cache(self):
+        spotify_plugs.cache = self.old_cache
+        if spotify_plugs.cache_manager.is_enabled(spotify_plugs.cache):
+            self.skipTest("a cache is configured")
+        pid = self.playlist(250)
+        for i in range(2):
+            tracks, playlists, pages = self.read(self.source(pid))
+            self.assertEqual(tracks, self.expected(pid))
+            self.assertEqual((playlists, pages), (1, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
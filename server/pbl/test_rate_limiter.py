@@ -0,0 +1,169 @@
+"""
+Checks the token bucket, the shared backoff after a 429 and the order in
+which waiting requests get their tokens. The 429 retries run against
+the local fake Spotify::
+
+    python -m unittest pbl.test_rate_limiter
+"""
+
+import os
+import time
+import threading
+import unittest
+import spotipy
+from . import fake_spotify
+from . import rate_limiter
+from . import spotify_client
+from .rate_limiter import INTERACTIVE, SCHEDULED
+
+
+def wait_for(check, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not check():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.001)
+
+
+def timed(func, *args):
+    start = time.monotonic()
+    func(*args)
+    return time.monotonic() - start
+
+
+def throttled_error(headers):
+    return spotipy.SpotifyException(429, -1, "rate limited", headers=headers)
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_burst(self):
+        limiter = rate_limiter.RateLimiter(rate=1, burst=5)
+        self.assertLess(timed(lambda: [limiter.acquire() for i in range(5)]), 0.05)
+        self.assertEqual(limiter.stats()["requests"], 5)
+        self.assertEqual(limiter.stats()["waits"], 0)
+
+    def test_refill(self):
+        limiter = rate_limiter.RateLimiter(rate=10, burst=4)
+        limiter.tokens = 0
+        limiter._refill(limiter.updated + 0.25)
+        self.assertAlmostEqual(limiter.tokens, 2.5)
+        limiter._refill(limiter.updated + 10)
+        self.assertEqual(limiter.tokens, 4)
+
+    def test_paced_when_empty(self):
+        limiter = rate_limiter.RateLimiter(rate=20, burst=1)
+        limiter.acquire()
+        # the bucket is empty, the next token is 1/20 of a second away
+        self.assertGreater(timed(limiter.acquire), 0.03)
+        self.assertEqual(limiter.stats()["waits"], 1)
+
+    def test_no_limit(self):
+        limiter = rate_limiter.RateLimiter(rate=0, burst=1)
+        self.assertLess(timed(lambda: [limiter.acquire() for i in range(100)]), 0.05)
+
+
+class BackoffTest(unittest.TestCase):
+    def test_backoff_holds_every_request(self):
+        limiter = rate_limiter.RateLimiter(rate=0)
+        limiter.backoff(0.1)
+        self.assertGreater(timed(limiter.acquire), 0.08)
+        self.assertLess(timed(limiter.acquire), 0.05)
+        self.assertEqual(limiter.stats()["throttled"], 1)
+
+    def test_backoff_never_shortens(self):
+        limiter = rate_limiter.RateLimiter(rate=0)
+        limiter.backoff(0.1)
+        limiter.backoff(0.01)
+        self.assertGreater(timed(limiter.acquire), 0.08)
+
+    def test_retry_after(self):
+        get = rate_limiter.get_retry_after
+        self.assertEqual(get(throttled_error({"Retry-After": "3"})), 3)
+        self.assertEqual(get(throttled_error({"Retry-After": "-2"})), 0)
+        default = rate_limiter.DEFAULT_RETRY_AFTER
+        self.assertEqual(get(throttled_error({"Retry-After": "soon"})), default)
+        self.assertEqual(get(throttled_error({})), default)
+        self.assertEqual(get(throttled_error(None)), default)
+
+
+class PriorityTest(unittest.TestCase):
+    def test_interactive_goes_first(self):
+        limiter = rate_limiter.RateLimiter(rate=5, burst=1)
+        limiter.tokens = 0
+        order = []
+
+        def request(priority):
+            limiter.acquire(priority)
+            order.append(priority)
+
+        scheduled = threading.Thread(target=request, args=(SCHEDULED,))
+        scheduled.start()
+        wait_for(lambda: limiter.stats()["waiting_scheduled"] == 1)
+        interactive = threading.Thread(target=request, args=(INTERACTIVE,))
+        interactive.start()
+        scheduled.join(5)
+        interactive.join(5)
+        self.assertEqual(order, [INTERACTIVE, SCHEDULED])
+
+    def test_scheduled_proceeds_alone(self):
+        limiter = rate_limiter.RateLimiter(rate=5, burst=1)
+        limiter.acquire(SCHEDULED)
+        self.assertLess(timed(limiter.acquire, SCHEDULED), 0.5)
+
+
+class ThrottledClientTest(unittest.TestCase):
+    """a client against a fake Spotify that answers some requests with 429"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.catalog = fake_spotify.Catalog(100, playlist_sizes=[])
+        cls.tid = fake_spotify.make_id("T", 1)
+
+    def setUp(self):
+        self.fake = None
+        self.old_env = dict(os.environ)
+        rate_limiter.limiter.blocked_until = 0
+
+    def tearDown(self):
+        if self.fake:
+            self.fake.stop()
+        os.environ.clear()
+        os.environ.update(self.old_env)
+        rate_limiter.limiter.blocked_until = 0
+
+    def client(self, throttle_every, retry_after=0):
+        self.fake = fake_spotify.FakeSpotify(
+            self.catalog, throttle_every=throttle_every, retry_after=retry_after
+        ).start()
+        os.environ["PBL_SPOTIFY_API_PREFIX"] = self.fake.prefix
+        return spotify_client.make_client("test")
+
+    def test_retried(self):
+        sp = self.client(throttle_every=2)
+        throttled = rate_limiter.limiter.stats()["throttled"]
+        for i in range(4):
+            self.assertEqual(sp.tracks([self.tid])["tracks"][0]["id"], self.tid)
+        self.assertEqual(self.fake.stats()["throttled"], 3)
+        self.assertEqual(rate_limiter.limiter.stats()["throttled"] - throttled, 3)
+
+    def test_out_of_retries(self):
+        os.environ["PBL_SPOTIFY_429_RETRIES"] = "2"
+        sp = self.client(throttle_every=1)
+        with self.assertRaises(spotipy.SpotifyException) as context:
+            sp.tracks([self.tid])
+        self.assertEqual(context.exception.http_status, 429)
+        self.assertEqual(self.fake.stats()["requests"], 3)
+
+    def test_retry_after_too_long(self):
+        os.environ["PBL_SPOTIFY_MAX_BACKOFF"] = "0.1"
+        sp = self.client(throttle_every=1, retry_after=60)
+        start = time.monotonic()
+        self.assertRaises(spotipy.SpotifyException, sp.tracks, [self.tid])
+        self.assertEqual(self.fake.stats()["requests"], 1)
+        # the shared backoff is capped at the longest one waited out
+        deadline = rate_limiter.limiter.blocked_until
+        self.assertLess(deadline - start, 0.2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+"""
+Checks save_playlist_tracks against the local fake Spotify, both the
+tracks a playlist ends up with and the write calls it took::
+
+    python -m unittest pbl.test_save_playlist
+"""
+
+import os
+import unittest
+from . import fake_spotify
+from . import spotify_client
+from . import spotify_plugs
+
+USER = fake_spotify.USER
+
+
+def tids(numbers):
+    return [fake_spotify.make_id("T", n) for n in numbers]
+
+
+class SavePlaylistTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.catalog = fake_spotify.Catalog(1000, playlist_sizes=[])
+        cls.fake = fake_spotify.FakeSpotify(cls.catalog).start()
+        cls.old_prefix = os.environ.get("PBL_SPOTIFY_API_PREFIX")
+        os.environ["PBL_SPOTIFY_API_PREFIX"] = cls.fake.prefix
+        cls.sp = spotify_client.make_client("test")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.fake.stop()
+        if cls.old_prefix is None:
+            del os.environ["PBL_SPOTIFY_API_PREFIX"]
+        else:
+            os.environ["PBL_SPOTIFY_API_PREFIX"] = cls.old_prefix
+
+    def save(self, before, after, empty=False):
+        """saves after over a playlist holding before, checks the result
+        and returns the number of write calls"""
+        pid = self.catalog.add_playlist("test", USER)
+        self.catalog.set_playlist_tracks(pid, list(before))
+        writes = spotify_plugs.save_playlist_tracks(
+            self.sp, USER, pid, tids(after), empty=empty
+        )
+        self.assertEqual(self.catalog.playlist_tracks(pid), list(after))
+        return writes
+
+    def test_same(self):
+        self.assertEqual(self.save(range(150), range(150)), 0)
+
+    def test_append(self):
+        self.assertEqual(self.save(range(150), range(260)), 2)
+
+    def test_append_to_empty(self):
+        self.assertEqual(self.save([], range(30)), 1)
+
+    def test_truncate(self):
+        self.assertEqual(self.save(range(150), range(140)), 1)
+
+    def test_truncate_to_few_replaces(self):
+        self.assertEqual(self.save(range(120), range(5)), 1)
+
+    def test_no_tracks_leaves_playlist(self):
+        pid = self.catalog.add_playlist("test", USER)
+        self.catalog.set_playlist_tracks(pid, list(range(260)))
+        writes = spotify_plugs.save_playlist_tracks(self.sp, USER, pid, [])
+        self.assertEqual(writes, 0)
+        self.assertEqual(self.catalog.playlist_tracks(pid), list(range(260)))
+
+    def test_move(self):
+        after = list(range(200))
+        after.insert(150, after.pop(10))
+        self.assertEqual(self.save(range(200), after), 1)
+        after = list(range(200))
+        after.insert(3, after.pop(180))
+        self.assertEqual(self.save(range(200), after), 1)
+
+    def test_shuffle(self):
+        after = list(reversed(range(250)))
+        self.assertEqual(self.save(range(250), after), 3)
+
+    def test_empty(self):
+        self.assertEqual(self.save([], range(250), empty=True), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
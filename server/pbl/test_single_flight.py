@@ -0,0 +1,153 @@
+"""
+Checks that SingleFlight shares in-flight fetches between threads, and
+what the waiting threads do when the shared fetch fails::
+
+    python -m unittest pbl.test_single_flight
+"""
+
+import time
+import threading
+import unittest
+from . import single_flight
+
+
+def wait_for(check, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not check():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.001)
+
+
+class Leader(threading.Thread):
+    """fetches ids through a SingleFlight with a fetch that blocks until
+    released, then returns values or raises"""
+
+    def __init__(self, flight, ids, fail=False, missing=()):
+        threading.Thread.__init__(self)
+        self.flight = flight
+        self.ids = ids
+        self.fail = fail
+        self.missing = missing
+        self.release = threading.Event()
+        self.results = None
+        self.error = None
+
+    def fetch(self, ids):
+        self.release.wait(5)
+        if self.fail:
+            raise ValueError("leader failed")
+        return dict((id, "leader " + id) for id in ids if id not in self.missing)
+
+    def run(self):
+        try:
+            self.results = self.flight.fetch("audio", self.ids, self.fetch)
+        except ValueError as e:
+            self.error = e
+
+
+class Follower(threading.Thread):
+    def __init__(self, flight, ids):
+        threading.Thread.__init__(self)
+        self.flight = flight
+        self.ids = ids
+        self.fetched = []
+        self.results = None
+
+    def fetch(self, ids):
+        self.fetched.append(list(ids))
+        return dict((id, "follower " + id) for id in ids)
+
+    def run(self):
+        self.results = self.flight.fetch("audio", self.ids, self.fetch)
+
+
+class SingleFlightTest(unittest.TestCase):
+    def setUp(self):
+        self.flight = single_flight.SingleFlight()
+
+    def start(self, leader, follower, shared):
+        """starts the leader, then the follower once the leader's fetch is
+        in flight, and waits until the follower is sharing it"""
+        leader.start()
+        wait_for(lambda: self.flight.stats()["in_flight"] == len(leader.ids))
+        follower.start()
+        wait_for(lambda: self.flight.stats()["shared"] == shared)
+
+    def finish(self, *threads):
+        for thread in threads:
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+
+    def test_no_overlap(self):
+        results = self.flight.fetch("audio", ["a", "b", "a"], lambda ids: {"a": 1})
+        self.assertEqual(results, {"a": 1})
+        self.assertEqual(
+            self.flight.stats(), {"in_flight": 0, "fetched": 2, "shared": 0}
+        )
+
+    def test_shared_fetch(self):
+        leader = Leader(self.flight, ["a", "b"])
+        follower = Follower(self.flight, ["b", "c"])
+        self.start(leader, follower, shared=1)
+        leader.release.set()
+        self.finish(leader, follower)
+
+        self.assertEqual(leader.results, {"a": "leader a", "b": "leader b"})
+        self.assertEqual(follower.results, {"b": "leader b", "c": "follower c"})
+        self.assertEqual(follower.fetched, [["c"]])
+        self.assertEqual(self.flight.stats()["in_flight"], 0)
+
+    def test_shared_missing_id(self):
+        # an id the leader's fetch has no value for is missing for the
+        # follower too, rather than fetched again
+        leader = Leader(self.flight, ["a", "b"], missing=["b"])
+        follower = Follower(self.flight, ["b"])
+        self.start(leader, follower, shared=1)
+        leader.release.set()
+        self.finish(leader, follower)
+
+        self.assertEqual(follower.results, {})
+        self.assertEqual(follower.fetched, [])
+
+    def test_leader_failure(self):
+        leader = Leader(self.flight, ["a", "b"], fail=True)
+        follower = Follower(self.flight, ["a", "b", "c"])
+        self.start(leader, follower, shared=2)
+        leader.release.set()
+        self.finish(leader, follower)
+
+        # the exception stays with the thread whose fetch raised it, the
+        # follower fetches the shared ids again itself
+        self.assertIsInstance(leader.error, ValueError)
+        self.assertEqual(
+            follower.results,
+            {"a": "follower a", "b": "follower b", "c": "follower c"},
+        )
+        self.assertEqual(follower.fetched, [["c"], ["a", "b"]])
+        self.assertEqual(self.flight.stats()["in_flight"], 0)
+
+    def test_retry_after_failure(self):
+        # a failed fetch leaves nothing in flight, so the next caller
+        # fetches the ids afresh
+        def fail(ids):
+            raise ValueError("failed")
+
+        self.assertRaises(ValueError, self.flight.fetch, "audio", ["a"], fail)
+        self.assertEqual(self.flight.stats()["in_flight"], 0)
+        results = self.flight.fetch("audio", ["a"], lambda ids: {"a": 2})
+        self.assertEqual(results, {"a": 2})
+
+    def test_types_are_separate(self):
+        leader = Leader(self.flight, ["a"])
+        leader.start()
+        wait_for(lambda: self.flight.stats()["in_flight"] == 1)
+        results = self.flight.fetch("spotify", ["a"], lambda ids: {"a": 3})
+        leader.release.set()
+        self.finish(leader)
+        self.assertEqual(results, {"a": 3})
+        self.assertEqual(self.flight.stats()["shared"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+"""
+Checks the artist spacing bookkeeping, and that Lookaside keeps its heaps
+consistent and hands out the same tracks as a scan of everything held::
+
+    python -m unittest pbl.test_spacing
+"""
+
+import sys
+import random
+import unittest
+from . import spacing
+
+
+def is_heap(items):
+    return all(items[(i - 1) // 2] <= items[i] for i in range(1, len(items)))
+
+
+class ArtistSpacingTest(unittest.TestCase):
+    def test_separation(self):
+        s = spacing.ArtistSpacing()
+        for artist in ["a", "b", "c", "a"]:
+            s.add(artist)
+        self.assertEqual(len(s), 4)
+        self.assertEqual(s.separation("a"), 1)
+        self.assertEqual(s.separation("b"), 3)
+        self.assertEqual(s.separation("d"), sys.maxsize)
+
+    def test_ready_at(self):
+        s = spacing.ArtistSpacing()
+        for artist in ["a", "b", "c"]:
+            s.add(artist)
+        self.assertEqual(s.ready_at("a", 4), 4)
+        self.assertEqual(s.ready_at("c", 2), 4)
+        self.assertEqual(s.ready_at("d", 4), 0)
+
+
+class LookasideTest(unittest.TestCase):
+    def check_invariant(self, lookaside):
+        """both heaps are heaps, every artist with held tracks is in
+        exactly one of them, and a ready artist is keyed by the arrival
+        of its oldest held track"""
+        self.assertTrue(is_heap(lookaside.waiting))
+        self.assertTrue(is_heap(lookaside.ready))
+        artists = [artist for key, artist in lookaside.waiting + lookaside.ready]
+        self.assertEqual(sorted(artists), sorted(lookaside.queues))
+        for arrival, artist in lookaside.ready:
+            self.assertEqual(arrival, lookaside.queues[artist][0][0])
+        for queue in lookaside.queues.values():
+            self.assertTrue(queue)
+        held = sum(len(queue) for queue in lookaside.queues.values())
+        self.assertEqual(len(lookaside), held)
+
+    def test_holds_until_separated(self):
+        s = spacing.ArtistSpacing()
+        lookaside = spacing.Lookaside(s, 3)
+        s.add("a")
+        lookaside.hold("a1", "a")
+        lookaside.hold("a2", "a")
+        self.assertIsNone(lookaside.take())
+        s.add("b")
+        self.assertIsNone(lookaside.take())
+        s.add("c")
+        self.assertEqual(lookaside.take(), "a1")
+        s.add("a")
+        self.assertIsNone(lookaside.take())
+        self.assertEqual(len(lookaside), 1)
+        self.check_invariant(lookaside)
+
+    def test_earliest_arrival_first(self):
+        s = spacing.ArtistSpacing()
+        lookaside = spacing.Lookaside(s, 2)
+        for artist in "abc":
+            s.add(artist)
+        lookaside.hold("c1", "c")
+        lookaside.hold("a1", "a")
+        lookaside.hold("b1", "b")
+        # a and b may play now, c not yet; a's track arrived first
+        self.assertEqual(lookaside.take(), "a1")
+        s.add("a")
+        self.assertEqual(lookaside.take(), "c1")
+        s.add("c")
+        self.assertEqual(lookaside.take(), "b1")
+        s.add("b")
+        self.assertIsNone(lookaside.take())
+        self.assertEqual(len(lookaside), 0)
+        self.check_invariant(lookaside)
+
+    def test_stale_ready_entry(self):
+        # an artist made ready that then plays from outside the lookaside
+        # goes back to waiting when it comes up
+        s = spacing.ArtistSpacing()
+        lookaside = spacing.Lookaside(s, 2)
+        s.add("a")
+        lookaside.hold("a1", "a")
+        lookaside.hold("b1", "b")
+        s.add("x")
+        self.assertEqual(lookaside.take(), "a1")
+        s.add("a")
+        self.assertEqual(lookaside.take(), "b1")
+        s.add("b")
+        lookaside.hold("a2", "a")
+        lookaside.hold("b2", "b")
+        s.add("a")
+        # both are made ready, but a has just played again
+        self.assertEqual(lookaside.take(), "b2")
+        self.assertEqual(lookaside.waiting, [(s.ready_at("a", 2), "a")])
+        self.assertEqual(lookaside.ready, [])
+        self.check_invariant(lookaside)
+
+    def test_matches_scan(self):
+        rng = random.Random(1)
+        for min_separation in [1, 2, 5, 12]:
+            s = spacing.ArtistSpacing()
+            lookaside = spacing.Lookaside(s, min_separation)
+            held = []
+            artists = ["artist %d" % i for i in range(8)]
+            for step in range(3000):
+                action = rng.random()
+                if action < 0.4:
+                    artist = rng.choice(artists)
+                    track = "track %d" % step
+                    lookaside.hold(track, artist)
+                    held.append((track, artist))
+                elif action < 0.5:
+                    s.add(rng.choice(artists))
+                else:
+                    expected = None
+                    for i, (track, artist) in enumerate(held):
+                        if s.ready_at(artist, min_separation) <= len(s):
+                            expected = held.pop(i)
+                            break
+                    track = lookaside.take()
+                    if expected is None:
+                        self.assertIsNone(track)
+                    else:
+                        self.assertEqual(track, expected[0])
+                        s.add(expected[1])
+                self.check_invariant(lookaside)
+            self.assertEqual(len(lookaside), len(held))
+
+    def test_heaps_hold_each_artist_once(self):
+        s = spacing.ArtistSpacing()
+        lookaside = spacing.Lookaside(s, 3)
+        for i in range(50):
+            lookaside.hold(i, "a" if i % 2 else "b")
+        self.assertEqual(sorted(lookaside.waiting), [(0, "a"), (0, "b")])
+        self.assertEqual(lookaside.ready, [])
+        self.check_invariant(lookaside)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,16 +1,173 @@
+import sys
+import threading
+import contextlib
 from . import cache_manager
+from .column_store import ColumnStore
+from . import cache_policy
 
 # cache = cache_manager.get_cache("NOCACHE")
 cache = cache_manager.get_cache()
 
 
+class Track(object):
+    """
+    A compact record of the core track fields. Artist and source names are
+    interned since thousands of tracks share a handful of them. Annotations
+    are kept out of the record, in the arena's per type tables.
+
+    Supports dict style access to its fields, so tinfo['artist'] keeps
+    working.
+    """
+
+    __slots__ = ("id", "title", "artist", "duration", "src")
+
+    def __init__(self, id, title, artist, duration, src):
+        self.id = id
+        self.title = title
+        self.artist = _intern(artist)
+        self.duration = duration
+        self.src = _intern(src)
+
+    def __getitem__(self, key):
+        if key in Track.__slots__:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in Track.__slots__
+
+    def get(self, key, default=None):
+        if key in Track.__slots__:
+            return getattr(self, key)
+        return default
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in Track.__slots__}
+
+
+def _intern(s):
+    if isinstance(s, str):
+        return sys.intern(s)
+    return s
+
+
+class Accessor(object):
+    """
+    An attribute path compiled once, so that lookups don't parse the path.
+    Paths are either a track field or annotation name ('duration'), or an
+    annotation type and field ('audio.energy'), in which case the type's
+    annotator is resolved up front.
+
+    :param lib: the track library
+    :param attr: the attribute path
+    """
+
+    __slots__ = ("lib", "attr", "type", "name", "annotator", "is_field", "bad")
+
+    def __init__(self, lib, attr):
+        self.lib = lib
+        self.attr = attr
+        self.type = None
+        self.annotator = None
+        self.bad = False
+        fields = attr.split(".")
+        if len(fields) == 1:
+            self.name = fields[0]
+        elif len(fields) == 2:
+            self.type, self.name = fields
+            self.annotator = lib.annotators.get(self.type)
+        else:
+            self.name = attr
+            self.bad = True
+        self.is_field = self.type is None and self.name in Track.__slots__
+
+    def get_annotator(self):
+        """the annotator for the path's type, None if it has none"""
+        if self.annotator is None and self.type is not None:
+            self.annotator = self.lib.annotators.get(self.type)
+        return self.annotator
+
+    def get(self, tid):
+        """
+        Gets the value of the attribute for a track
+
+        :param tid: the track id
+        """
+        lib = self.lib
+        arena = lib.current
+        track = arena.tmap.get(tid)
+        if track is None:
+            return None
+        if self.is_field:
+            return getattr(track, self.name)
+        if self.type is None:
+            if self.bad:
+                print("bad attr path", self.attr)
+                return None
+            notes = arena.annotations.get(self.name)
+            return notes.get(tid) if notes else None
+        notes = arena.annotations.get(self.type)
+        # tracks known to have no annotation are in the table as None
+        if notes is None or tid not in notes:
+            annotator = self.get_annotator()
+            if annotator:
+                lib.last_minute_fetch(tid, annotator)
+                notes = arena.annotations.get(self.type)
+        type_info = notes.get(tid) if notes else None
+        if type_info and self.name in type_info:
+            return type_info[self.name]
+        return None
+
+
+class TrackArena(object):
+    """the tracks and annotations made during one execution"""
+
+    def __init__(self):
+        self.tmap = {}
+        self.annotations = {}
+        self.columns = ColumnStore()
+
+
 class TrackLibrary(object):
     """manages track attributes"""
 
     def __init__(self):
-        self.tmap = {}
+        self.global_arena = TrackArena()
+        self.local = threading.local()
         self.annotators = {}
+        self.accessors = {}
         self.missing_annotator_reported = False
+        self.last_minute_fetches = 0
+        # annotation runs on the worker threads too
+        self.counts_lock = threading.Lock()
+
+    @property
+    def current(self):
+        """the arena open on this thread, or the process wide arena when no
+        arena is open"""
+        return getattr(self.local, "arena", self.global_arena)
+
+    @property
+    def tmap(self):
+        return self.current.tmap
+
+    @contextlib.contextmanager
+    def arena(self):
+        """
+        Scopes the tracks made on this thread to a single execution. Tracks
+        added while the arena is open are released when it closes, so long
+        lived workers don't accumulate every track they have ever seen.
+        Arenas nest; annotators are shared by all of them.
+        """
+        outer = getattr(self.local, "arena", None)
+        self.local.arena = TrackArena()
+        try:
+            yield self
+        finally:
+            if outer is None:
+                del self.local.arena
+            else:
+                self.local.arena = outer
 
     def add_track(self, source_name, tid, info):
         """Adds a track to the library
@@ -20,14 +177,28 @@ class TrackLibrary(object):
         :param info: the track info
         """
         # print "add_track", source_name, info['title'], info['artist']
-        info["src"] = source_name
-        self.tmap[tid] = info
+        arena = self.current
+        arena.tmap[tid] = Track(
+            tid,
+            info.get("title"),
+            info.get("artist"),
+            info.get("duration"),
+            source_name,
+        )
+        for name, data in info.items():
+            if name not in Track.__slots__:
+                arena.annotations.setdefault(name, {})[tid] = data
+                arena.columns.add(tid, name, data)
 
     def annotate_tracks_from_cache(self, type, tids):
+        """annotates the tracks that are in the cache, fetching them all in
+        one go, and returns the ids of the ones that aren't. Tracks cached
+        as missing are marked as known missing."""
         out = []
-        for tid in tids:
-            song = cache.get(type, tid)
-            if song:
+        for tid, song in zip(tids, cache.get_many(type, tids)):
+            if cache_policy.is_missing(song):
+                self.annotate_track(tid, type, None, add_to_cache=False)
+            elif song:
                 self.annotate_track(tid, type, song, add_to_cache=False)
             else:
                 out.append(tid)
@@ -35,6 +206,20 @@ class TrackLibrary(object):
 
     def add_annotator(self, annotator):
         self.annotators[annotator["name"]] = annotator
+        for accessor in self.accessors.values():
+            if accessor.type == annotator["name"]:
+                accessor.annotator = annotator
+
+    def accessor(self, attr):
+        """gets the compiled accessor for an attribute path
+
+        :param attr: the attribute path, such as 'title' or 'audio.energy'
+        """
+        accessor = self.accessors.get(attr)
+        if accessor is None:
+            accessor = Accessor(self, attr)
+            self.accessors[attr] = accessor
+        return accessor
 
     def get_annotator(self, name):
         return self.annotators[name]
@@ -44,8 +229,33 @@ class TrackLibrary(object):
 
         :param tid: the track id
         """
-        if tid in self.tmap:
-            return self.tmap[tid]
+        return self.current.tmap.get(tid)
+
+    def get_annotation(self, tid, name):
+        """gets the named annotation for a track, None if the track hasn't
+        been annotated or is known to have none"""
+        notes = self.current.annotations.get(name)
+        if notes:
+            return notes.get(tid)
+        return None
+
+    def has_annotation(self, tid, name):
+        notes = self.current.annotations.get(name)
+        return notes is not None and tid in notes
+
+    def get_track_info(self, tid):
+        """gets the track info along with all of its annotations as a dict,
+        suitable for json
+
+        :param tid: the track id
+        """
+        track = self.get_track(tid)
+        if track:
+            info = track.to_dict()
+            for name, notes in self.current.annotations.items():
+                if notes.get(tid) is not None:
+                    info[name] = notes[tid]
+            return info
         else:
             return None
 
@@ -57,81 +267,124 @@ class TrackLibrary(object):
             return "(none)"
 
     def make_track(self, id, title, artist, dur, source):
-        track = {
-            "id": id,
-            "title": title,
-            "artist": artist,
-            "duration": dur,
-            "src": source,
-        }
         # print "make_track", source, title, artist
-        self.tmap[id] = track
+        self.current.tmap[id] = Track(id, title, artist, dur, source)
         return id
 
     def annotate_track(self, tid, name, data, add_to_cache=True):
-        track = self.get_track(tid)
-        if track:
-            track[name] = data
+        arena = self.current
+        if tid in arena.tmap:
+            arena.annotations.setdefault(name, {})[tid] = data
+            arena.columns.add(tid, name, data)
             if add_to_cache and cache.get(name, tid) == None:
                 cache.put(name, tid, data)
         else:
             print("can't annotate missing track", tid)
 
+    def add_column(self, attr):
+        """mirrors a numeric 'type.field' attribute into the current
+        arena's column store, see column_store"""
+        arena = self.current
+        arena.columns.add_column(attr, arena.annotations)
+
+    def gather(self, attr, tids):
+        """gets the mirrored values of an attribute for a block of tracks
+        as a float array, NaN where a track has no numeric value. None when
+        the attribute isn't mirrored."""
+        return self.current.columns.gather(attr, tids)
+
+    def annotate_tracks(self, name, notes, add_to_cache=True):
+        """
+        Annotates a batch of tracks, writing the annotations to the cache
+        in a single put_many. Unlike annotate_track it doesn't check the
+        cache first; callers pass tracks that just missed it. Tracks whose
+        annotation is cache_policy.MISSING are marked as known missing:
+        they have no annotation, but aren't fetched again.
+
+        :param name: the annotation type
+        :param notes: dict of track id to annotation
+        :param add_to_cache: if True, the annotations are cached
+        """
+        arena = self.current
+        table = arena.annotations.setdefault(name, {})
+        fresh = {}
+        for tid, data in notes.items():
+            if tid in arena.tmap:
+                if cache_policy.is_missing(data):
+                    data = None
+                table[tid] = data
+                arena.columns.add(tid, name, data)
+                fresh[tid] = notes[tid]
+            else:
+                print("can't annotate missing track", tid)
+        if add_to_cache and fresh:
+            cache.put_many(name, fresh)
+
     def annotate_tracks_with_attribute(self, tids, attr):
-        fields = attr.split(".")
-        if len(fields) == 2:
-            type, attr = fields
-            batch_size = self.annotators[type]["batch_size"]
-            start = 0
-            while start < len(tids):
-                ntids = tids[start : start + batch_size]
-                self.annotators[type]["annotator"](ntids)
-                start += batch_size
+        accessor = self.accessor(attr)
+        if accessor.type is not None:
+            self.run_annotator(self.annotators[accessor.type], tids)
+
+    def run_annotator(self, annotator, tids):
+        """
+        Runs an annotator over a list of tracks. A planned annotator gets
+        them all in one call and splits them into requests itself, so a
+        whole block is annotated in one concurrent phase. Others are
+        called a batch_size at a time.
+
+        :param annotator: the annotator
+        :param tids: the track ids
+        """
+        if annotator.get("planned"):
+            if tids:
+                annotator["annotator"](tids)
+            return
+        batch_size = annotator["batch_size"]
+        start = 0
+        while start < len(tids):
+            ntids = tids[start : start + batch_size]
+            annotator["annotator"](ntids)
+            start += batch_size
 
     def get_batch_size(self, attr):
-        fields = attr.split(".")
-        if len(fields) == 2:
-            type, attr = fields
-            if type in self.annotators:
-                batch_size = self.annotators[type]["batch_size"]
-                return batch_size
+        annotator = self.accessor(attr).get_annotator()
+        if annotator:
+            return annotator["batch_size"]
         return 1
 
+    def last_minute_fetch(self, tid, annotator):
+        """
+        The slow path: a track is missing an annotation that is needed
+        right now, so it is fetched on its own. Counted in
+        last_minute_fetches; a steady count means a pipeline is missing an
+        Annotator.
+
+        :param tid: the track id
+        :param annotator: the annotator for the missing type
+        """
+        report = False
+        with self.counts_lock:
+            self.last_minute_fetches += 1
+            if annotator["batch_size"] > 1 and not self.missing_annotator_reported:
+                self.missing_annotator_reported = True
+                report = True
+        if report:
+            print("last minute fetch of", annotator["name"], "info for", tid)
+            print("consider adding an annotator to speed things up")
+        annotator["annotator"]([tid])
+
     def get_attr(self, tid, attr):
         """
-        Gets the value of the given attribute for a track
+        Gets the value of the given attribute for a track. Components
+        should hold on to tlib.accessor(attr) and call its get method
+        instead, which skips the path lookup.
 
         :param tid: the track id
         :param attr: the attribte name
 
         """
         # currently support 'attribute' or 'pkg.attribute'
-        track = self.get_track(tid)
-        if track:
-            fields = attr.split(".")
-            if len(fields) == 1:
-                attr = fields[0]
-                if attr in track:
-                    return track[attr]
-            elif len(fields) == 2:
-                type, attr = fields
-                if not type in track and type in self.annotators:
-                    if (
-                        self.annotators[type]["batch_size"] > 1
-                        and not self.missing_annotator_reported
-                    ):
-                        print("last minute fetch of", type, "info for", tid)
-                        print("consider adding an annotator to speed things up")
-                        self.missing_annotator_reported = True
-                    self.annotators[type]["annotator"]([tid])
-                if type in track:
-                    type_info = track[type]
-                    if type_info and attr in type_info:
-                        return type_info[attr]
-            else:
-                print("bad attr path", attr)
-
-        return None
+        return self.accessor(attr).get(tid)
 
 
 tlib = TrackLibrary()
@@ -0,0 +1,80 @@
+"""
+A shared, bounded pool of threads for concurrent Spotify fetches, such as
+the pages of a large playlist.
+
+Tasks run off the caller's thread, so they don't see its engine env or
+track arena. Grab what a task needs (the spotify client, the user) in
+the caller and hand it the raw results back; anything that touches tlib
+stays on the caller's thread.
+
+The pool size comes from PBL_FETCH_WORKERS (default 8).
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+
+DEFAULT_WORKERS = 8
+
+local = threading.local()
+pool = None
+pool_lock = threading.Lock()
+
+
+def get_max_workers():
+    return int(os.environ.get("PBL_FETCH_WORKERS", DEFAULT_WORKERS))
+
+
+def _mark_worker():
+    local.is_worker = True
+
+
+def get_pool():
+    global pool
+    with pool_lock:
+        if pool is None:
+            pool = ThreadPoolExecutor(
+                max_workers=get_max_workers(),
+                thread_name_prefix="pbl-fetch",
+                initializer=_mark_worker,
+            )
+        return pool
+
+
+def submit(func, *args):
+    """
+    Starts func(*args) on the shared pool and returns its future. When
+    already on a pool thread the call runs inline and the future comes
+    back done.
+    """
+    if getattr(local, "is_worker", False) or get_max_workers() <= 1:
+        future = Future()
+        try:
+            future.set_result(func(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    return get_pool().submit(func, *args)
+
+
+def ordered_map(func, items):
+    """
+    Calls func on each item concurrently on the shared pool, and returns
+    the results in the order of the items. The first exception raised by
+    a call is raised here. Runs the calls inline when there is only one,
+    or when already on a pool thread, so nested fetches can't deadlock
+    the pool waiting on themselves.
+
+    :param func: function of one item
+    :param items: the items
+    """
+    items = list(items)
+    on_worker = getattr(local, "is_worker", False)
+    if len(items) <= 1 or on_worker or get_max_workers() <= 1:
+        return [func(item) for item in items]
+    futures = [get_pool().submit(func, item) for item in items]
+    try:
+        return [future.result() for future in futures]
+    finally:
+        for future in futures:
+            future.cancel()
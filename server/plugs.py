@@ -1,9 +1,13 @@
 import pbl
 import datetime
+import collections
 import random
+import sys
 import spotipy
 from cachelib import SimpleCache
 from pbl import spotify_plugs
+from pbl import workers
+from pbl import spacing
 import json
 import time
 import reltime
@@ -45,7 +49,7 @@ class IsTimeOfDay(pbl.Conditional):
         super(IsTimeOfDay, self).__init__(bool_func, true_source, false_source)
 
 
-class RandomSelector(object):
+class RandomSelector(pbl.Component):
     """
     Randomly selects a track from one of the given inputs
     :param source_list: a list of sources
@@ -71,7 +75,7 @@ class RandomSelector(object):
         return None
 
 
-class RandomStreamSelector(object):
+class RandomStreamSelector(pbl.Component):
     """
     Randomly selects a stream from a set of inputs
     :param source_list: a list of sources
@@ -86,7 +90,7 @@ class RandomStreamSelector(object):
         return self.src.next_track()
 
 
-class Comment(object):
+class Comment(pbl.Component):
     """
     Randomly selects a stream from a set of inputs
     :param source_list: a list of sources
@@ -102,7 +106,7 @@ class Comment(object):
         raise pbl.PBLException(self, "a comment is not runnable")
 
 
-class TrackFilter(object):
+class TrackFilter(pbl.Component):
     """
     produces tracks on the true source that are not on the false source
     """
@@ -117,43 +121,49 @@ class TrackFilter(object):
         self.debug = False
         self.by_name = by_name
 
-    def next_track(self):
-        while True:
-            bad_track = self.false_source.next_track()
+    def _load_bad_tracks(self):
+        for bad_track in pbl.drain(self.false_source):
             self.bad_tracks.add(bad_track)
-            if bad_track:
-                if self.by_name:
-                    bad_track_name = pbl.tlib.get_tn(bad_track).lower()
-                    self.bad_tracks.add(bad_track_name)
-            else:
-                break
+            if self.by_name:
+                bad_track_name = pbl.tlib.get_tn(bad_track).lower()
+                self.bad_tracks.add(bad_track_name)
+
+    def _keep(self, track):
+        if self.by_name:
+            track_name = pbl.tlib.get_tn(track).lower()
+        else:
+            track_name = track
 
+        if self.invert and (
+            (track in self.bad_tracks) or (track_name in self.bad_tracks)
+        ):
+            return True
+        elif (not self.invert) and (
+            (track not in self.bad_tracks) and (track_name not in self.bad_tracks)
+        ):
+            return True
+        else:
+            if self.debug:
+                print("filtered out", pbl.tlib.get_tn(track))
+            return False
+
+    def next_track(self):
+        self._load_bad_tracks()
         while True:
             track = self.true_source.next_track()
             if track:
-                if self.by_name:
-                    track_name = pbl.tlib.get_tn(track).lower()
-                else:
-                    track_name = track
-
-                if self.invert and (
-                    (track in self.bad_tracks) or (track_name in self.bad_tracks)
-                ):
-                    return track
-                elif (not self.invert) and (
-                    (track not in self.bad_tracks)
-                    and (track_name not in self.bad_tracks)
-                ):
+                if self._keep(track):
                     return track
-                else:
-                    if self.debug:
-                        print("filtered out", pbl.tlib.get_tn(track))
             else:
                 break
         return None
 
+    def next_tracks(self, n):
+        self._load_bad_tracks()
+        return pbl.pull_filtered(self.true_source, n, self._keep)
+
 
-class ArtistFilter(object):
+class ArtistFilter(pbl.Component):
     """
     produces tracks on the true source that are not by artists the false source
     """
@@ -194,7 +204,7 @@ class ArtistFilter(object):
         return None
 
 
-class TextFilter(object):
+class TextFilter(pbl.Component):
     """
     produces tracks from the stream based on track title match
     """
@@ -325,7 +335,7 @@ class Tempo(pbl.AttributeRangeFilter):
         )
 
 
-class AllButTheFirst(object):
+class AllButTheFirst(pbl.BufferedSource):
     """
     Returns all but the first tracks from a stream
 
@@ -337,25 +347,16 @@ class AllButTheFirst(object):
         self.name = "all but the first " + str(sample_size) + " of " + source.name
         self.source = source
         self.sample_size = sample_size
-        self.buffer = []
+        self.buffer = collections.deque()
         self.filling = True
 
-    def next_track(self):
-        while self.filling:
-            track = self.source.next_track()
-            if track:
-                self.buffer.append(track)
-            else:
-                self.filling = False
-                self.buffer = self.buffer[self.sample_size :]
-
-        if len(self.buffer) > 0:
-            return self.buffer.pop(0)
-        else:
-            return None
+    def _fill(self, n):
+        if self.filling:
+            self.filling = False
+            self.buffer.extend(pbl.drain(self.source)[self.sample_size :])
 
 
-class AllButTheLast(object):
+class AllButTheLast(pbl.Component):
     """
     Returns all but the last tracks from a stream
 
@@ -367,23 +368,36 @@ class AllButTheLast(object):
         self.name = "all but the last " + str(sample_size) + " of " + source.name
         self.source = source
         self.sample_size = sample_size
-        self.buffer = []
+        # a track is only let through once sample_size tracks follow it
+        self.lookahead = collections.deque()
         self.filling = True
 
     def next_track(self):
-        while self.filling:
+        while self.filling and len(self.lookahead) <= self.sample_size:
             track = self.source.next_track()
             if track:
-                self.buffer.append(track)
+                self.lookahead.append(track)
             else:
                 self.filling = False
-                self.buffer = self.buffer[: -self.sample_size :]
 
-        if len(self.buffer) > 0:
-            return self.buffer.pop(0)
+        if len(self.lookahead) > self.sample_size:
+            return self.lookahead.popleft()
         else:
             return None
 
+    def next_tracks(self, n):
+        want = n + self.sample_size - len(self.lookahead)
+        if self.filling and want > 0:
+            tracks = self.source.next_tracks(want)
+            if len(tracks) < want:
+                self.filling = False
+            self.lookahead.extend(tracks)
+
+        out = []
+        while len(out) < n and len(self.lookahead) > self.sample_size:
+            out.append(self.lookahead.popleft())
+        return out
+
 
 def is_authenticated():
     auth_token = pbl.engine.getEnv("spotify_auth_token")
@@ -402,18 +416,25 @@ def get_spotify():
 def get_artist_uri(artist_name):
     sp = get_spotify()
     if sp:
-        results = sp.search(artist_name, limit=5, type="artist")
-        if (
-            "artists" in results
-            and "items" in results["artists"]
-            and len(results["artists"]["items"]) > 0
-        ):
-            return results["artists"]["items"][0]["uri"]
+        return spotify_plugs.resolve_uri(
+            "artist", artist_name, None, lambda: _search_artist_uri(sp, artist_name)
+        )
     else:
         return None
 
 
-class PlaylistSave(object):
+def _search_artist_uri(sp, artist_name):
+    results = sp.search(artist_name, limit=5, type="artist")
+    if (
+        "artists" in results
+        and "items" in results["artists"]
+        and len(results["artists"]["items"]) > 0
+    ):
+        return results["artists"]["items"][0]["uri"]
+    return None
+
+
+class PlaylistSave(pbl.Component):
     """A PBL Sink that saves the source stream of tracks to the given playlist
     :param source: the source of tracks to be saved
     :param playlist_name: the name of the playlist
@@ -467,28 +488,25 @@ class PlaylistSave(object):
         else:
             uri = find_playlist_by_name(sp, user, self.playlist_name)
 
+        created = False
         if uri:
             print("found", uri)
         else:
             print("creating new", self.playlist_name, "playlist")
             response = sp.user_playlist_create(user, self.playlist_name)
             uri = response["uri"]
+            created = True
 
         pid = get_pid_from_playlist_uri(uri)
         if pid:
-            batch_size = 100
-            uris = ["spotify:track:" + id for id in self.buffer]
-            for start in range(0, len(uris), batch_size):
-                turis = uris[start : start + batch_size]
-                if start == 0 and not self.append:
-                    sp.user_playlist_replace_tracks(user, pid, turis)
-                else:
-                    sp.user_playlist_add_tracks(user, pid, turis)
+            spotify_plugs.save_playlist_tracks(
+                sp, user, pid, self.buffer, append=self.append, empty=created
+            )
         else:
             print("Can't get authenticated access to spotify")
 
 
-class PlaylistSaveToNew(object):
+class PlaylistSaveToNew(pbl.Component):
     """A PBL Sink that saves the source stream of tracks to a new playlist
 
     :param source: the source of tracks to be saved
@@ -595,72 +613,95 @@ def save_to_playlist(title, uri, tids):
     if not user:
         raise Exception("no authenticated user")
 
+    created = False
     if not uri:
         response = sp.user_playlist_create(user, title)
         print("create playlist", json.dumps(response, indent=4))
         if "uri" in response:
             uri = response["uri"]
+            created = True
         else:
             raise Exception("Can't create playlist " + title)
 
     pid = get_pid_from_playlist_uri(uri)
     if pid:
-        batch_size = 100
-        uris = ["spotify:track:" + id for id in tids]
-        for start in range(0, len(uris), batch_size):
-            turis = uris[start : start + batch_size]
-            if start == 0:
-                sp.user_playlist_replace_tracks(user, pid, turis)
-            else:
-                sp.user_playlist_add_tracks(user, pid, turis)
+        spotify_plugs.save_playlist_tracks(sp, user, pid, tids, empty=created)
     else:
         print("Can't get authenticated access to spotify")
     return uri
 
 
-class MySavedTracks(object):
+class PagedSource(pbl.BufferedSource):
+    """
+    Base for sources that stream an offset paged Spotify endpoint. A page
+    is only fetched when the tracks before it have been used up, or when a
+    batch pull asks for more, and the page after it is fetched in the
+    background meanwhile.
+
+    Subclasses provide _fetch_page and _page_tracks.
+    """
+
+    limit = 50
+
+    def __init__(self, name):
+        self.name = name
+        self.buffer = collections.deque()
+        self.pages = None
+
+    def _fetch_page(self, sp, offset):
+        """returns the page of results at the offset"""
+        raise NotImplementedError()
+
+    def _page_tracks(self, results):
+        """returns the tracks in a page of results"""
+        raise NotImplementedError()
+
+    def _fetch(self, sp, offset):
+        try:
+            return self._fetch_page(sp, offset)
+        except spotipy.SpotifyException as e:
+            raise pbl.engine.PBLException(self, e.msg)
+
+    def _fill(self, n):
+        if self.pages is None:
+            sp = get_spotify()
+            self.pages = spotify_plugs.iter_pages(
+                lambda offset: self._fetch(sp, offset), self.limit
+            )
+        added = 0
+        while added < n:
+            results = next(self.pages, None)
+            if results is None:
+                break
+            for track in self._page_tracks(results):
+                self.buffer.append(track["id"])
+                spotify_plugs._add_track(self.name, track)
+                added += 1
+
+
+class MySavedTracks(PagedSource):
     """A PBL Source that generates a list of the saved tracks
     by the current suer
     """
 
     def __init__(self):
-        self.name = "My Saved Tracks"
-        self.buffer = None
-
-    def next_track(self):
-        if self.buffer is None:
-            self.buffer = []
-            try:
-                sp = get_spotify()
-                limit = 50
-                offset = 0
-                total = 50
+        super(MySavedTracks, self).__init__("My Saved Tracks")
 
-                while offset < total:
-                    results = sp.current_user_saved_tracks(limit=limit, offset=offset)
-                    for item in results["items"]:
-                        track = item["track"]
-                        if track and "id" in track:
-                            self.buffer.append(track["id"])
-                            spotify_plugs._add_track(self.name, track)
-                        else:
-                            raise pbl.engine.PBLException(self, "bad track")
-                    offset += limit
-                    total = results["total"]
-                # print(self.name, len(self.buffer), offset, total)
-            except spotipy.SpotifyException as e:
-                raise pbl.engine.PBLException(self, e.msg)
+    def _fetch_page(self, sp, offset):
+        return sp.current_user_saved_tracks(limit=self.limit, offset=offset)
 
-        if len(self.buffer) > 0:
-            tid = self.buffer.pop(0)
-            # print('ret', self.name, tid)
-            return tid
-        else:
-            # print('ret', self.name, 'empty')
-            return None
+    def _page_tracks(self, results):
+        tracks = []
+        for item in results["items"]:
+            track = item["track"]
+            if track and "id" in track:
+                tracks.append(track)
+            else:
+                raise pbl.engine.PBLException(self, "bad track")
+        return tracks
 
 
-class MyFollowedArtists(object):
+class MyFollowedArtists(pbl.BufferedSource):
     """A PBL Source that generates top tracks from followed artist
     by the current user
     """
@@ -668,11 +709,12 @@ class MyFollowedArtists(object):
     def __init__(self, num_tracks):
         self.name = "MyFollowedArtists"
         self.num_tracks = num_tracks
-        self.buffer = None
+        self.buffer = collections.deque()
+        self.filling = True
 
-    def next_track(self):
-        if self.buffer is None:
-            self.buffer = []
+    def _fill(self, n):
+        if self.filling:
+            self.filling = False
             try:
                 sp = get_spotify()
                 limit = 50
@@ -687,16 +729,20 @@ class MyFollowedArtists(object):
 
                     artists = results["artists"]
                     items = artists["items"]
+                    artist_ids = [item["id"] for item in items]
+                    if artist_ids:
+                        after = artist_ids[-1]
 
-                    for item in items:
-                        artist_id = item["id"]
-                        after = artist_id
-                        try:
-                            results = get_spotify().artist_top_tracks(artist_id)
-                        except spotipy.SpotifyException as e:
-                            raise pbl.engine.PBLException(self, e.msg)
+                    # a page of artists' top tracks at a time, concurrently
+                    try:
+                        top_tracks = spotify_plugs.get_artist_top_tracks(
+                            artist_ids, sp
+                        )
+                    except spotipy.SpotifyException as e:
+                        raise pbl.engine.PBLException(self, e.msg)
 
-                        for track in results["tracks"][: self.num_tracks]:
+                    for artist_id in artist_ids:
+                        for track in top_tracks[artist_id][: self.num_tracks]:
                             self.buffer.append(track["id"])
                             spotify_plugs._add_track(self.name, track)
                     if len(items) < limit:
@@ -705,65 +751,27 @@ class MyFollowedArtists(object):
             except spotipy.SpotifyException as e:
                 raise pbl.engine.PBLException(self, e.msg)
 
-        if len(self.buffer) > 0:
-            return self.buffer.pop(0)
-        else:
-            return None
-
 
-class MySavedAlbums(object):
+class MySavedAlbums(PagedSource):
     """A PBL Source that the tracks from albums saved
     by the current user
     """
 
     def __init__(self):
-        self.name = "My Saved Albums"
-        self.buffer = None
+        super(MySavedAlbums, self).__init__("My Saved Albums")
 
-    def next_track(self):
-        if self.buffer is None:
-            self.buffer = []
-            sp = get_spotify()
-            limit = 50
-            total = limit
-            offset = 0
+    def _fetch_page(self, sp, offset):
+        return sp.current_user_saved_albums(limit=self.limit, offset=offset)
 
-            while offset < total:
-                try:
-                    results = get_spotify().current_user_saved_albums(
-                        limit=limit, offset=offset
-                    )
-                    # print('cusa', self.name, limit, offset, results['limit'], results['offset'], results['total'])
-                except spotipy.SpotifyException as e:
-                    # print('woah')
-                    raise pbl.engine.PBLException(self, e.msg)
-
-                items = results["items"]
-                # print(json.dumps(results, indent=4))
-                # break
-
-                for item in items:
-                    album = item["album"]
-                    for track in album["tracks"]["items"]:
-                        self.buffer.append(track["id"])
-                        spotify_plugs._add_track(self.name, track)
-                offset += limit
-                total = results["total"]
-                # print('interim', self.name, len(self.buffer), offset, total)
-                if results["next"] is None:
-                    break
-            # print('final', self.name, len(self.buffer), offset, total)
-
-        if len(self.buffer) > 0:
-            tid = self.buffer.pop(0)
-            # print('ret', self.name, tid)
-            return tid
-        else:
-            # print('ret', self.name, 'empty')
-            return None
+    def _page_tracks(self, results):
+        tracks = []
+        for item in results["items"]:
+            album = item["album"]
+            tracks.extend(album["tracks"]["items"])
+        return tracks
 
 
-class DatedPlaylistSource(object):
+class DatedPlaylistSource(pbl.Component):
     """
     A PBL source that generates a stream of tracks from the given Spotify
     playlist with tracks potentially ordered and filtered by the date they
@@ -806,6 +814,7 @@ class DatedPlaylistSource(object):
         self.total = 1
         self.cur_index = 0
         self.track_count = 0
+        self.snapshot = None
 
     def _get_uri_from_name(self, name):
         results = get_spotify().search(q=name, type="playlist")
@@ -818,7 +827,11 @@ class DatedPlaylistSource(object):
         results = get_spotify().user_playlists(user)
         while results:
             for playlist in results["items"]:
-                if playlist["name"].lower() == name.lower():
+                if (
+                    "name" in playlist
+                    and playlist["name"]
+                    and playlist["name"].lower() == name.lower()
+                ):
                     return playlist["uri"]
             if results["next"]:
                 results = get_spotify().next(results)
@@ -827,15 +840,34 @@ class DatedPlaylistSource(object):
         return None
 
     def _get_more_tracks(self):
+        self._fetch_pages([self.next_offset])
+
+    def _fetch_pages(self, offsets):
         playlist_id = get_pid_from_playlist_uri(self.uri)
         user = get_user()
+        sp = get_spotify()
+        pages = workers.ordered_map(
+            lambda offset: self._fetch_page(sp, user, playlist_id, offset), offsets
+        )
+        for results in pages:
+            self._add_page(results)
+            self.snapshot.add(results)
+
+    def _fetch_first_page(self, sp, playlist_id):
         try:
-            results = get_spotify().user_playlist_tracks(
-                user, playlist_id, limit=self.limit, offset=self.next_offset
+            return sp.playlist(playlist_id, fields="snapshot_id,tracks")
+        except spotipy.SpotifyException as e:
+            raise pbl.engine.PBLException(self, e.msg)
+
+    def _fetch_page(self, sp, user, playlist_id, offset):
+        try:
+            return sp.user_playlist_tracks(
+                user, playlist_id, limit=self.limit, offset=offset
             )
         except spotipy.SpotifyException as e:
-            raise engine.PBLException(self, e.msg)
+            raise pbl.engine.PBLException(self, e.msg)
 
+    def _add_page(self, results):
         self.total = results["total"]
         for item in results["items"]:
             self.track_count += 1
@@ -860,24 +892,65 @@ class DatedPlaylistSource(object):
         self.next_offset += self.limit
 
     def _get_all_tracks(self):
+        # the first page comes with the playlist's snapshot_id and tells
+        # us how many tracks there are
+        playlist_id = get_pid_from_playlist_uri(self.uri)
+        if self.snapshot is None:
+            results = self._fetch_first_page(get_spotify(), playlist_id)
+            self.snapshot = spotify_plugs.PlaylistSnapshot(
+                playlist_id, results.get("snapshot_id")
+            )
+            self._add_page(results["tracks"])
+            self.snapshot.add(results["tracks"])
+            if self.track_count >= self.total:
+                return
+
+        # the rest come from the cache when the playlist is unchanged,
+        # otherwise they are fetched concurrently
+        items = self.snapshot.cached_page(self.total)
+        if items is not None:
+            # the cache leaves out the items that had no track
+            self._add_page({"total": self.track_count + len(items), "items": items})
+            return
+
+        self._fetch_pages(range(self.next_offset, self.total, self.limit))
         while self.track_count < self.total:
+            before = self.track_count
             self._get_more_tracks()
+            if self.track_count == before:
+                break
+        if self.track_count >= self.total:
+            self.snapshot.save()
 
     def order_tracks_by_date_added(self):
         self.tracks.sort(key=lambda t: t[1])
 
-    def next_track(self):
+    def resolve(self):
+        """finds the playlist by name, if there's no uri. Called by the
+        compiler so the lookup happens before the program runs."""
         if self.uri is None:
-            if self.user:
-                self.uri = self._get_uri_from_name_and_user(self.name, self.user)
-            else:
-                self.uri = self._get_uri_from_name(self.name)
+            try:
+                self.uri = spotify_plugs.resolve_uri(
+                    "playlist",
+                    self.name,
+                    self.user,
+                    lambda: (
+                        self._get_uri_from_name_and_user(self.name, self.user)
+                        if self.user
+                        else self._get_uri_from_name(self.name)
+                    ),
+                )
+            except spotipy.SpotifyException as e:
+                raise pbl.engine.PBLException(self, e.msg)
 
             if not self.uri:
                 msg = "Can't find playlist named " + self.name
                 if self.user:
                     msg += " for user " + self.user
-                raise engine.PBLException(self, msg)
+                raise pbl.engine.PBLException(self, msg)
+
+    def next_track(self):
+        self.resolve()
 
         if (
             self.uri
@@ -896,7 +969,7 @@ class DatedPlaylistSource(object):
             return None
 
 
-class RelativeDatedPlaylistSource(object):
+class RelativeDatedPlaylistSource(DatedPlaylistSource):
     """
     A PBL source that generates a stream of tracks from the given Spotify
     playlist with tracks potentially ordered and filtered by the relative
@@ -925,135 +998,36 @@ class RelativeDatedPlaylistSource(object):
         tracks_added_before=None,
     ):
         self.name = name
-        self.uri = spotify_plugs.normalize_uri(uri)
-        self.user = user
-        self.order_by_date_added = order_by_date_added
 
         if tracks_added_before is not None and len(tracks_added_before) > 0:
             try:
                 delta = reltime.parse_to_rel_time(tracks_added_before)
-                self.tracks_added_before = date_to_epoch(now()) - delta
+                tracks_added_before = date_to_epoch(now()) - delta
             except ValueError as e:
                 raise pbl.PBLException("bad relative time format", str(e))
         else:
-            self.tracks_added_before = -1
+            tracks_added_before = -1
 
         if tracks_added_since is not None and len(tracks_added_since) > 0:
             try:
                 delta = reltime.parse_to_rel_time(tracks_added_since)
-                self.tracks_added_since = date_to_epoch(now()) - delta
+                tracks_added_since = date_to_epoch(now()) - delta
             except ValueError as e:
                 raise pbl.PBLException(self, "bad relative time format " + str(e))
         else:
-            self.tracks_added_since = -1
-
-        # print("since", tracks_added_since, self.tracks_added_since, date_to_epoch(now()))
-        # print("before", tracks_added_before, self.tracks_added_before, date_to_epoch(now()))
-
-        self.next_offset = 0
-        self.limit = 100
-
-        self.tracks = []
-        self.total = 1
-        self.cur_index = 0
-        self.track_count = 0
-
-    def _get_uri_from_name(self, name):
-        results = get_spotify().search(q=name, type="playlist")
-        if len(results["playlists"]["items"]) > 0:
-            return results["playlists"]["items"][0]["uri"]
-        else:
-            return None
-
-    def _get_uri_from_name_and_user(self, name, user):
-        results = get_spotify().user_playlists(user)
-        while results:
-            for playlist in results["items"]:
-                if (
-                    "name" in playlist
-                    and playlist["name"]
-                    and playlist["name"].lower() == name.lower()
-                ):
-                    return playlist["uri"]
-            if results["next"]:
-                results = get_spotify().next(results)
-            else:
-                results = None
-        return None
-
-    def _get_more_tracks(self):
-        playlist_id = get_pid_from_playlist_uri(self.uri)
-        user = get_user()
-        try:
-            results = get_spotify().user_playlist_tracks(
-                user, playlist_id, limit=self.limit, offset=self.next_offset
-            )
-        except spotipy.SpotifyException as e:
-            raise engine.PBLException(self, e.msg)
-
-        self.total = results["total"]
-        for item in results["items"]:
-            self.track_count += 1
-            good_track = True
-            ts = parse_date(item["added_at"])
-            if (
-                self.tracks_added_before >= 0
-                and ts >= 0
-                and ts > self.tracks_added_before
-            ):
-                good_track = False
-            if (
-                self.tracks_added_since >= 0
-                and ts >= 0
-                and ts < self.tracks_added_since
-            ):
-                good_track = False
-            track = item["track"]
-            # print(good_track, ts, self.tracks_added_before, self.tracks_added_since, track['name'])
-            if good_track and ts >= 0 and track and "id" in track:
-                self.tracks.append((track["id"], ts))
-                spotify_plugs._add_track(self.name, track)
-        self.next_offset += self.limit
-
-    def _get_all_tracks(self):
-        while self.track_count < self.total:
-            self._get_more_tracks()
-
-    def order_tracks_by_date_added(self):
-        self.tracks.sort(key=lambda t: t[1])
-
-    def next_track(self):
-        if self.uri is None:
-            if self.user:
-                self.uri = self._get_uri_from_name_and_user(self.name, self.user)
-            else:
-                self.uri = self._get_uri_from_name(self.name)
-
-            if not self.uri:
-                msg = "Can't find playlist named " + self.name
-                if self.user:
-                    msg += " for user " + self.user
-                raise engine.PBLException(self, msg)
-
-        # print('next_track', self.cur_index, self.track_count, self.total)
-        if (
-            self.uri
-            and self.cur_index >= len(self.tracks)
-            and self.track_count < self.total
-        ):
-            self._get_all_tracks()
-            if self.order_by_date_added:
-                self.order_tracks_by_date_added()
-
-        if self.cur_index < len(self.tracks):
-            track, date = self.tracks[self.cur_index]
-            self.cur_index += 1
-            return track
-        else:
-            return None
+            tracks_added_since = -1
+
+        super(RelativeDatedPlaylistSource, self).__init__(
+            name,
+            uri,
+            user,
+            order_by_date_added,
+            tracks_added_since,
+            tracks_added_before,
+        )
 
 
-class MixIn(object):
+class MixIn(pbl.Component):
     """
     A PBL Filter that mixes two input streams based upon a small
     set of rules
@@ -1108,7 +1082,7 @@ class MixIn(object):
         return track
 
 
-class SeparateArtists(object):
+class SeparateArtists(pbl.BufferedSource):
     """A PBL filter that reorders the input tracks to maximize
     the separation between artists
     """
@@ -1117,6 +1091,7 @@ class SeparateArtists(object):
         self.name = "SeparateArtists"
         self.source = source
         self.tracks = []
+        self.buffer = collections.deque()
         self.filling = True
 
     def score_list(self):
@@ -1150,57 +1125,89 @@ class SeparateArtists(object):
         self.tracks[b] = tmp
 
     def separate_artists(self):
-        max_tries = 1000
-        cur_score = 0
+        """reorders the tracks with random swaps, keeping a swap only when
+        it lowers the number of adjacent tracks by the same artist. A swap
+        changes at most four neighbouring pairs, so only those are rescored
+        and the set of violating pairs is updated in place. Returns the
+        remaining score and the number of tracks still in violation"""
+        max_tries = 1000 + 10 * len(self.tracks)
         max_no_swaps = 100
 
-        cur_score, indexes = self.score_list()
-        no_swap = 0
+        artists = [track["artist"] for track in self.tracks]
+        last = len(artists) - 1
+
+        # the first index of each adjacent same artist pair, kept as a list
+        # with a position map so pairs can be drawn and removed in O(1)
+        bad = []
+        where = {}
+
+        def mark(pair, violates):
+            if violates and pair not in where:
+                where[pair] = len(bad)
+                bad.append(pair)
+            elif not violates and pair in where:
+                index = where.pop(pair)
+                moved = bad.pop()
+                if moved != pair:
+                    bad[index] = moved
+                    where[moved] = index
 
+        for pair in range(last):
+            mark(pair, artists[pair] == artists[pair + 1])
+
+        no_swap = 0
         for i in range(max_tries):
-            if cur_score == 0 or len(indexes) == 0:
+            if not bad:
                 break
 
-            swap_1 = random.choice(indexes)
+            swap_1 = random.choice(bad) + random.randint(0, 1)
             swap_2 = self.random_index()
+            pairs = set(
+                p for p in (swap_1 - 1, swap_1, swap_2 - 1, swap_2) if 0 <= p < last
+            )
+            old_score = sum(1 for p in pairs if p in where)
+
             self.swap(swap_1, swap_2)
-            new_score, new_indexes = self.score_list()
+            artists[swap_1], artists[swap_2] = artists[swap_2], artists[swap_1]
+            new_score = sum(1 for p in pairs if artists[p] == artists[p + 1])
 
-            if new_score >= cur_score:
+            if new_score >= old_score:
                 self.swap(swap_2, swap_1)
+                artists[swap_1], artists[swap_2] = artists[swap_2], artists[swap_1]
                 no_swap += 1
                 if no_swap > max_no_swaps:
                     break
             else:
                 no_swap = 0
-                cur_score = new_score
-                indexes = new_indexes
-
-            if cur_score == 0:
-                break
-
-        return cur_score, len(indexes)
-
-    def create_buffer(self):
-        self.buffer = []
-        for ti in self.tracks:
-            self.buffer.append(ti["id"])
-
-    def next_track(self):
-        while self.filling:
-            track = self.source.next_track()
-            if track:
-                tinfo = pbl.tlib.get_track(track)
-                self.tracks.append(tinfo)
-            else:
-                self.filling = False
-                self.separate_artists()
-                self.create_buffer()
-
-        if len(self.buffer) > 0:
-            return self.buffer.pop()
-        else:
-            return None
+                for p in pairs:
+                    mark(p, artists[p] == artists[p + 1])
+
+        indexes = set(bad) | set(pair + 1 for pair in bad)
+        return len(bad), len(indexes)
+
+    def _fill(self, n):
+        if self.filling:
+            self.filling = False
+            for track in pbl.drain(self.source):
+                self.tracks.append(pbl.tlib.get_track(track))
+            self.separate_artists()
+            self.buffer.extend(ti["id"] for ti in self.tracks)
+
+
+def count_artist_violations(tids, min_separation=2):
+    """the number of pairs of tracks by the same artist that are fewer
+    than min_separation tracks apart, a quality measure for artist
+    separation"""
+    count = 0
+    seen = {}
+    for i, tid in enumerate(tids):
+        artist = pbl.tlib.get_track(tid)["artist"]
+        positions = seen.setdefault(artist, collections.deque())
+        while positions and i - positions[0] >= min_separation:
+            positions.popleft()
+        count += len(positions)
+        positions.append(i)
+    return count
 
 
 def get_day_of_week():
@@ -1217,7 +1224,7 @@ def get_day_of_week():
     return days[day]
 
 
-class ArtistDeDup(object):
+class ArtistDeDup(pbl.Component):
     """
     Remove any duplicate artists in the stream
     :param source: the stream source
@@ -1249,7 +1256,7 @@ class ArtistDeDup(object):
         return track
 
 
-class ArtistSeparation(object):
+class ArtistSeparation(pbl.Component):
     """
     enforces a minimum separation of artists
     """
@@ -1257,17 +1264,16 @@ class ArtistSeparation(object):
     def __init__(self, source, min_separation=4, reorder=True):
         self.name = "artist separated " + source.name
         self.source = source
-        self.history = []
-        self.lookaside = []
+        self.history = spacing.ArtistSpacing()
+        # a track may play once its artist is more than min_separation back
+        self.lookaside = spacing.Lookaside(self.history, min_separation + 1)
 
         self.min_separation = min_separation
         self.reorder = reorder
 
     def _separation(self, artist):
-        for i, partist in enumerate(reversed(self.history)):
-            if artist == partist:
-                return i
-        return -1
+        sep = self.history.separation(artist)
+        return -1 if sep == sys.maxsize else sep - 1
 
     def _get_artist_name(self, track):
         tinfo = pbl.tlib.get_track(track)
@@ -1276,17 +1282,8 @@ class ArtistSeparation(object):
             artist_name = tinfo["artist"]
         return artist_name
 
-    def _check_from_lookaside(self):
-        for track in self.lookaside:
-            artist_name = self._get_artist_name(track)
-            sep = self._separation(artist_name)
-            if sep >= self.min_separation or sep == -1:
-                self.lookaside.remove(track)
-                return track
-        return None
-
     def _next_track(self):
-        track = self._check_from_lookaside()
+        track = self.lookaside.take()
         if track is None:
             track = self.source.next_track()
         return track
@@ -1299,18 +1296,18 @@ class ArtistSeparation(object):
                 artist_name = self._get_artist_name(track)
                 sep = self._separation(artist_name)
                 if sep >= self.min_separation or sep == -1:
-                    self.history.append(artist_name)
+                    self.history.add(artist_name)
                     break
                 else:
                     if self.reorder:
-                        self.lookaside.append(track)
+                        self.lookaside.hold(track, artist_name)
                     continue
             else:
                 break
         return track
 
 
-class WeightedShuffler(object):
+class WeightedShuffler(pbl.Component):
     """A weighted shuffles the tracks in the stream
 
     :param source: the source of tracks
@@ -1350,7 +1347,7 @@ class WeightedShuffler(object):
             return None
 
 
-class MyTopTracks(object):
+class MyTopTracks(PagedSource):
     """returns the your top tracks for a given perioed
 
     :param time_range time_range - Over what time frame are the tracks are
@@ -1359,47 +1356,20 @@ class MyTopTracks(object):
     """
 
     def __init__(self, time_range):
-        self.name = "My Top Tracks"
+        super(MyTopTracks, self).__init__("My Top Tracks")
         self.time_range = time_range
-        self.buffer = None
 
-    def next_track(self):
-        if self.buffer is None:
-            self.buffer = []
-            try:
-                sp = get_spotify()
-                limit = 50
-                offset = 0
-                total = 50
-
-                while offset < total:
-                    results = sp.current_user_top_tracks(
-                        time_range=self.time_range, limit=limit, offset=offset
-                    )
-                    for item in results["items"]:
-                        track = item
-                        if track and "id" in track:
-                            self.buffer.append(track["id"])
-                            spotify_plugs._add_track(self.name, track)
-                        else:
-                            continue
-                            # raise pbl.engine.PBLException(self, 'bad track')
-                    offset += limit
-                    total = results["total"]
-                # print(self.name, len(self.buffer), offset, total)
-            except spotipy.SpotifyException as e:
-                raise pbl.engine.PBLException(self, e.msg)
+    def _fetch_page(self, sp, offset):
+        return sp.current_user_top_tracks(
+            time_range=self.time_range, limit=self.limit, offset=offset
+        )
 
-        if len(self.buffer) > 0:
-            tid = self.buffer.pop(0)
-            # print('ret', self.name, tid)
-            return tid
-        else:
-            # print('ret', self.name, 'empty')
-            return None
+    def _page_tracks(self, results):
+        # skip the bad tracks
+        return [track for track in results["items"] if track and "id" in track]
 
 
-class SpotifyArtistRadio(object):
+class SpotifyArtistRadio(pbl.BufferedSource):
     """returns artist radio tracks given a seed artist
 
     :param seed_artist_name_or_uri the name or uri of the seed artist
@@ -1410,20 +1380,24 @@ class SpotifyArtistRadio(object):
         self.name = "Artist Radio"
         self.artist_name = name
         self.artist_uri = uri
-        self.buffer = None
+        self.buffer = collections.deque()
+        self.filling = True
 
-    def next_track(self):
-        if self.buffer is None:
-            self.buffer = []
+    def resolve(self):
+        """finds the seed artist by name, if there's no uri"""
+        if not self.artist_uri and self.artist_name:
             try:
-                sp = get_spotify()
+                self.artist_uri = spotify_plugs.find_artist_uri(self.artist_name)
+            except spotipy.SpotifyException as e:
+                raise pbl.engine.PBLException(self, e.msg)
 
-                if self.artist_uri:
-                    seed_uri = self.artist_uri
-                elif self.artist_name:
-                    seed_uri = spotify_plugs._find_artist_by_name(sp, self.artist_name)
-                else:
-                    seed_uri = None
+    def _fill(self, n):
+        if self.filling:
+            self.filling = False
+            self.resolve()
+            try:
+                sp = get_spotify()
+                seed_uri = self.artist_uri
 
                 if seed_uri:
                     results = sp.recommendations(seed_artists=[seed_uri], limit=100)
@@ -1436,14 +1410,8 @@ class SpotifyArtistRadio(object):
             except spotipy.SpotifyException as e:
                 raise pbl.engine.PBLException(self, e.msg)
 
-        if len(self.buffer) > 0:
-            tid = self.buffer.pop(0)
-            return tid
-        else:
-            return None
-
 
-class SpotifyArtistTracks(object):
+class SpotifyArtistTracks(pbl.BufferedSource):
     """returns top tracks given a seed artist
 
     :param seed_artist_name_or_uri the name or uri of the seed artist
@@ -1453,20 +1421,30 @@ class SpotifyArtistTracks(object):
     def __init__(self, seed_artist_name_or_uri):
         self.name = "Artist Top Tracks"
         self.seed_artist_name_or_uri = seed_artist_name_or_uri
-        self.buffer = None
+        self.seed_uri = None
+        self.buffer = collections.deque()
+        self.filling = True
+
+    def resolve(self):
+        """finds the seed artist by name, if it isn't a uri"""
+        if self.seed_uri is None:
+            if is_uri(self.seed_artist_name_or_uri):
+                self.seed_uri = self.seed_artist_name_or_uri
+            else:
+                try:
+                    self.seed_uri = get_artist_uri(self.seed_artist_name_or_uri)
+                except spotipy.SpotifyException as e:
+                    raise pbl.engine.PBLException(self, e.msg)
 
     # TODO: this just returns the top 10 tracks, need to add more
 
-    def next_track(self):
-        if self.buffer is None:
-            self.buffer = []
+    def _fill(self, n):
+        if self.filling:
+            self.filling = False
+            self.resolve()
             try:
                 sp = get_spotify()
-
-                if is_uri(self.seed_artist_name_or_uri):
-                    seed_uri = self.seed_artist_name_or_uri
-                else:
-                    seed_uri = get_artist_uri(self.seed_artist_name_or_uri)
+                seed_uri = self.seed_uri
 
                 if seed_uri:
                     results = sp.artist_top_tracks(seed_uri)
@@ -1479,12 +1457,6 @@ class SpotifyArtistTracks(object):
             except spotipy.SpotifyException as e:
                 raise pbl.engine.PBLException(self, e.msg)
 
-        if len(self.buffer) > 0:
-            tid = self.buffer.pop(0)
-            return tid
-        else:
-            return None
-
 
 def is_uri(s):
     fields = s.split(":")
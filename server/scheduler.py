@@ -165,7 +165,7 @@ class Scheduler(object):
             print("execute_job", info)
             auth_code = info["auth_code"]
             pid = info["pid"]
-            results = self.pm.execute_program(auth_code, pid, True)
+            results = self.pm.execute_program(auth_code, pid, True, interactive=False)
             self.pm.inc_global_counter("jobs_executed")
         return results
 